@@ -0,0 +1,100 @@
+# Decoding of raw libc++ container memory for the bulk commands
+# (Tested with Python 2.7.12 and GDB 7.12)
+
+# Copyright (C) 2008-2018 Free Software Foundation, Inc.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Nothing in here may use the gdb module: these functions also run in
+# the worker processes of the libcxx-decode-processes pool, where all
+# they get is raw bytes and an element layout computed by printers.py.
+
+import csv
+import io
+import json
+import struct
+import sys
+
+class Record(dict):
+   "The decoded members of one element, also accessible as attributes"
+
+   def __getattr__(self, name):
+      try:
+         return self[name]
+      except KeyError:
+         pass
+      # Members of nested structs are stored under dotted names.
+      prefix = name + '.'
+      nested = Record((key[len(prefix):], value)
+                      for (key, value) in self.items()
+                      if key.startswith(prefix))
+      if not nested:
+         raise AttributeError(name)
+      return nested
+
+def decode_elements(codec, data):
+   """Decode the packed elements in DATA
+
+   CODEC is a (struct format, member names) pair, with names None for
+   scalar elements.
+   """
+   (fmt, names) = codec
+   unpacker = struct.Struct(fmt)
+   count = len(data) // unpacker.size
+   if names is None:
+      return struct.unpack('%s%d%s' % (fmt[0], count, fmt[1:]),
+                           data[:count * unpacker.size])
+   return [Record(zip(names, unpacker.unpack_from(data, index * unpacker.size)))
+           for index in range(count)]
+
+def _json_default(value):
+   return repr(value)
+
+def _csv_cells(value):
+   if isinstance(value, dict):
+      return [value[name] for name in sorted(value)]
+   return [value]
+
+def csv_columns(name, value):
+   "Return the csv column names for VALUE, labelled NAME"
+   if isinstance(value, dict):
+      return ['%s.%s' % (name, member) for member in sorted(value)]
+   return [name]
+
+def format_rows(fmt, rows):
+   "Format (index, key, value) ROWS as csv or jsonl text"
+   if fmt == 'jsonl':
+      lines = []
+      for (index, key, value) in rows:
+         record = { 'index': index, 'value': value }
+         if key is not None:
+            record['key'] = key
+         lines.append(json.dumps(record, sort_keys=True,
+                                 default=_json_default))
+      return '\n'.join(lines) + '\n'
+   if sys.version_info[0] > 2:
+      out = io.StringIO()
+   else:
+      out = io.BytesIO()
+   csv.writer(out).writerows([index] +
+                             ([] if key is None else _csv_cells(key)) +
+                             _csv_cells(value)
+                             for (index, key, value) in rows)
+   return out.getvalue()
+
+def serialize_chunk(fmt, codec, data, first_index):
+   "Decode a chunk of packed elements and format them as csv or jsonl"
+   return format_rows(fmt, [(first_index + offset, None, value)
+                            for (offset, value)
+                            in enumerate(decode_elements(codec, data))])
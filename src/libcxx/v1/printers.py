@@ -18,7 +18,29 @@
 
 import re
 import gdb
+import atexit
+import bisect
+import collections
+import csv
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
+import os
+import shutil
+import struct
 import sys
+import time
+import zlib
+
+try:
+   import concurrent.futures
+   import multiprocessing
+except ImportError:
+   concurrent = None
+
+from .decode import csv_columns, decode_elements, format_rows, serialize_chunk
 
 if sys.version_info[0] > 2:
    # Python 3 stuff
@@ -63,11 +85,794 @@ try:
 except ImportError:
    pass
 
+# NumPy speeds up the numeric summaries of libcxx-stats when available.
+# It is imported by _numpy on first use only: importing it takes time
+# and starts BLAS threads, which sessions that never ask for a summary
+# should not pay for.
+_numpy_module = None
+
+def _numpy():
+   "Return the numpy module, or None when it is not installed"
+   global _numpy_module
+   if _numpy_module is None:
+      try:
+         import numpy
+         _numpy_module = numpy
+      except ImportError:
+         _numpy_module = False
+   return _numpy_module or None
+
+# Best available wall clock for the profiler.
+_timer = getattr(time, 'perf_counter', time.time)
+
+class _ProfileCounters(object):
+   "Counters accumulated for one printer operation or concrete type"
+
+   __slots__ = ('calls', 'total_time', 'max_time', 'nodes', 'bytes_read',
+                'swallowed')
+
+   def __init__(self):
+      self.calls = 0
+      self.total_time = 0.0
+      self.max_time = 0.0
+      self.nodes = 0
+      self.bytes_read = 0
+      self.swallowed = 0
+
+class _TraceSpan(_ProfileCounters):
+   "Counters of one traced printer operation, recorded when it ends"
+
+   __slots__ = ('name', 'type_name', 'address')
+
+   def __init__(self, name, type_name, address):
+      super(_TraceSpan, self).__init__()
+      self.name = name
+      self.type_name = type_name
+      self.address = address
+
+class _Profiler(object):
+   """Optional instrumentation of the printers
+
+   Printer construction, to_string and children are timed by wrapping the
+   printers returned from RxPrinter.invoke while profiling is enabled.
+   Node visits, memory reads and swallowed exceptions are attributed to
+   the innermost printer operation that is currently running.  Times are
+   inclusive of nested printers.  When disabled, the only cost is a test
+   of the enabled flag at each hook.
+
+   While tracing, every operation also ends up as a complete event in a
+   bounded ring buffer, with the nodes and bytes read in its own code
+   (not in nested operations), for libcxx-trace to save in the Chrome
+   trace event format.
+   """
+
+   def __init__(self):
+      self.enabled = False
+      self.tracing = False
+      # Whether profiling was on before tracing turned it on
+      self.enabled_before_trace = False
+      self.trace = collections.deque()
+      self.trace_start = 0.0
+      self.reset()
+
+   def reset(self):
+      self.by_class = {}
+      self.by_type = {}
+      self.unattributed = _ProfileCounters()
+      self.context = []
+
+   @staticmethod
+   def _counters(table, key):
+      counters = table.get(key)
+      if counters is None:
+         counters = table[key] = _ProfileCounters()
+      return counters
+
+   def enter(self, class_name, operation, type_name, count=True,
+             address=None):
+      entry = (self._counters(self.by_class, (class_name, operation)),
+               self._counters(self.by_type, type_name))
+      if count:
+         for counters in entry:
+            counters.calls += 1
+      if self.tracing:
+         entry += (_TraceSpan('%s.%s' % (class_name, operation), type_name,
+                              address),)
+      self.context.append(entry)
+      return _timer()
+
+   def leave(self, start):
+      elapsed = _timer() - start
+      entry = self.context.pop()
+      for counters in entry[:2]:
+         counters.total_time += elapsed
+         if elapsed > counters.max_time:
+            counters.max_time = elapsed
+      if len(entry) > 2:
+         span = entry[2]
+         args = { 'type': span.type_name, 'nodes': span.nodes,
+                  'bytes': span.bytes_read }
+         if span.address is not None:
+            args['address'] = '0x%x' % span.address
+         self.event(span.name, 'printer', start, elapsed, args)
+
+   def event(self, name, category, start, elapsed, args):
+      self.trace.append((name, category, start - self.trace_start, elapsed,
+                         args))
+
+   def start_trace(self, limit):
+      if not self.tracing:
+         self.enabled_before_trace = self.enabled
+      self.enabled = True
+      self.tracing = True
+      self.trace = collections.deque(maxlen=limit)
+      self.trace_start = _timer()
+
+   def stop_trace(self):
+      "Stop tracing, and profiling unless it was on before the trace"
+      if self.tracing:
+         self.tracing = False
+         self.enabled = self.enabled_before_trace
+
+   def trace_events(self):
+      "Return the traced events as Chrome trace event objects"
+      pid = os.getpid()
+      return [{ 'name': name, 'cat': category, 'ph': 'X', 'pid': pid,
+                'tid': 1, 'ts': round(start * 1e6, 3),
+                'dur': round(elapsed * 1e6, 3), 'args': args }
+              for (name, category, start, elapsed, args) in self.trace]
+
+   def _current(self):
+      if self.context:
+         return self.context[-1]
+      return (self.unattributed,)
+
+   def node(self, count=1):
+      for counters in self._current():
+         counters.nodes += count
+
+   def read(self, nbytes):
+      for counters in self._current():
+         counters.bytes_read += nbytes
+
+   def swallowed(self):
+      if self.enabled:
+         for counters in self._current():
+            counters.swallowed += 1
+
+   def construct(self, function, typename, value):
+      class_name = getattr(function, '__name__', str(function))
+      type_name = str(value.type.unqualified().strip_typedefs())
+      address = None
+      if self.tracing and value.address is not None:
+         address = int(value.address)
+      start = self.enter(class_name, '__init__', type_name, address=address)
+      try:
+         printer = function(typename, value)
+      finally:
+         self.leave(start)
+      return _ProfiledPrinter(printer, class_name, type_name)
+
+_profiler = _Profiler()
+
+class _ProfiledPrinter(object):
+   "Proxy timing the to_string and children calls of a printer"
+
+   def __init__(self, printer, class_name, type_name):
+      self.printer = printer
+      self.class_name = class_name
+      self.type_name = type_name
+      if hasattr(printer, 'children'):
+         self.children = self._children
+      if hasattr(printer, 'display_hint'):
+         self.display_hint = self._display_hint
+
+   def to_string(self):
+      start = _profiler.enter(self.class_name, 'to_string', self.type_name)
+      try:
+         return self.printer.to_string()
+      finally:
+         _profiler.leave(start)
+
+   def _display_hint(self):
+      return self.printer.display_hint()
+
+   def _children(self):
+      start = _profiler.enter(self.class_name, 'children', self.type_name)
+      try:
+         iterator = iter(self.printer.children())
+      finally:
+         _profiler.leave(start)
+      while True:
+         start = _profiler.enter(self.class_name, 'children', self.type_name,
+                                 count=False)
+         try:
+            item = next(iterator)
+         except StopIteration:
+            return
+         finally:
+            _profiler.leave(start)
+         yield item
+
+def _read_memory(address, length):
+   "Read LENGTH bytes of inferior memory at ADDRESS, returned as bytes"
+   if not _mapped(address, length):
+      raise gdb.MemoryError('Cannot access memory at address 0x%x' % address)
+   if _profiler.enabled:
+      _profiler.read(length)
+      if _profiler.tracing:
+         start = _timer()
+         try:
+            return _fetch_memory(address, length)
+         finally:
+            _trace_read(address, length, start)
+   return _fetch_memory(address, length)
+
+def _trace_read(address, length, start):
+   "Record a read of LENGTH bytes at ADDRESS, begun at START, in the trace"
+   _profiler.event('read', 'memory', start, _timer() - start,
+                   { 'address': '0x%x' % address, 'bytes': length })
+
+def _fetch_memory(address, length):
+   if _core_reader:
+      core = _core()
+      data = core.read(address, length) if core is not None else None
+      if data is not None:
+         return bytes(data)
+   data = gdb.selected_inferior().read_memory(address, length)
+   if hasattr(data, 'tobytes'):
+      return data.tobytes()
+   return bytes(data)
+
+# struct format characters for unsigned integers of a given byte size
+_unsigned_formats = { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }
+
+_byte_order = None
+
+def _target_byte_order():
+   "Return the struct byte order prefix for the current target"
+   global _byte_order
+   if _byte_order is None:
+      try:
+         endian = gdb.execute('show endian', to_string=True)
+      except gdb.error:
+         endian = ''
+      _byte_order = '>' if 'big endian' in endian else '<'
+   return _byte_order
+
+def _unpack_integers(data, size, signed):
+   "Decode DATA as a tuple of target integers SIZE bytes wide"
+   code = _unsigned_formats[size]
+   if signed:
+      code = code.lower()
+   return struct.unpack('%s%d%s' % (_target_byte_order(), len(data) // size,
+                                    code), data)
+
+def _libcxx_setting(name, default):
+   "Return the value of one of the libcxx-* GDB parameters"
+   try:
+      value = gdb.parameter(name)
+   except RuntimeError:
+      return default
+   if value is None:
+      return default
+   return value
+
+class _LruCache(object):
+   "A mapping that evicts its least recently used entries beyond LIMIT"
+
+   def __init__(self, limit):
+      self.limit = limit
+      self.entries = collections.OrderedDict()
+
+   def __len__(self):
+      return len(self.entries)
+
+   def get(self, key, default=None):
+      try:
+         value = self.entries.pop(key)
+      except KeyError:
+         return default
+      self.entries[key] = value
+      return value
+
+   def __setitem__(self, key, value):
+      self.entries.pop(key, None)
+      if self.limit <= 0:
+         return
+      self.entries[key] = value
+      while len(self.entries) > self.limit:
+         self.entries.popitem(last=False)
+
+   def clear(self):
+      self.entries.clear()
+
+# Caches that are only valid while the inferior is stopped.  They are
+# emptied whenever it resumes or its memory is changed from GDB.
+_stop_caches = []
+
+# Default number of entries kept by each stop-scoped cache.
+_stop_cache_size = 1024
+
+def _stop_cache():
+   "Return a new LRU cache that is cleared when the inferior resumes"
+   cache = _LruCache(_stop_cache_size)
+   _stop_caches.append(cache)
+   return cache
+
+def _clear_stop_caches(event=None):
+   global _regions
+   global _core_path
+   for cache in _stop_caches:
+      cache.clear()
+   _regions = _missing
+   _core_path = _missing
+   # In case GDB abandoned a pointee's children without closing them
+   del _pointees_printing[:]
+
+def _resize_stop_caches(limit):
+   for cache in _stop_caches:
+      cache.limit = limit
+      cache.clear()
+
+if hasattr(gdb, 'events'):
+   gdb.events.cont.connect(_clear_stop_caches)
+   gdb.events.exited.connect(_clear_stop_caches)
+   if hasattr(gdb.events, 'memory_changed'):
+      gdb.events.memory_changed.connect(_clear_stop_caches)
+   if hasattr(gdb.events, 'inferior_call'):
+      gdb.events.inferior_call.connect(_clear_stop_caches)
+   # Loading an executable or core file changes the mapped ranges.
+   gdb.events.new_objfile.connect(_clear_stop_caches)
+
+# Sentinel for cache misses, as None is a valid cached visualizer.
+_missing = object()
+
+# Mapped address ranges of the inferior as (starts, ends) lists sorted
+# by address, None when they cannot be found out, or _missing before
+# their first use in a stop.
+_regions = _missing
+
+_file_section = re.compile(r'^\s*0x([0-9a-f]+) - 0x([0-9a-f]+) is ', re.M)
+
+_process_mapping = re.compile(
+   r'^\s*0x([0-9a-f]+)\s+0x([0-9a-f]+)\s+0x[0-9a-f]+\s+0x[0-9a-f]+'
+   r'(?:\s+([r-][w-][x-][ps]))?', re.M)
+
+def _find_regions():
+   # A core file knows its load segments, while a live process has them
+   #  in /proc.  Either way GDB can also read the sections of the
+   #  executable and shared libraries, which "info files" lists.
+   try:
+      files = gdb.execute('info files', to_string=True)
+   except gdb.error:
+      return None
+   ranges = [(int(start, 16), int(end, 16))
+             for (start, end) in _file_section.findall(files)]
+   if 'core dump' not in files:
+      try:
+         mappings = gdb.execute('info proc mappings', to_string=True)
+      except gdb.error:
+         return None
+      mapped = [(int(start, 16), int(end, 16))
+                for (start, end, perms) in _process_mapping.findall(mappings)
+                if 'r' in perms or not perms]
+      if not mapped:
+         return None
+      ranges += mapped
+   if not ranges:
+      return None
+   starts = []
+   ends = []
+   for (start, end) in sorted(ranges):
+      if ends and start <= ends[-1]:
+         ends[-1] = max(ends[-1], end) # Overlapping or adjacent
+      else:
+         starts.append(start)
+         ends.append(end)
+   return (starts, ends)
+
+def _mapped(address, length=1):
+   """Return False if [ADDRESS, ADDRESS + LENGTH) is known to be unmapped
+
+   The mapped ranges are looked up once per stop, and each check is a
+   binary search, so printers can reject wild pointers and sizes without
+   a failing read.  Everything is assumed mapped when the ranges cannot
+   be found out, e.g. on remote targets.
+   """
+   global _regions
+   if _regions is _missing:
+      _regions = _find_regions()
+   if _regions is None:
+      return True
+   (starts, ends) = _regions
+   index = bisect.bisect_right(starts, address) - 1
+   return index >= 0 and address + max(length, 1) <= ends[index]
+
+def _check_mapped(pointer, count=1):
+   "Raise gdb.MemoryError unless COUNT objects at POINTER are mapped"
+   address = int(pointer)
+   size = max(pointer.type.strip_typedefs().target().sizeof, 1)
+   if not _mapped(address, max(int(count), 1) * size):
+      raise gdb.MemoryError('Cannot access memory at address 0x%x' % address)
+
+class _CoreImage(object):
+   """The memory saved in an ELF core file, read through mmap
+
+   Only the bytes present in the file are served; memory of PT_LOAD
+   segments left out of the core (typically file-backed code) is not,
+   and must be read through GDB.
+   """
+
+   def __init__(self, path):
+      with open(path, 'rb') as core:
+         self.key = _core_key(path, os.fstat(core.fileno()))
+         self.map = mmap.mmap(core.fileno(), 0, access=mmap.ACCESS_READ)
+      header = self.map[:64]
+      if header[:4] != b'\x7fELF':
+         raise ValueError('%s is not an ELF file' % path)
+      order = '<' if header[5:6] == b'\x01' else '>'
+      if header[4:5] == b'\x02':
+         (phoff, shoff) = struct.unpack_from(order + 'QQ', header, 32)
+         (phentsize, phnum) = struct.unpack_from(order + 'HH', header, 54)
+         entry = struct.Struct(order + 'IIQQQQQQ')
+         fields = (2, 3, 5) # p_offset, p_vaddr, p_filesz
+         sh_info = 44
+      else:
+         (phoff, shoff) = struct.unpack_from(order + 'II', header, 28)
+         (phentsize, phnum) = struct.unpack_from(order + 'HH', header, 42)
+         entry = struct.Struct(order + 'IIIIIIII')
+         fields = (1, 2, 4)
+         sh_info = 28
+      if phnum == 0xffff: # PN_XNUM, the count is in section header 0
+         (phnum,) = struct.unpack_from(order + 'I', self.map, shoff + sh_info)
+      segments = []
+      for index in range(phnum):
+         program_header = entry.unpack_from(self.map, phoff + index * phentsize)
+         (offset, vaddr, filesz) = [program_header[field]
+                                    for field in fields]
+         if program_header[0] == 1 and filesz > 0: # PT_LOAD
+            segments.append((vaddr, filesz, offset))
+      segments.sort()
+      self.starts = [start for (start, size, offset) in segments]
+      self.segments = segments
+      try:
+         self.view = memoryview(self.map)
+      except TypeError:
+         self.view = None # Python 2 mmaps only slice into copies
+
+   def close(self):
+      "Unmap the file, unless slices of it are still referenced"
+      if self.view is not None:
+         self.view.release()
+      try:
+         self.map.close()
+      except BufferError:
+         pass # The mapping goes away with the last slice
+
+   def read(self, address, length):
+      "Return the LENGTH bytes at ADDRESS without copying them, or None"
+      index = bisect.bisect_right(self.starts, address) - 1
+      if index < 0:
+         return None
+      (start, size, offset) = self.segments[index]
+      if address + length > start + size:
+         return None
+      offset += address - start
+      if self.view is None:
+         return self.map[offset:offset + length]
+      return self.view[offset:offset + length]
+
+# Whether libcxx-core-reader is on
+_core_reader = False
+
+# The _CoreImage of the last core file read, or None
+_core_image = None
+
+# The path of the core file being debugged, _missing until looked up in
+#  this stop, None without a core file
+_core_path = _missing
+
+def _core_key(path, stat):
+   "Identify the contents of the core file at PATH, as STAT describes it"
+   return (path, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime)
+
+_core_file = re.compile(r"Local core dump file:\s*`([^']+)'")
+
+def _core():
+   "Return the _CoreImage of the core file being debugged, or None"
+   global _core_image
+   global _core_path
+   if _core_path is _missing:
+      _core_path = None
+      try:
+         match = _core_file.search(gdb.execute('info files', to_string=True))
+         if match:
+            _core_path = match.group(1)
+      except gdb.error:
+         pass
+   if _core_path is None:
+      return None
+   try:
+      key = _core_key(_core_path, os.stat(_core_path))
+   except EnvironmentError:
+      key = None
+   if _core_image is None or _core_image.key != key:
+      # The file is mapped once per core, not once per stop
+      if _core_image is not None:
+         _core_image.close()
+         _core_image = None
+      try:
+         _core_image = _CoreImage(_core_path)
+      except (EnvironmentError, ValueError, struct.error):
+         _core_path = None # Read through GDB until the next stop
+   return _core_image
+
+def _read_view(address, length):
+   """Read LENGTH bytes of inferior memory at ADDRESS
+
+   The result supports the buffer protocol: a slice of the core file
+   when libcxx-core-reader serves the read, bytes otherwise.
+   """
+   if _core_reader and _mapped(address, length):
+      core = _core()
+      if core is not None:
+         start = _timer() if _profiler.tracing else None
+         data = core.read(address, length)
+         if data is not None:
+            if _profiler.enabled:
+               _profiler.read(length)
+               if start is not None:
+                  _trace_read(address, length, start)
+            return data
+   return _read_memory(address, length)
+
+# Visualizers of smart pointer pointees, keyed by (address, type).
+_pointee_visualizers = _stop_cache()
+
+# Printers constructed by Printer.__call__, keyed by (address, type).
+_visualizers = _stop_cache()
+
+# Layout facts derived from the debug information, keyed by
+# _layout_key.  Only plain Python values go in here; the gdb.Type
+# objects looked up along the way are kept in _layout_types instead.
+_layouts = collections.OrderedDict()
+
+# Types found by name lookups, which are costly in big programs, keyed
+# by (purpose, type name).  They only hold for this session.
+_layout_types = {}
+
+# The layouts are saved when GDB exits, in a file named after the build
+# ID of the executable, and loaded back when a later session opens the
+# same build.  Only the most recently used files and entries are kept.
+_layout_cache_version = 2
+_layout_cache_entries = 4096
+_layout_cache_files = 16
+
+# Path of the cache file for the current executable, or None
+_layout_cache_path = None
+
+def _layout_key(purpose, type):
+   """Return the _layouts key of the facts for PURPOSE about TYPE
+
+   The key names the build ID of the objfile defining TYPE, so that the
+   facts about a rebuilt shared library are not taken for those of the
+   old build.  Facts about types whose origin is unknown (the objfile
+   has no build ID, or GDB predates Type.objfile) are not saved.
+   """
+   objfile = getattr(type, 'objfile', _missing)
+   if objfile is None:
+      owner = '' # An architecture type, the same in every build
+   elif objfile is _missing:
+      owner = None
+   else:
+      owner = objfile.build_id
+   return (purpose, str(type), owner)
+
+def _layout_type(purpose, name, lookup):
+   "Return the type LOOKUP() finds for PURPOSE about type NAME, cached"
+   key = (purpose, name)
+   type = _layout_types.get(key)
+   if type is None:
+      type = _layout_types[key] = lookup()
+   return type
+
+def _layout_cache_dir():
+   base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+      os.path.expanduser('~'), '.cache')
+   return os.path.join(base, 'libcxx-printers')
+
+def _encode_layout(value):
+   # JSON has no tuples and only string keys, so tag both.
+   if isinstance(value, tuple):
+      return { 't': [_encode_layout(item) for item in value] }
+   if isinstance(value, dict):
+      return { 'd': [[_encode_layout(key), _encode_layout(item)]
+                     for (key, item) in value.items()] }
+   if isinstance(value, list):
+      return [_encode_layout(item) for item in value]
+   return value
+
+def _decode_layout(value):
+   if isinstance(value, dict):
+      if 't' in value:
+         return tuple(_decode_layout(item) for item in value['t'])
+      return dict((_decode_layout(key), _decode_layout(item))
+                  for (key, item) in value['d'])
+   if isinstance(value, list):
+      return [_decode_layout(item) for item in value]
+   if sys.version_info[0] == 2 and isinstance(value, unicode):
+      return str(value)
+   return value
+
+def _load_layouts(event):
+   "Start over with the saved layouts when a new executable is loaded"
+   global _layout_cache_path
+   objfile = event.new_objfile
+   # The new objfile can replace one whose types were looked up.
+   _layout_types.clear()
+   progspace = gdb.current_progspace()
+   if progspace is None or objfile.filename != progspace.filename:
+      return # A shared library
+   _save_layouts()
+   _layouts.clear()
+   _layout_cache_path = None
+   build_id = getattr(objfile, 'build_id', None)
+   if not build_id:
+      return
+   _layout_cache_path = os.path.join(_layout_cache_dir(), build_id + '.json')
+   try:
+      with open(_layout_cache_path) as cache:
+         saved = json.load(cache)
+      if saved.get('version') != _layout_cache_version:
+         return # Written by other printers, recompute everything
+      for (key, layout) in saved['layouts']:
+         _layouts[_decode_layout(key)] = _decode_layout(layout)
+   except (IOError, OSError, ValueError, KeyError, TypeError):
+      _layouts.clear()
+
+def _save_layouts():
+   if _layout_cache_path is None or not _layouts:
+      return
+   # Entries are kept in the order they were first computed, so the
+   #  oldest go first when there are too many.
+   entries = [(key, layout) for (key, layout) in _layouts.items()
+              if key[-1] is not None][-_layout_cache_entries:]
+   directory = os.path.dirname(_layout_cache_path)
+   try:
+      if not os.path.isdir(directory):
+         os.makedirs(directory)
+      temporary = '%s.%d' % (_layout_cache_path, os.getpid())
+      with open(temporary, 'w') as cache:
+         json.dump({ 'version': _layout_cache_version,
+                     'layouts': [[_encode_layout(key), _encode_layout(layout)]
+                                 for (key, layout) in entries] }, cache)
+      os.rename(temporary, _layout_cache_path)
+      # Drop the files of builds that have not been debugged for longest.
+      files = [os.path.join(directory, name) for name in os.listdir(directory)
+               if name.endswith('.json')]
+      files.sort(key=os.path.getmtime, reverse=True)
+      for stale in files[_layout_cache_files:]:
+         os.remove(stale)
+   except (IOError, OSError):
+      pass
+
+if hasattr(gdb, 'events'):
+   gdb.events.new_objfile.connect(_load_layouts)
+   atexit.register(_save_layouts)
+
+def _field_offset(type, name):
+   "Return the byte offset of field NAME in TYPE or its bases, or None"
+   for field in type.strip_typedefs().fields():
+      if not hasattr(field, 'bitpos'):
+         continue # Static member
+      if field.name == name:
+         return field.bitpos // 8
+      if field.is_base_class or not field.name:
+         # Look inside bases and anonymous unions
+         offset = _field_offset(field.type, name)
+         if offset is not None:
+            return field.bitpos // 8 + offset
+   return None
+
+def _member(type, names):
+   "Return (offset, type) of the nested member NAMES of TYPE, or None"
+   offset = 0
+   for name in names:
+      member = _field_offset(type, name)
+      if member is None:
+         return None
+      offset += member
+      type = _field_type(type, name)
+   return (offset, type)
+
+def _field_type(type, name):
+   "Return the type of field NAME in TYPE or its bases and unions"
+   for field in type.strip_typedefs().fields():
+      if not hasattr(field, 'bitpos'):
+         continue # Static member
+      if field.name == name:
+         return field.type
+      if field.is_base_class or not field.name:
+         found = _field_type(field.type, name)
+         if found is not None:
+            return found
+   return None
+
+def _node_links(node_type, names):
+   """Return (format, offsets) of the link pointers NAMES of NODE_TYPE
+
+   Walks follow the links by unpacking them with FORMAT from the node's
+   raw bytes at OFFSETS, rather than through a gdb.Value per field.
+   """
+   node_type = node_type.strip_typedefs()
+   key = _layout_key('node links %s' % ' '.join(names), node_type)
+   layout = _layouts.get(key, _missing)
+   if layout is _missing:
+      size = _field_type(node_type, names[0]).sizeof
+      layout = _layouts[key] = (
+         _target_byte_order() + _unsigned_formats[size],
+         tuple(_field_offset(node_type, name) for name in names))
+   return layout
+
+# The links of list and tree nodes, as _node_links takes them
+_list_links = ('__next_', '__prev_')
+_tree_links = ('__left_', '__right_', '__parent_')
+
+def _read_link(fmt, address, offset):
+   "Return the pointer at OFFSET in the node at ADDRESS, as a number"
+   size = struct.calcsize(fmt)
+   (link,) = struct.unpack(fmt, _read_memory(address + offset, size))
+   return link
+
+def _template_number(type, index):
+   "Return the integral template argument INDEX of TYPE"
+   type = type.strip_typedefs()
+   key = _layout_key('template argument %d' % index, type)
+   number = _layouts.get(key, _missing)
+   if number is _missing:
+      number = _layouts[key] = int(type.template_argument(index))
+   return number
+
+def _print_elements_limit():
+   "Return the 'print elements' setting, or None when it is unlimited"
+   try:
+      limit = gdb.parameter('print elements')
+   except RuntimeError:
+      return None
+   if not limit:
+      return None
+   return int(limit)
+
+def _print_symbol():
+   "Return whether GDB prints the symbol a pointer points into"
+   try:
+      return bool(gdb.parameter('print symbol'))
+   except RuntimeError:
+      return True
+
+def _limited(iterable):
+   """Lazily take children from ITERABLE up to the 'print elements' limit
+
+   One child past the limit is produced so GDB still knows to print an
+   ellipsis, but nothing beyond it is read from the inferior.
+   """
+   limit = _print_elements_limit()
+   if limit is None:
+      return iter(iterable)
+   return itertools.islice(iterable, limit + 1)
+
+# Encodings of wchar_t, char16_t and char32_t strings, by character size
+_wide_encodings = { 2: 'utf-16', 4: 'utf-32' }
+
 class StdStringPrinter:
    "Print a std::basic_string of some kind"
 
    def __init__(self, typename, val):
       self.typename = typename
+      type = val.type.strip_typedefs()
+      self.element_type = _layout_type('string element', str(type),
+                                       lambda: type.template_argument(0))
 
       # Figure out pointer and size:
       ss = val['__r_']['__first_']['__s']
@@ -85,70 +890,230 @@ class StdStringPrinter:
             # Audit plausibility of string by trying to access first and
             #  last character. Failures doing this will much faster than
             #  iterating from a readable address into an unreadable one.
-            char_ptr_type = val.type.template_argument(0).pointer()
-            first_char_ptr = self.ptr.cast(char_ptr_type)
-            first_char = first_char_ptr.dereference()
-            last_char_ptr = first_char_ptr + self.size
-            last_char = last_char_ptr.dereference()
-            # Force read from memory:
-            temp_str = '%s, %s' % (first_char, last_char)
+            #  The raw bytes are read so that no character has to be
+            #  converted through GDB's charset just to be thrown away.
+            width = self.element_type.sizeof
+            address = self._address()
+            if not _mapped(address, (int(self.size) + 1) * width):
+               raise gdb.MemoryError('Cannot access memory at address 0x%x' %
+                                     address)
+            _read_memory(address, width)
+            _read_memory(address + int(self.size) * width, width)
             self.display_hint = self._display_hint
       except:
+         _profiler.swallowed()
          self.ptr = 0
          self.size = -1
 
    def to_string(self):
+      return self._text(_print_elements_limit())
+
+   def _text(self, limit):
+      "Return the characters, eliding wide ones past LIMIT if it is not None"
       try:
          if self.size >= 0:
+            width = self.element_type.sizeof
+            if width in _wide_encodings:
+               return self._decode(width, limit)
             return self.ptr.string(length=self.size)
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
+   def _decode(self, width, limit):
+      # Wide characters are read in one go and decoded by Python, rather
+      #  than by GDB with the charset it guesses for the element type.
+      encoding = '%s-%s' % (_wide_encodings[width],
+                            'le' if _target_byte_order() == '<' else 'be')
+      #  Like GDB does for strings, only the first LIMIT characters are
+      #  read, and the rest is elided.
+      count = int(self.size)
+      if limit is not None and count > limit:
+         count = limit
+      data = _read_memory(self._address(), count * width)
+      text = data.decode(encoding, 'replace')
+      if count < self.size:
+         text += '...'
+      return text
+
    def _display_hint(self):
       return 'string'
 
+   def _address(self):
+      # The short form keeps its characters in an array.
+      return int(self.ptr.cast(self.element_type.pointer()))
+
+   @staticmethod
+   def _summarize(typename, val):
+      ss = val['__r_']['__first_']['__s']
+      if (ss['__size_'] & 0x1) == 0:
+         size = ss['__size_'] >> 1
+      else:
+         size = val['__r_']['__first_']['__l']['__size_']
+      return '%s (length=%d)' % (typename, int(size))
+
+   def _segments(self):
+      "Return (address, count) for each contiguous run of characters"
+      if self.size < 0:
+         return None
+      return [(self._address(), int(self.size))]
+
+# Addresses of the smart pointer pointees being printed, innermost last.
+# A pointee that holds a smart pointer to itself, directly or through
+# other objects, would otherwise be printed until the stack runs out.
+_pointees_printing = []
+
+# Nesting of pointees printed before the rest is abbreviated, as GDB's
+# max-depth does for plain structures.
+_pointee_depth = 20
+
 class PointerPrinter(object):
    "Print a unique_ptr, shared_ptr or weak_ptr"
 
    def __init__(self, typename, ptr):
       self.ptr = ptr
       self.val = None
+      self.subprinter = None
+      self.resolved = False
       self.visualizer = None
+      self.counts = None
       if self.ptr != 0:
          self.val = self.ptr.dereference()
-         # Dereference base type with visualizer, if it exists.
-         # Also, inherit iteratability, if that is a word.
-         self.visualizer = gdb.default_visualizer(self.val)
-         if ((self.visualizer is not None) and
-             hasattr(self.visualizer, 'children')):
+         # Building the visualizer of a libc++ pointee can be expensive,
+         #  so it is deferred until to_string or children needs it.  Any
+         #  other pointee is resolved now, as it always has been.
+         self.subprinter = libcxx_printer.find(self.val.type)
+         if self.subprinter is None:
+            self._resolve()
+            if ((self.visualizer is not None) and
+                hasattr(self.visualizer, 'children')):
+               self.children = self._children
+         else:
+            # Also, inherit iteratability, if that is a word.
             self.children = self._children
 
+   def _resolve(self):
+      if self.resolved:
+         return self.visualizer
+      self.resolved = True
+      # Several smart pointers often share one pointee, so visualize it
+      #  once per stop.
+      key = (int(self.ptr), str(self.val.type))
+      self.visualizer = _pointee_visualizers.get(key, _missing)
+      if self.visualizer is _missing:
+         self.visualizer = gdb.default_visualizer(self.val)
+         _pointee_visualizers[key] = self.visualizer
+      return self.visualizer
+
+   def _nested(self):
+      return (int(self.ptr) in _pointees_printing or
+              len(_pointees_printing) >= _pointee_depth)
+
    def _children(self):
-      return self.visualizer.children()
+      if self._nested():
+         return iter(())
+      visualizer = self._resolve()
+      if hasattr(visualizer, 'children'):
+         return self._printing(visualizer.children())
+      return iter(())
+
+   def _printing(self, children):
+      # GDB prints each child before asking for the next one, so the
+      #  pointee is being printed for as long as its children are taken.
+      _pointees_printing.append(int(self.ptr))
+      try:
+         for child in children:
+            yield child
+      finally:
+         _pointees_printing.pop()
 
    def to_string(self):
       if self.val is None:
          return 'empty'
-      val = self.val
-      if self.visualizer is not None:
-         val = self.visualizer.to_string()
-         if (hasattr(self.visualizer, 'display_hint') and
-             self.visualizer.display_hint() == 'string'):
-            val = '"%s"' % val
+      if self._nested():
+         val = '{...}'
+      else:
+         _pointees_printing.append(int(self.ptr))
+         try:
+            val = self._pointee_string()
+         finally:
+            _pointees_printing.pop()
+      if self.counts is not None:
+         return '%s (use_count=%d, weak_count=%d) => %s' % ((self.ptr,) +
+                                                            self.counts +
+                                                            (val,))
       return '%s => %s' % (self.ptr, val)
 
+   def _pointee_string(self):
+      visualizer = self._resolve()
+      if visualizer is None:
+         return '%s' % self.val
+      val = visualizer.to_string()
+      if (hasattr(visualizer, 'display_hint') and
+          visualizer.display_hint() == 'string'):
+         return '"%s"' % val
+      return '%s' % val
+
    def display_hint(self):
-      if (hasattr(self.visualizer, 'display_hint') and
-          self.visualizer.display_hint() != 'string'):
-         return self.visualizer.display_hint()
+      # Only construct a deferred pointee visualizer if its class can
+      #  provide a hint at all.
+      if ((self.subprinter is not None) and
+          not hasattr(self.subprinter.function, 'display_hint')):
+         return None
+      visualizer = self._resolve()
+      if (hasattr(visualizer, 'display_hint') and
+          visualizer.display_hint() != 'string'):
+         return visualizer.display_hint()
       return None
 
 class SharedPointerPrinter(PointerPrinter):
    "Print a shared_ptr or weak_ptr"
 
    def __init__(self, typename, val):
-      super(SharedPointerPrinter, self).__init__(typename, val['__ptr_'])
+      counts = None
+      cntrl = val['__cntrl_']
+      if cntrl != 0:
+         try:
+            counts = self._read_counts(cntrl)
+         except:
+            _profiler.swallowed()
+      ptr = val['__ptr_']
+      if counts is not None and counts[0] == 0:
+         # The pointee of an expired weak_ptr has been destroyed, so do not
+         #  look at it.
+         super(SharedPointerPrinter, self).__init__(typename,
+                                                    gdb.Value(0).cast(ptr.type))
+         self.ptr = ptr
+      else:
+         super(SharedPointerPrinter, self).__init__(typename, ptr)
+      self.counts = counts
+
+   @staticmethod
+   def _read_counts(cntrl):
+      "Return (use_count, weak_count) read from the control block"
+      block_type = cntrl.type.target().strip_typedefs()
+      key = _layout_key('__shared_weak_count', block_type)
+      layout = _layouts.get(key)
+      if layout is None:
+         owners = _field_offset(block_type, '__shared_owners_')
+         weak_owners = _field_offset(block_type, '__shared_weak_owners_')
+         size = gdb.lookup_type('long').sizeof
+         layout = _layouts[key] = (owners, weak_owners, size)
+      (owners, weak_owners, size) = layout
+      data = _read_memory(int(cntrl), max(owners, weak_owners) + size)
+      use_count = _unpack_integers(data[owners:owners + size], size, True)[0] + 1
+      weak_count = _unpack_integers(data[weak_owners:weak_owners + size],
+                                    size, True)[0] + 1
+      # The shared owners collectively hold one weak reference.
+      if use_count > 0:
+         weak_count -= 1
+      return (use_count, weak_count)
+
+   def to_string(self):
+      if self.counts is not None and self.counts[0] == 0:
+         return 'expired (use_count=0, weak_count=%d)' % self.counts[1]
+      return super(SharedPointerPrinter, self).to_string()
 
 class UniquePointerPrinter(PointerPrinter):
    "Print a unique_ptr"
@@ -164,8 +1129,8 @@ class StdPairPrinter:
       self.val = val
 
    def children(self):
-      return [('[0] = first ', self.val['first']),
-              ('[1] = second', self.val['second'])]
+      yield ('[0] = first ', self.val['first'])
+      yield ('[1] = second', self.val['second'])
 
    def to_string(self):
       return 'pair'
@@ -194,33 +1159,64 @@ class StdTuplePrinter:
       self.val = val
 
    def children(self):
-      return self._iterator(self.val)
+      return _limited(self._iterator(self.val))
 
    def to_string(self):
       if len(self.val.type.fields()) == 0:
          return 'empty'
       return 'tuple'
 
+class _CycleGuard(object):
+   """Spot a loop in a chain of node addresses, with Brent's algorithm
+
+   Corrupt or uninitialized nodes can link back to an earlier node.  A
+   loop is reported within about twice the number of distinct nodes, so
+   walking a chain stays bounded without remembering every node.
+   """
+
+   __slots__ = ('mark', 'power', 'steps')
+
+   def __init__(self, address):
+      self.mark = address
+      self.power = 1
+      self.steps = 0
+
+   def revisits(self, address):
+      if address == self.mark:
+         return True
+      self.steps += 1
+      if self.steps == self.power:
+         self.mark = address
+         self.power *= 2
+         self.steps = 0
+      return False
+
 class StdListPrinter:
    "Print a std::list"
 
    class _iterator(Iterator):
       def __init__(self, head, num_nodes):
-         self.head = head.address
-         self.base = head['__next_']
+         self.head = int(head.address)
+         self.base = int(head['__next_'])
          self.num_nodes = num_nodes
-         self.nodetype = self.base.type
+         self.nodetype = head['__next_'].type
+         (self.format, (self.next, _)) = _node_links(self.nodetype.target(),
+                                                     _list_links)
          self.count = 0
+         self.guard = _CycleGuard(self.head)
 
       def __iter__(self):
          return self
 
       def __next__(self):
          if ((self.base == self.head) or
-             (self.count == self.num_nodes)):
+             (self.count == self.num_nodes) or
+             self.guard.revisits(self.base)):
             raise StopIteration
-         elt = self.base.cast(self.nodetype).dereference()
-         self.base = elt['__next_']
+         elt = gdb.Value(self.base).cast(self.nodetype).dereference()
+         self.base = _read_link(self.format, self.base, self.next)
+         if _profiler.enabled:
+            _profiler.node()
          count = self.count
          self.count = self.count + 1
          return ('[%d]' % count, elt['__value_'])
@@ -230,16 +1226,29 @@ class StdListPrinter:
       self.val = val
       self.size = val['__size_alloc_']['__first_']
       try:
-         iterator = self._children()           # Get size by counting iterations and ...
-         if self.size != len(list(iterator)):  #  compare with self.size
-            self.size = -1                     #  Invalidate if no match
-         elif self.size > 0:
+         if self.size > 0:
+            # Audit plausibility of list by reading the first and last
+            #  nodes rather than walking all of them.
+            (first, last) = (val['__end_']['__next_'], val['__end_']['__prev_'])
+            (fmt, (next_offset, prev_offset)) = _node_links(
+               first.type.target(), _list_links)
+            _read_link(fmt, int(first), next_offset)
+            _read_link(fmt, int(last), prev_offset)
             self.children = self._children     # Only provide children method if we have some
       except:
+         _profiler.swallowed()
          self.size = -1
 
    def _children(self):
-      return self._iterator(self.val['__end_'], self.size)
+      return _limited(self._iterator(self.val['__end_'], self.size))
+
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (length=%d)' % (typename, int(val['__size_alloc_']['__first_']))
+
+   def _elements(self):
+      for (label, value) in self._iterator(self.val['__end_'], self.size):
+         yield value
 
    def to_string(self):
       try:
@@ -248,6 +1257,7 @@ class StdListPrinter:
          elif self.size > 0:
             return '%s (length=%d)' % (self.typename, int(self.size))
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
@@ -268,8 +1278,12 @@ class StdForwardListPrinter:
 
    class _iterator(Iterator):
       def __init__(self, head):
-         self.node = head
+         self.node = int(head)
+         self.nodetype = head.type
+         (self.format, (self.next,)) = _node_links(self.nodetype.target(),
+                                                   ('__next_',))
          self.count = 0
+         self.guard = _CycleGuard(0)
 
       def __iter__(self):
          return self
@@ -277,10 +1291,16 @@ class StdForwardListPrinter:
       def __next__(self):
          if self.node == 0:
             raise StopIteration
-
-         result = ('[%d]' % self.count, self.node['__value_'])
+         if self.guard.revisits(self.node):
+            # A loop would otherwise never end, as there is no size.
+            raise gdb.error('cycle in std::forward_list nodes')
+
+         node = gdb.Value(self.node).cast(self.nodetype).dereference()
+         result = ('[%d]' % self.count, node['__value_'])
+         if _profiler.enabled:
+            _profiler.node()
          self.count += 1
-         self.node = self.node['__next_']
+         self.node = _read_link(self.format, self.node, self.next)
          return result
 
    def __init__(self, typename, val):
@@ -288,15 +1308,29 @@ class StdForwardListPrinter:
       self.typename = typename
       self.head = val['__before_begin_']['__first_']['__next_']
       try:
-         iterator = self._children() # Get size by counting iterations
-         self.size = len(list(iterator))
+         # There is no stored size, so count the nodes without keeping them
+         self.size = 0
+         for item in self._iterator(self.head):
+            self.size += 1
       except:
+         _profiler.swallowed()
          self.size = -1
       if self.size > 0:
             self.children = self._children     # Only provide children method if we have some
 
    def _children(self):
-      return self._iterator(self.head)
+      return _limited(self._iterator(self.head))
+
+   @staticmethod
+   def _summarize(typename, val):
+      # The length is not stored, so only tell whether there are nodes.
+      if val['__before_begin_']['__first_']['__next_'] == 0:
+         return 'empty'
+      return typename
+
+   def _elements(self):
+      for (label, value) in self._iterator(self.head):
+         yield value
 
    def to_string(self):
       try:
@@ -305,6 +1339,7 @@ class StdForwardListPrinter:
          elif self.size > 0:
             return '%s (length=%d)' % (self.typename, int(self.size))
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
@@ -325,6 +1360,8 @@ class StdArrayPrinter:
             raise StopIteration
 
          elem = self.val[self.count]
+         if _profiler.enabled:
+            _profiler.node()
          return_tuple = ('[%d]' % self.count, elem)
          self.count += 1
          return return_tuple
@@ -332,10 +1369,22 @@ class StdArrayPrinter:
    def __init__(self, typename, val):
       self.typename = typename
       self.val = val['__elems_']
-      self.size = val.type.template_argument(1)
+      self.size = _template_number(val.type, 1)
+      # The element type, without looking the template argument up
+      self.element_type = self.val.type.strip_typedefs().target()
+
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (length=%d)' % (typename, _template_number(val.type, 1))
 
    def children(self):
-      return self._iterator(self.val,self.size)
+      return _limited(self._iterator(self.val,self.size))
+
+   def _segments(self):
+      "Return (address, count) for each contiguous run of elements"
+      if self.size <= 0:
+         return []
+      return [(int(self.val.address), int(self.size))]
 
    def to_string(self):
       return '(length=%d)' % self.size
@@ -361,10 +1410,15 @@ class StdVectorPrinter:
 
       def __next__(self):
          count = self.count
-         self.count = self.count + 1
          if self.bitvec:
             if count == self.size:
                raise StopIteration
+         elif self.item == self.finish:
+            raise StopIteration
+         self.count = self.count + 1
+         if _profiler.enabled:
+            _profiler.node()
+         if self.bitvec:
             elt = self.item.dereference()
             if elt & (1 << self.so):
                obit = True
@@ -376,8 +1430,6 @@ class StdVectorPrinter:
                self.so = 0
             return ('[%d]' % count, obit)
          else:
-            if self.item == self.finish:
-               raise StopIteration
             elt = self.item.dereference()
             self.item = self.item + 1
             return ('[%d]' % count, elt)
@@ -399,6 +1451,7 @@ class StdVectorPrinter:
       else:
          self.size = self.val['__end_'] - self.val['__begin_']
          self.capacity = self.val['__end_cap_']['__first_'] - self.val['__begin_']
+         self.element_type = self.val['__begin_'].type.target()
 
       if self.size > self.capacity:
          self.size = -1 # Implausible
@@ -413,25 +1466,51 @@ class StdVectorPrinter:
                back_ptr = front_ptr + ((self.size - 1)/self.bits_per_word)
             else:
                back_ptr = self.val['__end_'] - 1
+            _check_mapped(front_ptr, back_ptr - front_ptr + 1)
             # Force read from memory:
             temp_str = '%s, %s' % (front_ptr.dereference(), back_ptr.dereference())
             # If read didn't throw exception, we are comfortable walking this
             #  vector
             self.children = self._children
          except:
+            _profiler.swallowed()
             self.size = -1
 
    def _children(self):
       if self.is_bool:
-         return self._iterator(self.val['__begin_'],
-                               self.val['__size_'],
-                               self.bits_per_word,
-                               self.is_bool)
+         return _limited(self._iterator(self.val['__begin_'],
+                                        self.val['__size_'],
+                                        self.bits_per_word,
+                                        self.is_bool))
       else:
-         return self._iterator(self.val['__begin_'],
-                               self.val['__end_'],
-                               0,
-                               self.is_bool)
+         return _limited(self._iterator(self.val['__begin_'],
+                                        self.val['__end_'],
+                                        0,
+                                        self.is_bool))
+
+   @staticmethod
+   def _summarize(typename, val):
+      if any(f.name == '__bits_per_word' for f in val.type.fields()):
+         return '%s<bool> (length=%d)' % (typename, int(val['__size_']))
+      begin = val['__begin_']
+      return '%s (length=%d, capacity=%d)' % (
+         typename, int(val['__end_'] - begin),
+         int(val['__end_cap_']['__first_'] - begin))
+
+   def _segments(self):
+      "Return (address, count) for each contiguous run of elements"
+      if self.is_bool:
+         return None # Packed bits, see _elements
+      if self.size <= 0:
+         return []
+      return [(int(self.val['__begin_']), int(self.size))]
+
+   def _elements(self):
+      # Only used for vector<bool>, whose elements are packed bits
+      iterator = self._iterator(self.val['__begin_'], self.val['__size_'],
+                                self.bits_per_word, self.is_bool)
+      for (label, value) in iterator:
+         yield value
 
    def to_string(self):
       try:
@@ -454,6 +1533,7 @@ class StdVectorPrinter:
                else:
                   return '%s (length=%d, capacity=%d)' % (self.typename, int(self.size), int(capacity))
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
@@ -467,6 +1547,7 @@ class StdVectorIteratorPrinter:
       try:
          return ('%s' % (self.val['__i'].dereference()))
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class StdVectorBoolIteratorPrinter:
@@ -483,6 +1564,7 @@ class StdVectorBoolIteratorPrinter:
          else:
             return False
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class StdSplitBufferPrinter:
@@ -500,6 +1582,8 @@ class StdSplitBufferPrinter:
          if self.ptr >= self.end:
             raise StopIteration
          return_tuple = ('[%d]' % int(self.count), self.ptr.dereference())
+         if _profiler.enabled:
+            _profiler.node()
          self.count += 1
          self.ptr += 1
          return return_tuple
@@ -515,13 +1599,13 @@ class StdSplitBufferPrinter:
          self.capacity = -1
       try:
          if self.size > 0:
-            iterator = self._children()           # Get size by counting iterations and ...
-            if self.size != len(list(iterator)):  #  compare with self.size
-               self.size     = -1                 #  Invalidate if no match
-               self.capacity = -1
-            else:
-               self.children = self._children # Only provide children method if we have some
+            # Audit plausibility by reading the first and last entries
+            _check_mapped(self.begin, self.size)
+            temp_str = '%s, %s' % (self.begin.dereference(),
+                                   (self.end - 1).dereference())
+            self.children = self._children # Only provide children method if we have some
       except:
+         _profiler.swallowed()
          self.size = -1
          self.capacity = -1
 
@@ -538,11 +1622,21 @@ class StdSplitBufferPrinter:
          elif self.size > 0:
             return '(length=%d, capacity=%d)' % (self.size, self.capacity)
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
    def _children(self):
-      return self._iterator(self.begin, self.end)
+      return _limited(self._iterator(self.begin, self.end))
+
+def _deque_block_size(val):
+   "Return the number of elements per block of the deque VAL"
+   # A static member, which GDB has to look up as a symbol.
+   key = _layout_key('deque block size', val.type.strip_typedefs())
+   block_size = _layouts.get(key)
+   if block_size is None:
+      block_size = _layouts[key] = int(val['__block_size'])
+   return block_size
 
 class StdDequePrinter:
    "Print a std::deque"
@@ -577,34 +1671,42 @@ class StdDequePrinter:
          data_ptr = block_ptr.dereference() + idx
 
          return_tuple = ('[%d]' % int(self.count), data_ptr.dereference())
+         if _profiler.enabled:
+            _profiler.node()
          self.count += 1
          return return_tuple
 
    def __init__(self, typename, val):
       self.typename   = typename
-      self.block_size = val['__block_size']
+      self.block_size = _deque_block_size(val)
       self.blocks     = StdSplitBufferPrinter(val['__map_'])
       self.start      = val['__start_']
       self.size       = val['__size_']['__first_']
       self.capacity   = self.blocks.capacity * self.block_size
-      #try:
-      if ((self.size > 0) and
-          (self.start < self.block_size) and
-          (hasattr(self.blocks, 'children')) and
-          (self.size <= (self.blocks.size * self.block_size))):
-         # Attempt to dereference each of the block pointers as a quick
-         #  litmus test of whether this data structure is valid
-         for (idx, ptr) in self.blocks.children():
-            test_str = '%s' % ptr.dereference()
-         iterator = self._children()           # Get size by counting iterations and ...
-         if self.size != len(list(iterator)):  #  compare with self.size
-            self.size = -1                     #  Invalidate if no match
-         else:
+      self.element_type = self.blocks.begin.type.target().target()
+      try:
+         if ((self.size > 0) and
+             (self.start < self.block_size) and
+             (hasattr(self.blocks, 'children')) and
+             (self.size <= (self.blocks.size * self.block_size))):
+            # Attempt to dereference the first and last block pointers as a
+            #  quick litmus test of whether this data structure is valid
+            test_str = '%s, %s' % (self.blocks.begin.dereference().dereference(),
+                                   (self.blocks.end - 1).dereference().dereference())
             self.children = self._children     # Only provide children method if we have some
-      else:
+         elif self.size != 0:
+            self.size = -1
+      except:
+         _profiler.swallowed()
          self.size = -1
-      #except:
-      #   self.size     = -1
+
+   @staticmethod
+   def _summarize(typename, val):
+      blocks = val['__map_']
+      capacity = ((blocks['__end_cap_']['__first_'] - blocks['__begin_']) *
+                  _deque_block_size(val))
+      return '%s (length=%d, capacity=%d)' % (
+         typename, int(val['__size_']['__first_']), int(capacity))
 
    def to_string(self):
       try:
@@ -613,12 +1715,37 @@ class StdDequePrinter:
          elif self.size > 0:
             return '%s (length=%d, capacity=%d)' % (self.typename, self.size, self.capacity)
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
    def _children(self):
-      return self._iterator(self.size, self.block_size, self.start,
-                            self.blocks.begin, self.blocks.end)
+      return _limited(self._iterator(self.size, self.block_size, self.start,
+                                     self.blocks.begin, self.blocks.end))
+
+   def _segments(self):
+      "Yield (address, count) for each contiguous run of elements"
+      if self.size <= 0:
+         return
+      block_size = int(self.block_size)
+      start = int(self.start)
+      remaining = int(self.size)
+      element_size = self.element_type.sizeof
+      pointer_size = self.blocks.begin.type.target().sizeof
+      # Block pointers are read from the map a page at a time.
+      block = start // block_size
+      last_block = (start + remaining - 1) // block_size
+      offset = start % block_size
+      while block <= last_block:
+         count = min(last_block + 1 - block, 4096)
+         data = _read_memory(int(self.blocks.begin) + block * pointer_size,
+                             count * pointer_size)
+         for address in _unpack_integers(data, pointer_size, False):
+            run = min(block_size - offset, remaining)
+            yield (address + offset * element_size, run)
+            remaining -= run
+            offset = 0
+         block += count
 
 class StdDequeIteratorPrinter:
    "Print std::deque::iterator"
@@ -630,6 +1757,7 @@ class StdDequeIteratorPrinter:
       try:
          return '%s' % self.val['__ptr_'].dereference()
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class StdStackOrQueuePrinter:
@@ -647,56 +1775,368 @@ class StdStackOrQueuePrinter:
    def to_string(self):
       return '%s = %s' % (self.typename, self.visualizer.to_string())
 
+   @staticmethod
+   def _summarize(typename, val):
+      subprinter = libcxx_printer.find(val['c'].type)
+      if subprinter is None or not hasattr(subprinter.function, '_summarize'):
+         return typename
+      return '%s = %s' % (typename,
+                          subprinter.function._summarize(subprinter.name,
+                                                         val['c']))
+
    def display_hint(self):
       if hasattr(self.visualizer, 'display_hint'):
          return self.visualizer.display_hint()
       return None
 
+class StdPriorityQueuePrinter(StdStackOrQueuePrinter):
+   """Print a std::priority_queue
+
+   With libcxx-priority-queue-display set to "top", the children are the
+   elements in priority order rather than in heap order, for numbers in
+   a vector ordered by std::less or std::greater.  They are found with a
+   best-first walk of the heap, so showing k elements costs O(k log k)
+   work and one read per pair of siblings.
+   """
+
+   def __init__(self, typename, val):
+      super(StdPriorityQueuePrinter, self).__init__(typename, val)
+      self.heap = None
+      if _libcxx_setting('libcxx-priority-queue-display', 'heap') != 'top':
+         return
+      try:
+         self.heap = self._heap(val)
+      except:
+         _profiler.swallowed()
+      if self.heap is not None:
+         self.children = self._top
+
+   @staticmethod
+   def _heap(val):
+      # Return (begin, size, element size, unpacker, max first) or None
+      container = val['c']
+      subprinter = libcxx_printer.find(container.type)
+      if subprinter is None or subprinter.function is not StdVectorPrinter:
+         return None
+      order = StdPriorityQueuePrinter._order(val.type)
+      begin = container['__begin_']
+      element_type = begin.type.target()
+      codec = _element_codec(element_type)
+      if (order is None or codec is None or codec[1] is not None or
+          element_type.strip_typedefs().code == gdb.TYPE_CODE_PTR):
+         return None
+      size = int(container['__end_'] - begin)
+      if size <= 0:
+         return None
+      _check_mapped(begin, size)
+      return (begin, size, element_type.sizeof, struct.Struct(codec[0]),
+              order == 'less')
+
+   @staticmethod
+   def _order(type):
+      # Return 'less' or 'greater' for those comparators, None otherwise
+      type = type.strip_typedefs()
+      key = _layout_key('heap order', type)
+      order = _layouts.get(key, _missing)
+      if order is _missing:
+         match = re.match(r'^std::(__1::)?(less|greater)<',
+                          str(type.template_argument(2).strip_typedefs()))
+         order = _layouts[key] = match and match.group(2)
+      return order
+
+   def _top(self):
+      return _limited(self._best_first())
+
+   def _best_first(self):
+      (begin, size, element_size, unpacker, max_first) = self.heap
+      address = int(begin)
+      sign = -1 if max_first else 1
+      (top,) = unpacker.unpack(_read_memory(address, element_size))
+      # Entries are (ordering key, index); the heap property guarantees
+      #  the best remaining element is on the frontier.  The numbers only
+      #  order the walk: the children are the elements themselves, so
+      #  they print with the element type's format.
+      frontier = [(sign * top, 0)]
+      rank = 0
+      while frontier:
+         (key, index) = heapq.heappop(frontier)
+         yield ('[%d]' % rank, (begin + index).dereference())
+         rank += 1
+         child = 2 * index + 1
+         if child >= size:
+            continue
+         count = min(2, size - child)
+         data = _read_memory(address + child * element_size,
+                             count * element_size)
+         for offset in range(count):
+            (value,) = unpacker.unpack_from(data, offset * element_size)
+            heapq.heappush(frontier, (sign * value, child + offset))
+
 class StdBitsetPrinter:
    "Print a std::bitset"
 
    def __init__(self, typename, val):
       self.typename = typename
       self.val = val
-      self.bit_count = val.type.template_argument(0)
+      self.bit_count = _template_number(val.type, 0)
+      self.mode = _libcxx_setting('libcxx-bitset-display', 'indices')
+      self.words = None
+      try:
+         if self.bit_count > 0:
+            self.words = self._read_words()
+      except:
+         _profiler.swallowed()
+      if self.mode == 'indices' and self.words is not None:
+         self.children = self._children
 
-   def to_string(self):
-      return '%s (length=%d)' % (self.typename, self.bit_count)
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (length=%d)' % (typename, _template_number(val.type, 0))
 
-   def children(self):
+   def _read_words(self):
+      # All of __first_ is fetched with a single read and decoded into
+      #  Python ints, instead of shifting gdb.Values one bit at a time.
       words = self.val['__first_']
-      words_count = self.val['__n_words']
-      if self.val['__bits_per_word'].is_optimized_out:
-         bits_per_word = 64 # Correct for the moment
+      words_type = words.type.strip_typedefs()
+      if words_type.code == gdb.TYPE_CODE_ARRAY:
+         word_size = words_type.target().sizeof
       else:
-         bits_per_word = self.val['__bits_per_word']
-      word_index = 0
-      result = []
-
-      while word_index < words_count:
-         bit_index = 0
-         if words_count == 1:
-            word = words
-         else:
-            word = words[word_index]
-         while word != 0:
-            if (word & 0x1) != 0:
-               result.append(('[%d]' % (word_index * bits_per_word + bit_index), 1))
-            word >>= 1
-            bit_index += 1
-         word_index += 1
+         word_size = words_type.sizeof
+      self.bits_per_word = word_size * 8
+      data = _read_memory(int(words.address), words_type.sizeof)
+      return _unpack_integers(data, word_size, False)
+
+   def _set_bits(self):
+      base = 0
+      for word in self.words:
+         while word:
+            low = word & -word
+            index = base + low.bit_length() - 1
+            if index >= self.bit_count:
+               return
+            yield index
+            word ^= low
+         base += self.bits_per_word
+
+   def _children(self):
+      return _limited(('[%d]' % index, 1) for index in self._set_bits())
+
+   def _digits(self, bits_per_digit):
+      # Most significant bit first, like operator<< on a bitset
+      spec = '0%d%s' % (self.bits_per_word // bits_per_digit,
+                        'x' if bits_per_digit == 4 else 'b')
+      digits = ''.join(format(word, spec) for word in reversed(self.words))
+      count = (self.bit_count + bits_per_digit - 1) // bits_per_digit
+      digits = digits[-count:]
+      limit = _print_elements_limit()
+      if limit is not None and len(digits) > limit:
+         digits = digits[:limit] + '...'
+      return digits
+
+   def _runs(self):
+      runs = []
+      limit = _print_elements_limit()
+      first = last = None
+      for index in self._set_bits():
+         if last is not None and index == last + 1:
+            last = index
+            continue
+         if first is not None:
+            runs.append((first, last))
+            if limit is not None and len(runs) > limit:
+               break
+         first = last = index
+      else:
+         if first is not None:
+            runs.append((first, last))
+      text = ', '.join(('%d' % first) if first == last
+                       else ('%d-%d' % (first, last))
+                       for (first, last) in runs[:limit])
+      if limit is not None and len(runs) > limit:
+         text += ', ...'
+      return text
 
-      return result
+   def to_string(self):
+      if self.bit_count > 0 and self.words is None:
+         return 'invalid'
+      if self.bit_count == 0:
+         # There are no words to format
+         if self.mode == 'hex':
+            return '%s (length=0) = 0x' % self.typename
+         elif self.mode == 'binary':
+            return '%s (length=0) = 0b' % self.typename
+         elif self.mode == 'runs':
+            return '%s (length=0, count=0) = {}' % self.typename
+         return '%s (length=0)' % self.typename
+      if self.mode == 'hex':
+         return '%s (length=%d) = 0x%s' % (self.typename, self.bit_count,
+                                           self._digits(4))
+      elif self.mode == 'binary':
+         return '%s (length=%d) = 0b%s' % (self.typename, self.bit_count,
+                                           self._digits(1))
+      elif self.mode == 'runs':
+         count = sum(bin(word).count('1') for word in self.words or ())
+         return '%s (length=%d, count=%d) = {%s}' % (self.typename,
+                                                     self.bit_count, count,
+                                                     self._runs())
+      return '%s (length=%d)' % (self.typename, self.bit_count)
+
+# Map children are labelled with their keys.  Keys of the common types
+# are decoded from their raw bytes, which spares a full gdb.Value
+# formatting (and for strings a printer with its audit) per child.
+
+# Short strings that GDB prints as they are, between double quotes
+_plain_key = re.compile(b'^[ !#-\\[\\]-~]*$')
+
+# A run of characters long enough for GDB to print <repeats N times>
+_repeated_key = re.compile(b'(.)\\1{9}')
+
+def _compute_key_layout(type):
+   code = type.code
+   if code == gdb.TYPE_CODE_PTR:
+      target = type.target().strip_typedefs()
+      if target.code == gdb.TYPE_CODE_FUNC or target.sizeof == 1:
+         return None # GDB adds a symbol or the pointed-to string
+      return ('pointer', _target_byte_order() + _unsigned_formats[type.sizeof],
+              type.sizeof, None)
+   if code == gdb.TYPE_CODE_BOOL:
+      if type.sizeof not in _unsigned_formats:
+         return None
+      return ('scalar', _target_byte_order() + _unsigned_formats[type.sizeof],
+              type.sizeof, { 0: 'false', 1: 'true' })
+   if code in (gdb.TYPE_CODE_INT, gdb.TYPE_CODE_ENUM):
+      if type.sizeof not in _unsigned_formats or 'char' in str(type):
+         return None
+      fmt = _unsigned_formats[type.sizeof]
+      if _is_signed(type):
+         fmt = fmt.lower()
+      names = None
+      if code == gdb.TYPE_CODE_ENUM:
+         names = dict((field.enumval, field.name) for field in type.fields())
+      return ('scalar', _target_byte_order() + fmt, type.sizeof, names)
+   if code == gdb.TYPE_CODE_STRUCT:
+      subprinter = libcxx_printer.find(type)
+      if (subprinter is None or subprinter.function is not StdStringPrinter or
+          type.template_argument(0).sizeof != 1):
+         return None
+      flag = _member(type, ['__r_', '__first_', '__s', '__size_'])
+      short = _member(type, ['__r_', '__first_', '__s', '__data_'])
+      size = _member(type, ['__r_', '__first_', '__l', '__size_'])
+      data = _member(type, ['__r_', '__first_', '__l', '__data_'])
+      if None in (flag, short, size, data):
+         return None
+      order = _target_byte_order()
+      return ('string', flag[0], short[0],
+              size[0], order + _unsigned_formats[size[1].sizeof],
+              data[0], order + _unsigned_formats[data[1].sizeof],
+              type.sizeof)
+   return None
+
+def _key_layout(type):
+   """Return how to decode a key of TYPE from its raw bytes, or None
+
+   Scalars are ('scalar', struct format, size, enumerator names or None)
+   and pointers are ('pointer', struct format, size, None).  Narrow
+   std::strings are ('string', ...) with the offsets of their fields.
+   """
+   type = type.strip_typedefs()
+   key = _layout_key('key label', type)
+   layout = _layouts.get(key, _missing)
+   if layout is _missing:
+      layout = _layouts[key] = _compute_key_layout(type)
+   return layout
+
+def _string_key_label(layout, address):
+   (_, flag, short, size, size_format, data, data_format, length) = layout
+   limit = _print_elements_limit()
+   raw = _read_memory(address, length)
+   size_flag = ord(raw[flag:flag + 1])
+   if not (size_flag & 0x1):
+      text = raw[short:short + (size_flag >> 1)]
+   else:
+      (count,) = struct.unpack_from(size_format, raw, size)
+      if limit is not None and count > limit:
+         return None
+      (pointer,) = struct.unpack_from(data_format, raw, data)
+      text = _read_memory(pointer, count)
+   if ((limit is not None and len(text) > limit) or
+       not _plain_key.match(text) or _repeated_key.search(text)):
+      return None # Needs GDB's escaping, elision or repeats
+   return '"%s"' % text.decode('ascii')
+
+def _fast_key_label(key):
+   # Return the label decoded from the raw bytes of KEY, or None
+   if key.address is None:
+      return None
+   layout = _key_layout(key.type)
+   if layout is None:
+      return None
+   address = int(key.address)
+   if layout[0] == 'string':
+      return _string_key_label(layout, address)
+   (kind, fmt, size, names) = layout
+   if kind == 'pointer' and _print_symbol():
+      return None # GDB adds <symbol+offset> for pointers into symbols
+   (value,) = struct.unpack(fmt, _read_memory(address, size))
+   if kind == 'pointer':
+      return '0x%x' % value
+   if names is None:
+      return '%d' % value
+   return names.get(value)
+
+def _key_label(key):
+   "Return the text GDB prints for the map key KEY"
+   try:
+      label = _fast_key_label(key)
+   except:
+      # An unreadable key, e.g. a long string with a wild buffer, is
+      #  labelled by its printer (as "invalid") like any other.
+      _profiler.swallowed()
+      label = None
+   if label is not None:
+      return label
+   return str(key)
+
+def _group_key(key):
+   """Return what tells the map key KEY apart from any different key
+
+   Labels will not do, as GDB elides long strings in them.  Scalars and
+   pointers are told apart by their raw bytes and strings by all their
+   characters; other keys fall back to their label.
+   """
+   type = key.type.strip_typedefs()
+   if _scalar_code(type) is not None and key.address is not None:
+      return _read_memory(int(key.address), type.sizeof)
+   subprinter = libcxx_printer.find(type)
+   if subprinter is not None and subprinter.function is StdStringPrinter:
+      printer = StdStringPrinter(subprinter.name, key)
+      if printer.size >= 0:
+         return _read_memory(printer._address(),
+                             int(printer.size) * printer.element_type.sizeof)
+   return _key_label(key)
+
+def _node_pointer_type(tree_type):
+   "Return the __node_pointer type of the libc++ __tree TREE_TYPE"
+   name = tree_type.strip_typedefs().name
+   return _layout_type('node pointer', name,
+                       lambda: gdb.lookup_type(name + '::__node_pointer'))
 
 class StdRbtreePrinter(object):
    class _iterator(Iterator):
       def __init__(self, rbtree):
-         self.node = rbtree['__begin_node_']
+         self.node = int(rbtree['__begin_node_'])
          self.size = rbtree['__pair3_']['__first_']
          if self.size < 0:
             self.size = 0
-         self.node_pointer_type = gdb.lookup_type(rbtree.type.strip_typedefs().name + '::__node_pointer')
+         self.node_pointer_type = _node_pointer_type(rbtree.type)
+         (self.format, (self.left, self.right, self.parent)) = _node_links(
+            self.node_pointer_type.target(), _tree_links)
          self.count = 0
+         # A red-black tree of n nodes is at most 2 * log2(n + 1) deep, so
+         #  no step to the next node can climb or descend further.  A
+         #  corrupt tree with a loop in its links stops there.
+         self.max_depth = 2 * (int(self.size) + 1).bit_length()
+         self.guard = _CycleGuard(0)
 
       def __iter__(self):
          return self
@@ -708,24 +2148,39 @@ class StdRbtreePrinter(object):
          if self.count >= self.size:
             raise StopIteration
 
-         node = self.node.cast(self.node_pointer_type)
-         result = node
+         node = self.node
+         if self.guard.revisits(node):
+            raise StopIteration
+         result = gdb.Value(node).cast(self.node_pointer_type)
+         if _profiler.enabled:
+            _profiler.node()
          # Compute the next node.
          try:
-            if node.dereference()['__right_']:
-               node = node.dereference()['__right_']
-               while node.dereference()['__left_']:
-                  node = node.dereference()['__left_']
+            (fmt, depth) = (self.format, 0)
+            right = _read_link(fmt, node, self.right)
+            if right:
+               node = right
+               left = _read_link(fmt, node, self.left)
+               while left:
+                  node = left
+                  left = _read_link(fmt, node, self.left)
+                  depth += 1
+                  if depth > self.max_depth:
+                     raise StopIteration
             else:
-               parent_node = node.dereference()['__parent_']
-               while node != parent_node.dereference()['__left_']:
+               parent_node = _read_link(fmt, node, self.parent)
+               while node != _read_link(fmt, parent_node, self.left):
                   node = parent_node
-                  parent_node = parent_node.dereference()['__parent_']
+                  parent_node = _read_link(fmt, parent_node, self.parent)
+                  depth += 1
+                  if depth > self.max_depth:
+                     raise StopIteration
                node = parent_node
 
             return_tuple = (('[%d]' % self.count), result.dereference()['__value_'])
 
          except:
+            _profiler.swallowed()
             raise StopIteration
 
          self.node = node
@@ -736,13 +2191,16 @@ class StdRbtreePrinter(object):
       self.typename = typename
       self.val = val
       try:
-         iterator = self._children()
-         self.size = len(list(iterator)) # Get size by counting iterations and ...
-         if self.size != len(iterator):  #  compare with size from __len__ method
-            self.size = -1               #  Invalidate if no match
-         elif self.size > 0:
+         self.size = int(val['__pair3_']['__first_'])
+         if self.size > 0:
+            # Audit plausibility by reading the leftmost node instead of
+            #  walking the whole tree.
+            (fmt, (left, _, _)) = _node_links(
+               _node_pointer_type(val.type).target(), _tree_links)
+            _read_link(fmt, int(val['__begin_node_']), left)
             self.children = self._children  # Only provide children method if we have some
       except:
+         _profiler.swallowed()
          self.size = -1
 
    def to_string(self):
@@ -752,11 +2210,16 @@ class StdRbtreePrinter(object):
          elif self.size > 0:
             return '%s (count=%d)' % (self.typename, int(self.size))
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
    def _children(self):
-      return self._iterator(self.val)
+      return _limited(self._iterator(self.val))
+
+   def _elements(self):
+      for (label, value) in StdRbtreePrinter._iterator(self.val):
+         yield value
 
 class StdRbtreeIteratorPrinter:
    "Print std::set::iterator or std::multiset::iterator"
@@ -768,6 +2231,7 @@ class StdRbtreeIteratorPrinter:
       try:
          return '%s' % self.val['__ptr_']['__value_']
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class StdSetPrinter(StdRbtreePrinter):
@@ -776,6 +2240,11 @@ class StdSetPrinter(StdRbtreePrinter):
    def __init__(self, typename, val):
       super(StdSetPrinter, self).__init__(typename, val['__tree_'])
 
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (count=%d)' % (typename,
+                                int(val['__tree_']['__pair3_']['__first_']))
+
 class StdMapPrinter(StdRbtreePrinter):
    "Print a std::map or std::multimap"
 
@@ -787,16 +2256,28 @@ class StdMapPrinter(StdRbtreePrinter):
       def __next__(self):
          try:
             (idx_str, item) = super(StdMapPrinter._iterator, self).__next__()
-            idx_str += ' %s' % str(item['__cc']['first'])
+            idx_str += ' %s' % _key_label(item['__cc']['first'])
             return (idx_str, item['__cc']['second'])
+         except StopIteration:
+            raise # The end of the container, not an error
          except:
+            _profiler.swallowed()
             raise StopIteration
 
    def __init__(self, typename, val):
       super(StdMapPrinter, self).__init__(typename, val['__tree_'])
 
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (count=%d)' % (typename,
+                                int(val['__tree_']['__pair3_']['__first_']))
+
    def _children(self):
-      return self._iterator(self.val)
+      return _limited(self._iterator(self.val))
+
+   def _elements(self):
+      for value in super(StdMapPrinter, self)._elements():
+         yield value['__cc']
 
 class StdMapIteratorPrinter:
    "Print std::map::iterator"
@@ -809,16 +2290,23 @@ class StdMapIteratorPrinter:
          return '[%s] %s' % (self.val['__i_']['__ptr_']['__value_']['__cc']['first'],
                              self.val['__i_']['__ptr_']['__value_']['__cc']['second'])
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class HashTablePrinter(object):
    class _iterator(Iterator):
-      def __init__(self, hashtable):
-         self.node = hashtable['__p1_']['__first_']['__next_']
+      def __init__(self, hashtable, audit=True):
+         self.audit = audit
+         head = hashtable['__p1_']['__first_']['__next_']
+         self.node = int(head)
+         self.nodetype = head.type
+         (self.format, (self.next,)) = _node_links(self.nodetype.target(),
+                                                   ('__next_',))
          self.size = hashtable['__p2_']['__first_']
          if self.size < 0:
             self.size = 0
          self.count = 0
+         self.guard = _CycleGuard(0)
 
       def __iter__(self):
          return self
@@ -832,13 +2320,20 @@ class HashTablePrinter(object):
          if self.node == 0:
             raise StopIteration
 
+         if self.guard.revisits(self.node):
+            raise StopIteration
+         if _profiler.enabled:
+            _profiler.node()
          try:
-            node = self.node.dereference()
-            self.node = node['__next_']
+            node = gdb.Value(self.node).cast(self.nodetype).dereference()
+            self.node = _read_link(self.format, self.node, self.next)
             value = node['__value_']
-            throw_exception_for_invalid_memory = '%s' % value
+            if self.audit:
+               # Raises for a node in unreadable memory
+               _read_memory(int(value.address), value.type.sizeof)
             return_tuple = (('[%d]' % self.count), value)
          except:
+            _profiler.swallowed()
             raise StopIteration
 
          self.count += 1
@@ -848,13 +2343,17 @@ class HashTablePrinter(object):
       self.typename = typename
       self.val = val
       try:
-         iterator = self._children()
-         self.size = len(list(iterator)) # Get size by counting iterations and ...
-         if self.size != len(iterator):  #  compare with size from __len__ method
-            self.size = -1               #  Invalidate if no match
-         elif self.size > 0:
+         self.size = int(val['__p2_']['__first_'])
+         if self.size > 0:
+            # Audit plausibility by reading the first node instead of
+            #  walking the whole table.
+            first = val['__p1_']['__first_']['__next_']
+            (fmt, (next_offset,)) = _node_links(first.type.target(),
+                                                ('__next_',))
+            _read_link(fmt, int(first), next_offset)
             self.children = self._children  # Only provide children method if we have some
       except:
+         _profiler.swallowed()
          self.size = -1
 
    def to_string(self):
@@ -864,11 +2363,16 @@ class HashTablePrinter(object):
          elif self.size > 0:
             return '%s (count=%d)' % (self.typename, int(self.size))
       except:
+         _profiler.swallowed()
          pass
       return 'invalid'
 
    def _children(self):
-      return self._iterator(self.val)
+      return _limited(self._iterator(self.val))
+
+   def _elements(self):
+      for (label, value) in HashTablePrinter._iterator(self.val, False):
+         yield value
 
 
 class StdHashtableIteratorPrinter:
@@ -881,6 +2385,7 @@ class StdHashtableIteratorPrinter:
       try:
          return '%s' % self.val['__node_']['__value_']
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class StdUnorderedMapIteratorPrinter:
@@ -893,6 +2398,7 @@ class StdUnorderedMapIteratorPrinter:
       try:
          return '[%s] %s' % (self.pair['first'], self.pair['second'])
       except:
+         _profiler.swallowed()
          return 'invalid'
 
 class UnorderedSetPrinter(HashTablePrinter):
@@ -901,6 +2407,11 @@ class UnorderedSetPrinter(HashTablePrinter):
    def __init__(self, typename, val):
       super(UnorderedSetPrinter, self).__init__(typename, val['__table_'])
 
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (count=%d)' % (typename,
+                                int(val['__table_']['__p2_']['__first_']))
+
 class UnorderedMapPrinter(HashTablePrinter):
    "Print a std::unordered_map"
 
@@ -912,16 +2423,1192 @@ class UnorderedMapPrinter(HashTablePrinter):
       def __next__(self):
          try:
             (idx_str, item) = super(UnorderedMapPrinter._iterator, self).__next__()
-            idx_str += ' %s' % str(item['__cc']['first'])
+            idx_str += ' %s' % _key_label(item['__cc']['first'])
             return (idx_str, item['__cc']['second'])
+         except StopIteration:
+            raise # The end of the container, not an error
          except:
+            _profiler.swallowed()
             raise StopIteration
 
    def __init__(self, typename, val):
       super(UnorderedMapPrinter, self).__init__(typename, val['__table_'])
 
+   @staticmethod
+   def _summarize(typename, val):
+      return '%s (count=%d)' % (typename,
+                                int(val['__table_']['__p2_']['__first_']))
+
+   def _children(self):
+      return _limited(self._iterator(self.val))
+
+   def _elements(self):
+      for value in super(UnorderedMapPrinter, self)._elements():
+         yield value['__cc']
+
+# Bulk access to container elements, used by the libcxx-* commands.
+# Elements are streamed through the printers' own iterators and, where
+# the element layout allows, decoded from raw memory in large chunks
+# instead of one gdb.Value at a time.
+
+# Upper bound on the bytes fetched by one bulk read.
+_chunk_bytes = 1 << 20
+
+def _container_printer(val):
+   "Construct the libc++ printer for VAL, which must be a container"
+   if val.type.code == gdb.TYPE_CODE_REF:
+      val = val.referenced_value()
+   subprinter = libcxx_printer.find(val.type)
+   if subprinter is None:
+      raise gdb.GdbError('%s is not a libc++ container' % val.type)
+   printer = subprinter.function(subprinter.name, val)
+   if not (hasattr(printer, '_segments') or hasattr(printer, '_elements')):
+      raise gdb.GdbError('%s is not a supported container' % val.type)
+   if getattr(printer, 'size', 0) < 0:
+      raise gdb.GdbError('%s looks invalid' % val.type)
+   return printer
+
+def _is_signed(type):
+   try:
+      return type.is_signed
+   except (AttributeError, ValueError):
+      pass
+   name = str(type)
+   return not ('unsigned' in name or name in ('bool', 'char8_t',
+                                              'char16_t', 'char32_t'))
+
+def _scalar_code(type):
+   "Return the struct format character for scalar TYPE, or None"
+   type = type.strip_typedefs()
+   if type.code == gdb.TYPE_CODE_FLT:
+      return { 4: 'f', 8: 'd' }.get(type.sizeof)
+   if type.code == gdb.TYPE_CODE_BOOL:
+      if type.sizeof == 1:
+         return '?'
+      return None
+   if type.code == gdb.TYPE_CODE_PTR:
+      return _unsigned_formats.get(type.sizeof)
+   if type.code in (gdb.TYPE_CODE_INT, gdb.TYPE_CODE_CHAR,
+                    gdb.TYPE_CODE_ENUM):
+      code = _unsigned_formats.get(type.sizeof)
+      if code is not None and _is_signed(type):
+         code = code.lower()
+      return code
+   return None
+
+def _flatten_fields(type, base, prefix, fields):
+   # Collect (offset, size, code, name) of the scalar members of TYPE,
+   #  descending into bases and nested structs.  Returns False when some
+   #  member cannot be decoded with struct.
+   for field in type.fields():
+      if not hasattr(field, 'bitpos'):
+         continue # Static member
+      if field.bitsize:
+         return False
+      offset = base + field.bitpos // 8
+      field_type = field.type.strip_typedefs()
+      if field.is_base_class:
+         if not _flatten_fields(field_type, offset, prefix, fields):
+            return False
+         continue
+      if not field.name:
+         return False
+      name = prefix + field.name
+      code = _scalar_code(field_type)
+      if code is not None:
+         fields.append((offset, field_type.sizeof, code, name))
+      elif field_type.code == gdb.TYPE_CODE_STRUCT:
+         if not _flatten_fields(field_type, offset, name + '.', fields):
+            return False
+      else:
+         return False
+   return True
+
+def _compute_codec(type):
+   code = _scalar_code(type)
+   if code is not None:
+      return (_target_byte_order() + code, None)
+   if type.code != gdb.TYPE_CODE_STRUCT:
+      return None
+   fields = []
+   if not _flatten_fields(type, 0, '', fields) or not fields:
+      return None
+   fmt = _target_byte_order()
+   names = []
+   end = 0
+   for (offset, size, code, name) in sorted(fields):
+      if offset < end:
+         return None # Overlapping members
+      if offset > end:
+         fmt += '%dx' % (offset - end)
+      fmt += code
+      names.append(name)
+      end = offset + size
+   if type.sizeof > end:
+      fmt += '%dx' % (type.sizeof - end)
+   return (fmt, names)
+
+def _element_codec(type):
+   """Return a (struct format, field names) pair describing TYPE
+
+   The names are None for a scalar type.  None is returned instead of a
+   pair when TYPE is not made only of scalars at fixed offsets.
+   """
+   type = type.strip_typedefs()
+   key = _layout_key('codec', type)
+   codec = _layouts.get(key, _missing)
+   if codec is _missing:
+      codec = _layouts[key] = _compute_codec(type)
+   return codec
+
+class _ValueRecord(object):
+   "Lazy access to the members of an element that cannot be bulk decoded"
+
+   def __init__(self, value):
+      self._value = value
+
+   def __getitem__(self, name):
+      try:
+         member = self._value[name]
+      except gdb.error:
+         raise KeyError(name)
+      return _python_value(member)
+
+   def __getattr__(self, name):
+      try:
+         return self[name]
+      except KeyError:
+         raise AttributeError(name)
+
+   def __repr__(self):
+      return str(self._value)
+
+def _python_value(value):
+   "Convert VALUE to a plain Python value without pretty-printing it"
+   if not isinstance(value, gdb.Value):
+      return value
+   type = value.type.strip_typedefs()
+   if type.code == gdb.TYPE_CODE_REF:
+      return _python_value(value.referenced_value())
+   if type.code in (gdb.TYPE_CODE_INT, gdb.TYPE_CODE_CHAR,
+                    gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_PTR):
+      return int(value)
+   if type.code == gdb.TYPE_CODE_BOOL:
+      return bool(value)
+   if type.code == gdb.TYPE_CODE_FLT:
+      return float(value)
+   if type.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION):
+      subprinter = libcxx_printer.find(type)
+      if subprinter is not None and subprinter.function is StdStringPrinter:
+         printer = StdStringPrinter(subprinter.name, value)
+         if printer.size < 0:
+            return None
+         # All of it: 'print elements' is for display only.
+         return printer._text(None)
+      return _ValueRecord(value)
+   return value
+
+def _segment_chunks(segments, element_type):
+   "Yield (address, count) pieces of SEGMENTS of at most _chunk_bytes"
+   element_size = max(element_type.sizeof, 1)
+   per_chunk = max(_chunk_bytes // element_size, 1)
+   for (address, count) in segments:
+      while count > 0:
+         run = min(count, per_chunk)
+         yield (address, run)
+         address += run * element_size
+         count -= run
+
+def _printer_segments(printer):
+   "Return the contiguous runs of a container's elements, or None"
+   if hasattr(printer, '_segments'):
+      return printer._segments()
+   return None
+
+def _node_value(value):
+   "Convert a value stored in a node, decoding it with one read if possible"
+   if isinstance(value, gdb.Value) and value.address is not None:
+      codec = _element_codec(value.type)
+      if codec is not None:
+         data = _read_memory(int(value.address), value.type.sizeof)
+         return decode_elements(codec, data)[0]
+   return _python_value(value)
+
+def _container_elements(printer):
+   """Yield (index, key, value) for every element of a container printer
+
+   KEY is None except for maps.  Keys and values are converted with
+   _python_value, or bulk decoded with decode_elements when possible.
+   """
+   segments = _printer_segments(printer)
+   if segments is not None:
+      element_type = printer.element_type
+      codec = _element_codec(element_type)
+      pointer_type = element_type.pointer()
+      index = 0
+      for (address, count) in _segment_chunks(segments, element_type):
+         if codec is not None:
+            data = _read_view(address, count * element_type.sizeof)
+            for value in decode_elements(codec, data):
+               yield (index, None, value)
+               index += 1
+         else:
+            for offset in range(count):
+               element = gdb.Value(address).cast(pointer_type) + offset
+               yield (index, None, _python_value(element.dereference()))
+               index += 1
+      return
+   is_map = isinstance(printer, (StdMapPrinter, UnorderedMapPrinter))
+   index = 0
+   for value in printer._elements():
+      if is_map:
+         yield (index, _node_value(value['first']),
+                _node_value(value['second']))
+      else:
+         yield (index, None, _node_value(value))
+      index += 1
+
+# numpy dtype kinds equivalent to the struct format characters
+_numpy_kinds = { 'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4',
+                 'I': 'u4', 'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8',
+                 '?': 'b1' }
+
+def _numeric_chunks(printer):
+   """Yield the elements of a contiguous container of numbers in chunks
+
+   Each chunk is a numpy array when numpy is available and a tuple of
+   Python numbers otherwise.  Only one chunk is held at a time.
+   """
+   segments = _printer_segments(printer)
+   if segments is None:
+      raise gdb.GdbError('only vector, deque and array contents can be '
+                         'summarized')
+   element_type = printer.element_type
+   codec = _element_codec(element_type)
+   if (codec is None or codec[1] is not None or
+       element_type.strip_typedefs().code == gdb.TYPE_CODE_PTR):
+      raise gdb.GdbError('elements of type %s are not numbers' % element_type)
+   numpy = _numpy()
+   dtype = None
+   if numpy is not None:
+      dtype = numpy.dtype(codec[0][0] + _numpy_kinds[codec[0][1:]])
+   for (address, count) in _segment_chunks(segments, element_type):
+      data = _read_view(address, count * element_type.sizeof)
+      if dtype is not None:
+         yield numpy.frombuffer(data, dtype=dtype)
+      else:
+         yield decode_elements(codec, data)
+
+class _NumericSummary(object):
+   "Count, extrema, mean and variance accumulated one chunk at a time"
+
+   def __init__(self):
+      self.count = 0
+      self.nans = 0
+      self.minimum = None
+      self.maximum = None
+      self.mean = 0.0
+      self.m2 = 0.0
+
+   @staticmethod
+   def _without_nans(chunk):
+      numpy = _numpy()
+      if numpy is not None:
+         if chunk.dtype.kind == 'f':
+            return chunk[~numpy.isnan(chunk)]
+         return chunk
+      return [value for value in chunk if value == value]
+
+   def add(self, chunk):
+      values = self._without_nans(chunk)
+      self.nans += len(chunk) - len(values)
+      count = len(values)
+      if count == 0:
+         return
+      numpy = _numpy()
+      if numpy is not None:
+         values = values.astype(numpy.float64)
+         (low, high) = (values.min(), values.max())
+         mean = values.mean()
+         m2 = ((values - mean) ** 2).sum()
+      else:
+         (low, high) = (min(values), max(values))
+         mean = sum(float(value) for value in values) / count
+         m2 = sum((value - mean) ** 2 for value in values)
+      if self.minimum is None or low < self.minimum:
+         self.minimum = low
+      if self.maximum is None or high > self.maximum:
+         self.maximum = high
+      # Combine with the previous chunks (Chan et al.)
+      total = self.count + count
+      delta = mean - self.mean
+      self.mean += delta * count / total
+      self.m2 += m2 + delta * delta * self.count * count / total
+      self.count = total
+
+def _histogram(chunks, bins, low, high):
+   "Count the values of CHUNKS in BINS equal bins spanning [LOW, HIGH]"
+   counts = [0] * bins
+   width = float(high - low) / bins
+   numpy = _numpy()
+   for chunk in chunks:
+      if numpy is not None:
+         (chunk_counts, edges) = numpy.histogram(chunk, bins=bins,
+                                                 range=(low, high))
+         counts = [a + int(b) for (a, b) in zip(counts, chunk_counts)]
+         continue
+      for value in chunk:
+         if value != value:
+            continue
+         index = int((value - low) / width) if width else 0
+         counts[min(max(index, 0), bins - 1)] += 1
+   return counts
+
+# Formats written by libcxx-dump
+_dump_formats = ('raw', 'csv', 'jsonl', 'npy')
+
+# Rows of text formatted before each write to the dump file.
+_dump_rows = 4096
+
+def _open_dump_text(path):
+   if sys.version_info[0] > 2:
+      return open(path, 'w', newline='')
+   return open(path, 'wb')
+
+def _npy_descr(codec):
+   "Return the numpy dtype description of a codec from _element_codec"
+   (fmt, names) = codec
+   order = fmt[0]
+   fields = []
+   for (count, code) in re.findall(r'(\d*)([a-zA-Z?])', fmt[1:]):
+      if code == 'x':
+         fields.append(('', '|V%s' % (count or 1)))
+         continue
+      kind = _numpy_kinds[code]
+      fields.append((None, ('|' if kind[-1] == '1' else order) + kind))
+   if names is None:
+      return fields[0][1]
+   names = iter(names)
+   return [(next(names) if name is None else name, kind)
+           for (name, kind) in fields]
+
+def _npy_header(descr, count):
+   "Return a version 1.0 .npy header for COUNT elements of DESCR"
+   header = ("{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" %
+             (descr, count))
+   # The magic, version and length take 10 bytes, and the data must
+   #  start on a 64 byte boundary.
+   header += ' ' * (63 - (10 + len(header)) % 64) + '\n'
+   return (b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) +
+           header.encode('latin-1'))
+
+def _dump_raw(printer, out):
+   segments = _printer_segments(printer)
+   if segments is not None:
+      # Contiguous storage is copied in chunks, without decoding.
+      element_size = printer.element_type.sizeof
+      count = 0
+      for (address, run) in _segment_chunks(segments, printer.element_type):
+         out.write(_read_view(address, run * element_size))
+         count += run
+      return count
+   count = 0
+   for value in printer._elements():
+      if not isinstance(value, gdb.Value) or value.address is None:
+         raise gdb.GdbError('raw format is not available for %s' %
+                            printer.typename)
+      out.write(_read_memory(int(value.address), value.type.sizeof))
+      count += 1
+   return count
+
+def _dump_npy(printer, out):
+   segments = _printer_segments(printer)
+   codec = None
+   if segments is not None:
+      codec = _element_codec(printer.element_type)
+   if codec is None:
+      raise gdb.GdbError('npy format needs contiguous elements made of '
+                         'scalars')
+   # The stored size, as counting the runs would walk a deque's whole map
+   count = int(printer.size)
+   out.write(_npy_header(_npy_descr(codec), count))
+   return _dump_raw(printer, out)
+
+# Worker processes decoding csv and jsonl dumps, 0 to decode inline
+_decode_processes = 0
+_decode_pool = None
+
+# The Python interpreter running the workers, '' to search the PATH
+_decode_python = ''
+
+def _decoding_python():
+   "Return the path of the interpreter to start workers with, or None"
+   if _decode_python:
+      return _decode_python
+   # Inside GDB, sys.executable usually names gdb itself.
+   if os.path.basename(sys.executable or '').startswith('python'):
+      return sys.executable
+   if not hasattr(shutil, 'which'):
+      return None
+   for name in ('python%d.%d' % sys.version_info[:2],
+                'python%d' % sys.version_info[0]):
+      path = shutil.which(name)
+      if path is not None:
+         return path
+   return None
+
+def _decoding_pool():
+   "Return the process pool for dump decoding, or None to decode inline"
+   global _decode_pool
+   if _decode_processes <= 0 or concurrent is None:
+      return None
+   if _decode_pool is None:
+      # GDB is not forked: the child would inherit its threads, and GDB
+      #  reaps every child it sees exit, pool workers included.  Workers
+      #  are fresh interpreters instead, which import decode.py alone.
+      python = _decoding_python()
+      if python is None:
+         return None
+      try:
+         context = multiprocessing.get_context('spawn')
+         context.set_executable(python)
+         _decode_pool = concurrent.futures.ProcessPoolExecutor(
+            _decode_processes, mp_context=context)
+      except (TypeError, ValueError):
+         return None
+   return _decode_pool
+
+def _close_decoding_pool(event=None):
+   "Stop the worker processes; the pool starts again when next needed"
+   global _decode_pool
+   if _decode_pool is not None:
+      _decode_pool.shutdown(wait=True)
+      _decode_pool = None
+
+def _resize_decoding_pool(processes):
+   global _decode_processes
+   _decode_processes = processes
+   _close_decoding_pool()
+
+if hasattr(gdb, 'events'):
+   gdb.events.exited.connect(_close_decoding_pool)
+   atexit.register(_close_decoding_pool)
+
+def _decoded_chunks(printer, fmt, codec):
+   """Yield the formatted text of a contiguous container, chunk by chunk
+
+   Memory is read here, on the main thread; the decoding and formatting
+   of each chunk is handed to the worker pool when there is one.  The
+   chunks come back in container order.
+   """
+   element_type = printer.element_type
+   pool = _decoding_pool()
+   pending = collections.deque()
+   index = 0
+   for (address, count) in _segment_chunks(_printer_segments(printer),
+                                           element_type):
+      data = _read_memory(address, count * element_type.sizeof)
+      if pool is None:
+         yield (count, serialize_chunk(fmt, codec, data, index))
+      else:
+         pending.append((count, pool.submit(serialize_chunk, fmt, codec,
+                                            data, index)))
+         # Bound the memory held by chunks waiting for a worker.
+         while len(pending) > 2 * _decode_processes:
+            (run, future) = pending.popleft()
+            yield (run, future.result())
+      index += count
+   while pending:
+      (run, future) = pending.popleft()
+      yield (run, future.result())
+
+def _dump_text(printer, out, fmt):
+   segments = _printer_segments(printer)
+   codec = None
+   if segments is not None:
+      codec = _element_codec(printer.element_type)
+   if codec is not None:
+      (_, names) = codec
+      if fmt == 'csv':
+         if names is not None:
+            names = dict.fromkeys(names)
+         csv.writer(out).writerow(['index'] + csv_columns('value', names))
+      count = 0
+      for (run, text) in _decoded_chunks(printer, fmt, codec):
+         out.write(text)
+         count += run
+      return count
+   writer = None
+   count = 0
+   elements = _container_elements(printer)
+   while True:
+      rows = list(itertools.islice(elements, _dump_rows))
+      if not rows:
+         break
+      if fmt == 'csv' and writer is None:
+         writer = csv.writer(out)
+         (index, key, value) = rows[0]
+         writer.writerow(['index'] +
+                         ([] if key is None else csv_columns('key', key)) +
+                         csv_columns('value', value))
+      out.write(format_rows(fmt, rows))
+      count += len(rows)
+   return count
+
+def _table_rows(printer, codec, columns, limit):
+   """Yield tuples of the COLUMNS (member indices) of each element
+
+   Elements are unpacked with one precompiled struct per table, from
+   bulk reads of the container's contiguous runs.  At most LIMIT rows
+   are produced when LIMIT is not None.
+   """
+   unpacker = struct.Struct(codec[0])
+   element_type = printer.element_type
+   remaining = limit
+   for (address, count) in _segment_chunks(_printer_segments(printer),
+                                           element_type):
+      if remaining is not None:
+         if remaining <= 0:
+            return
+         count = min(count, remaining)
+         remaining -= count
+      data = _read_view(address, count * unpacker.size)
+      for offset in range(0, count * unpacker.size, unpacker.size):
+         row = unpacker.unpack_from(data, offset)
+         yield tuple(row[column] for column in columns)
+
+def _table_cell(value):
+   if isinstance(value, bool):
+      return 'true' if value else 'false'
+   if isinstance(value, float):
+      return '%.9g' % value
+   return '%d' % value
+
+# Cursors of libcxx-page, keyed by the (address, type) of the container.
+# The most recent one is also stored under 'last' for libcxx-next.
+_page_cursors = _stop_cache()
+
+class _PageCursor(object):
+   """The position reached by libcxx-page in a node-based container
+
+   The printer's own iterator is kept between pages; it holds the last
+   node visited and its index, so each page costs only its own reads.
+   """
+
+   def __init__(self, expression, printer, count):
+      self.expression = expression
+      self.size = int(printer.size)
+      self.count = count
+      self.index = 0
+      if isinstance(printer, StdListPrinter):
+         self.iterator = printer._iterator(printer.val['__end_'], printer.size)
+      elif isinstance(printer, StdForwardListPrinter):
+         self.iterator = printer._iterator(printer.head)
+      elif isinstance(printer, (StdRbtreePrinter, HashTablePrinter)):
+         self.iterator = printer._iterator(printer.val)
+      else:
+         raise gdb.GdbError('only lists, maps, sets and unordered containers '
+                            'can be paged')
+
+   def page(self):
+      items = list(itertools.islice(self.iterator, self.count))
+      self.index += len(items)
+      return items
+
+# Bytes covered by each hashed chunk of a contiguous snapshot
+_snapshot_chunk_bytes = 64 << 10
+
+# Bounds on the snapshots kept by libcxx-snapshot in this session
+_snapshot_limit = 16
+_snapshot_store_bytes = 256 << 20
+
+_snapshots = collections.OrderedDict()
+
+def _fixed_chunks(segments, element_size, per_chunk):
+   # Regroup the contiguous runs of SEGMENTS into byte strings of
+   #  PER_CHUNK elements, so chunk boundaries only depend on the index.
+   pending = b''
+   want = per_chunk * element_size
+   for (address, count) in segments:
+      while count > 0:
+         run = min(count, (want - len(pending)) // element_size)
+         pending += _read_memory(address, run * element_size)
+         address += run * element_size
+         count -= run
+         if len(pending) == want:
+            yield pending
+            pending = b''
+   if pending:
+      yield pending
+
+class _Snapshot(object):
+   "The saved state of a container, compared later by libcxx-diff"
+
+   def __init__(self, expression, printer):
+      self.expression = expression
+      self.type_name = str(printer.typename)
+      self.is_map = isinstance(printer, (StdMapPrinter, UnorderedMapPrinter))
+      self.count = 0
+      self.nbytes = 0
+      segments = _printer_segments(printer)
+      if segments is not None:
+         self._save_contiguous(printer, segments)
+      else:
+         self._save_nodes(printer)
+
+   def _save_contiguous(self, printer, segments):
+      # Each chunk is kept as a digest plus its compressed bytes, so
+      #  that a later diff only decodes the chunks that changed.
+      self.element_type = printer.element_type
+      self.element_size = max(self.element_type.sizeof, 1)
+      self.per_chunk = max(_snapshot_chunk_bytes // self.element_size, 1)
+      self.chunks = []
+      self.nodes = None
+      for data in _fixed_chunks(segments, self.element_size, self.per_chunk):
+         packed = zlib.compress(data)
+         self.chunks.append((hashlib.sha1(data).digest(), packed))
+         self.count += len(data) // self.element_size
+         self._charge(len(packed) + 20)
+
+   def _charge(self, nbytes):
+      # A snapshot bigger than the whole store could not be kept, so
+      #  give up as soon as it gets there.
+      self.nbytes += nbytes
+      if self.nbytes > _snapshot_store_bytes:
+         raise gdb.GdbError('%s is too big to snapshot, over %d bytes' %
+                            (self.expression, _snapshot_store_bytes))
+
+   @staticmethod
+   def _fingerprint(value):
+      if isinstance(value, gdb.Value) and value.address is not None:
+         if _element_codec(value.type) is not None:
+            return _read_memory(int(value.address), value.type.sizeof)
+      return repr(_node_value(value))
+
+   def _save_nodes(self, printer):
+      # Node containers are keyed by node address.
+      self.chunks = None
+      self.nodes = {}
+      index = 0
+      for value in printer._elements():
+         if not isinstance(value, gdb.Value) or value.address is None:
+            raise gdb.GdbError('cannot snapshot %s' % self.type_name)
+         if self.is_map:
+            label = '[%d] %r' % (index, _node_value(value['first']))
+            fingerprint = self._fingerprint(value['second'])
+         else:
+            label = '[%d]' % index
+            fingerprint = self._fingerprint(value)
+         self.nodes[int(value.address)] = (label, fingerprint)
+         self._charge(len(label) + len(fingerprint) + 64)
+         index += 1
+      self.count = index
+
+   def _decode(self, data):
+      codec = _element_codec(self.element_type)
+      if codec is None:
+         return None
+      return decode_elements(codec, data)
+
+   def _diff_contiguous(self, printer):
+      segments = _printer_segments(printer)
+      if segments is None or str(printer.element_type) != str(self.element_type):
+         raise gdb.GdbError('the container no longer has the same layout')
+      index = 0
+      for data in _fixed_chunks(segments, self.element_size, self.per_chunk):
+         count = len(data) // self.element_size
+         chunk = index // self.per_chunk
+         old = b''
+         if chunk < len(self.chunks):
+            (digest, packed) = self.chunks[chunk]
+            if digest == hashlib.sha1(data).digest():
+               index += count
+               continue
+            old = zlib.decompress(packed)
+         old_values = self._decode(old)
+         new_values = self._decode(data)
+         for offset in range(count):
+            begin = offset * self.element_size
+            end = begin + self.element_size
+            new = data[begin:end]
+            if new_values is not None:
+               new = new_values[offset]
+            if end > len(old):
+               yield ('inserted', '[%d]' % (index + offset), None, new)
+            elif old[begin:end] != data[begin:end]:
+               previous = old[begin:end]
+               if old_values is not None:
+                  previous = old_values[offset]
+               yield ('modified', '[%d]' % (index + offset), previous, new)
+         index += count
+      for removed in range(index, self.count):
+         yield ('removed', '[%d]' % removed, None, None)
+
+   def _diff_nodes(self, printer):
+      current = _Snapshot(self.expression, printer)
+      if current.nodes is None:
+         raise gdb.GdbError('the container no longer has the same layout')
+      for (address, (label, fingerprint)) in current.nodes.items():
+         old = self.nodes.get(address)
+         if old is None:
+            yield ('inserted', label, None, None)
+         elif old[1] != fingerprint:
+            yield ('modified', label, None, None)
+      for (address, (label, fingerprint)) in self.nodes.items():
+         if address not in current.nodes:
+            yield ('removed', label, None, None)
+
+   def diff(self, printer):
+      "Yield (change, label, old, new) for each difference with PRINTER"
+      if self.chunks is not None:
+         return self._diff_contiguous(printer)
+      return self._diff_nodes(printer)
+
+def _store_snapshot(name, snapshot):
+   _snapshots.pop(name, None)
+   _snapshots[name] = snapshot
+   # SNAPSHOT fits on its own, so only older ones are dropped.
+   while (len(_snapshots) > _snapshot_limit or
+          sum(s.nbytes for s in _snapshots.values()) > _snapshot_store_bytes):
+      _snapshots.popitem(last=False)
+
+# Printer classes whose values can own heap memory
+_owning_printers = (StdStringPrinter, StdVectorPrinter, StdDequePrinter,
+                    StdListPrinter, StdForwardListPrinter, StdSetPrinter,
+                    StdMapPrinter, UnorderedSetPrinter, UnorderedMapPrinter,
+                    SharedPointerPrinter, UniquePointerPrinter,
+                    StdStackOrQueuePrinter, StdArrayPrinter)
+
+def _owning(subprinter):
+   "Return whether SUBPRINTER prints a type that owns heap memory"
+   if subprinter is None or subprinter.function not in _owning_printers:
+      return False
+   # SharedPointerPrinter also prints weak_ptr, which owns nothing.
+   return not subprinter.name.endswith('weak_ptr')
+
+def _may_own_heap(type):
+   "Return whether a value of TYPE can own heap memory"
+   type = type.strip_typedefs()
+   key = _layout_key('owns heap', type)
+   owns = _layouts.get(key)
+   if owns is not None:
+      return owns
+   subprinter = libcxx_printer.find(type)
+   if _owning(subprinter):
+      if subprinter.function is StdArrayPrinter:
+         owns = _may_own_heap(type.template_argument(0))
+      else:
+         owns = True
+   elif type.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION):
+      owns = any(_may_own_heap(field.type) for field in type.fields()
+                 if hasattr(field, 'bitpos'))
+   elif type.code == gdb.TYPE_CODE_ARRAY:
+      owns = _may_own_heap(type.target())
+   else:
+      owns = False
+   _layouts[key] = owns
+   return owns
+
+def _string_heap_layout(type):
+   # Return (flag offset, capacity offset, capacity format, char size)
+   #  locating the heap buffer size in the raw bytes of a basic_string.
+   type = type.strip_typedefs()
+   key = _layout_key('string heap', type)
+   layout = _layouts.get(key, _missing)
+   if layout is _missing:
+      flag = _member(type, ['__r_', '__first_', '__s', '__size_'])
+      cap = _member(type, ['__r_', '__first_', '__l', '__cap_'])
+      layout = None
+      if flag is not None and cap is not None:
+         layout = (flag[0], cap[0], _target_byte_order() +
+                   _unsigned_formats[cap[1].sizeof],
+                   type.template_argument(0).sizeof)
+      _layouts[key] = layout
+   return layout
+
+def _string_heap_bytes(layout, data, offset):
+   (flag, cap, fmt, char_size) = layout
+   if not (ord(data[offset + flag:offset + flag + 1]) & 0x1):
+      return 0 # Short string, stored inline
+   (capacity,) = struct.unpack_from(fmt, data, offset + cap)
+   return (capacity & ~0x1) * char_size
+
+def _vector_heap_layout(type):
+   # Return (begin offset, end of capacity offset, pointer format) for a
+   #  vector whose elements own no heap, or None.
+   type = type.strip_typedefs()
+   key = _layout_key('vector heap', type)
+   layout = _layouts.get(key, _missing)
+   if layout is _missing:
+      begin = _member(type, ['__begin_'])
+      end_cap = _member(type, ['__end_cap_', '__first_'])
+      layout = None
+      if (begin is not None and end_cap is not None and
+          not _may_own_heap(begin[1].target())):
+         layout = (begin[0], end_cap[0], _target_byte_order() +
+                   _unsigned_formats[begin[1].sizeof])
+      _layouts[key] = layout
+   return layout
+
+def _vector_heap_bytes(layout, data, offset):
+   (begin, end_cap, fmt) = layout
+   (first,) = struct.unpack_from(fmt, data, offset + begin)
+   (last,) = struct.unpack_from(fmt, data, offset + end_cap)
+   return max(last - first, 0)
+
+def _node_type(printer, value):
+   "Return the type of the nodes of the node-based container VALUE"
+   if isinstance(printer, StdListPrinter):
+      return value['__end_']['__next_'].type.target()
+   if isinstance(printer, StdForwardListPrinter):
+      return printer.head.type.target()
+   if isinstance(printer, StdRbtreePrinter):
+      return _node_pointer_type(printer.val.type).target()
+   return printer.val['__p1_']['__first_']['__next_'].type.target()
+
+class _Footprint(object):
+   """Accumulate the heap bytes owned by values, by category
+
+   Sizes are what the containers allocated: vector and string capacity,
+   deque maps and blocks, list, tree and hash nodes, and hash bucket
+   arrays.  Allocator overhead is not included.  Smart pointer pointees
+   and shared_ptr control blocks are counted once, however many pointers
+   share them; weak_ptrs own nothing.
+   """
+
+   def __init__(self):
+      self.bytes = collections.Counter()
+      self.visited = set()
+      self.elements = 0
+
+   def add(self, value):
+      type = value.type.strip_typedefs()
+      if not _may_own_heap(type):
+         return
+      subprinter = libcxx_printer.find(type)
+      if _owning(subprinter):
+         printer = subprinter.function(subprinter.name, value)
+         self._container(printer, value)
+      elif type.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION):
+         for field in type.fields():
+            if not hasattr(field, 'bitpos'):
+               continue
+            if field.is_base_class:
+               self.add(value.cast(field.type))
+            else:
+               self.add(value[field.name])
+      elif type.code == gdb.TYPE_CODE_ARRAY:
+         (low, high) = type.range()
+         for index in range(low, high + 1):
+            self.add(value[index])
+
+   def _container(self, printer, value):
+      if getattr(printer, 'size', 0) < 0:
+         return # Looks invalid, do not follow it
+      if isinstance(printer, StdStringPrinter):
+         layout = _string_heap_layout(value.type)
+         if layout is not None:
+            data = _read_memory(int(value.address), value.type.sizeof)
+            self.bytes['strings'] += _string_heap_bytes(layout, data, 0)
+      elif isinstance(printer, StdVectorPrinter):
+         if printer.is_bool:
+            words = value['__cap_alloc_']['__first_']
+            self.bytes['buffers'] += (int(words) *
+                                      value['__begin_'].type.target().sizeof)
+         else:
+            self.bytes['buffers'] += (int(printer.capacity) *
+                                      printer.element_type.sizeof)
+            self._segments(printer)
+      elif isinstance(printer, StdArrayPrinter):
+         self._segments(printer)
+      elif isinstance(printer, StdDequePrinter):
+         blocks = printer.blocks
+         self.bytes['buffers'] += (int(blocks.capacity) *
+                                   blocks.begin.type.target().sizeof)
+         self.bytes['buffers'] += (int(blocks.size) * int(printer.block_size) *
+                                   printer.element_type.sizeof)
+         self._segments(printer)
+      elif isinstance(printer, SharedPointerPrinter):
+         self._shared(printer, value)
+      elif isinstance(printer, UniquePointerPrinter):
+         self._pointee(printer, True)
+      elif isinstance(printer, StdStackOrQueuePrinter):
+         self.add(value['c'])
+      else:
+         self._nodes(printer, value)
+
+   def _pointee(self, printer, separate):
+      if printer.val is not None and int(printer.ptr) not in self.visited:
+         self.visited.add(int(printer.ptr))
+         if separate:
+            self.bytes['pointees'] += printer.val.type.sizeof
+         self.add(printer.val)
+
+   def _shared(self, printer, value):
+      cntrl = value['__cntrl_']
+      if int(cntrl) == 0 or int(cntrl) in self.visited:
+         return
+      self.visited.add(int(cntrl))
+      try:
+         block = cntrl.dereference().dynamic_type.strip_typedefs()
+      except gdb.error:
+         block = cntrl.type.target().strip_typedefs()
+      self.bytes['controls'] += block.sizeof
+      # make_shared allocates the pointee inside its control block.
+      emplaced = '::__shared_ptr_emplace<' in (block.name or '')
+      self._pointee(printer, not emplaced)
+
+   def _segments(self, printer):
+      element_type = printer.element_type.strip_typedefs()
+      if not _may_own_heap(element_type):
+         return # Fast path, the buffer size says it all
+      segments = _printer_segments(printer)
+      (layout, counter, category) = (None, None, 'buffers')
+      subprinter = libcxx_printer.find(element_type)
+      if subprinter is not None and subprinter.function is StdStringPrinter:
+         layout = _string_heap_layout(element_type)
+         (counter, category) = (_string_heap_bytes, 'strings')
+      elif subprinter is not None and subprinter.function is StdVectorPrinter:
+         layout = _vector_heap_layout(element_type)
+         counter = _vector_heap_bytes
+      size = element_type.sizeof
+      for (address, count) in _segment_chunks(segments, element_type):
+         self.elements += count
+         if layout is not None:
+            # Decode the elements' own size fields straight from a bulk
+            #  read instead of visiting each one.
+            data = _read_memory(address, count * size)
+            self.bytes[category] += sum(counter(layout, data, index * size)
+                                        for index in range(count))
+            continue
+         pointer = gdb.Value(address).cast(element_type.pointer())
+         for index in range(count):
+            self.add((pointer + index).dereference())
+
+   def _nodes(self, printer, value):
+      key = _layout_key('node size', value.type.strip_typedefs())
+      node_size = _layouts.get(key)
+      if node_size is None:
+         node_size = _layouts[key] = _node_type(printer, value).sizeof
+      if isinstance(printer, HashTablePrinter):
+         table = printer.val
+         try:
+            buckets = (table['__bucket_list_']['__ptr_']['__second_']
+                       ['__data_']['__first_'])
+            self.bytes['buckets'] += (int(buckets) * gdb.lookup_type('void').
+                                      pointer().sizeof)
+         except gdb.error:
+            pass
+      self.bytes['nodes'] += int(printer.size) * node_size
+      owns = None
+      for element in printer._elements():
+         if owns is None:
+            owns = _may_own_heap(element.type)
+            if not owns:
+               return # Fast path, the node count says it all
+         self.elements += 1
+         self.add(element)
+
+# Warming of the printer caches when the inferior stops.  Frontends
+# tend to ask for every local at once right after a stop, so when
+# libcxx-warmup-budget is set, the printers of the selected frame's
+# locals are built and their first page read ahead of time, one local
+# per posted event so that GDB stays responsive.
+
+# Milliseconds spent warming the caches after each stop, 0 to disable
+_warmup_budget = 0
+
+# Incremented whenever the inferior resumes, which cancels a warm-up.
+_stop_generation = 0
+
+class _WarmPrinter(object):
+   """Proxy replaying the to_string result and first children of a printer
+
+   What is replayed was produced under the 'print elements' limit of the
+   warm-up; once that limit changes, the printer is asked again.
+   """
+
+   def __init__(self, printer):
+      self.printer = printer
+      self.string = _missing
+      self.page = None
+      self.complete = False
+      self.limit = None
+      if hasattr(printer, 'children'):
+         self.children = self._children
+      if hasattr(printer, 'display_hint'):
+         self.display_hint = self._display_hint
+
+   def prefetch(self, deadline):
+      # Each step can take long, so the deadline is checked before each.
+      if _timer() > deadline:
+         return
+      self.limit = _print_elements_limit()
+      self.string = self.printer.to_string()
+      if isinstance(self.string, gdb.Value):
+         self.string.fetch_lazy()
+      if not hasattr(self.printer, 'children') or _timer() > deadline:
+         return
+      page = []
+      complete = True
+      for item in _limited(self.printer.children()):
+         if isinstance(item[1], gdb.Value):
+            item[1].fetch_lazy()
+         page.append(item)
+         if _timer() > deadline:
+            complete = False
+            break
+      # Reaching the limit is not reaching the end.
+      if self.limit is not None and len(page) > self.limit:
+         complete = False
+      (self.page, self.complete) = (page, complete)
+
+   def _replays(self):
+      return self.limit == _print_elements_limit()
+
+   def to_string(self):
+      if self.string is _missing or not self._replays():
+         return self.printer.to_string()
+      return self.string
+
+   def _display_hint(self):
+      return self.printer.display_hint()
+
    def _children(self):
-      return self._iterator(self.val)
+      if self.page is None:
+         return self.printer.children()
+      if self.complete:
+         return iter(self.page)
+      # Replay the page, then let GDB read on up to its current limit.
+      return itertools.chain(self.page,
+                             itertools.islice(self.printer.children(),
+                                              len(self.page), None))
+
+def _frame_locals(frame):
+   "Return the arguments and locals visible in FRAME, innermost first"
+   values = []
+   seen = set()
+   block = frame.block()
+   while block is not None:
+      for symbol in block:
+         if ((symbol.is_variable or symbol.is_argument) and
+             symbol.name not in seen):
+            seen.add(symbol.name)
+            values.append(symbol)
+      if block.function is not None:
+         break
+      block = block.superblock
+   return values
+
+def _warm_up_value(value, deadline):
+   key = libcxx_printer.cache_key(value)
+   if key is None:
+      return
+   printer = libcxx_printer(value)
+   if printer is None or isinstance(printer, _WarmPrinter):
+      return
+   if _timer() > deadline:
+      return # Construction used up the budget; the printer is cached
+   warm = _WarmPrinter(printer)
+   _visualizers[key] = warm
+   warm.prefetch(deadline)
+
+def _warm_up(generation, deadline, frame, symbols, index):
+   if (generation != _stop_generation or index >= len(symbols) or
+       _timer() > deadline):
+      return
+   try:
+      if frame != gdb.selected_frame():
+         return
+      _warm_up_value(symbols[index].value(frame), deadline)
+   except:
+      _profiler.swallowed()
+   gdb.post_event(lambda: _warm_up(generation, deadline, frame, symbols,
+                                   index + 1))
+
+def _warm_up_on_stop(event):
+   if _warmup_budget <= 0:
+      return
+   try:
+      frame = gdb.selected_frame()
+      symbols = _frame_locals(frame)
+   except:
+      _profiler.swallowed()
+      return
+   # The budget starts when the warm-up runs, not when it is posted.
+   generation = _stop_generation
+   gdb.post_event(lambda: _warm_up(generation,
+                                   _timer() + _warmup_budget / 1000.0,
+                                   frame, symbols, 0))
+
+def _cancel_warm_up(event):
+   global _stop_generation
+   _stop_generation += 1
+
+if hasattr(gdb, 'events'):
+   gdb.events.stop.connect(_warm_up_on_stop)
+   gdb.events.cont.connect(_cancel_warm_up)
+   gdb.events.exited.connect(_cancel_warm_up)
+
+# Summary mode.  While it is in effect, libc++ containers print only a
+# header made from their size fields, without reading any element or
+# node, so that printing every local of every frame stays cheap.  With
+# libcxx-summary set to "backtrace" it is in effect while a backtrace
+# is printed, through a frame filter that passes the frames unchanged.
+
+# 'off', 'on' or 'backtrace'
+_summary_mode = 'off'
+
+# Whether a backtrace is being printed
+_in_backtrace = False
+
+def _summarizing():
+   return _summary_mode == 'on' or (_summary_mode == 'backtrace' and
+                                    _in_backtrace)
+
+class _SummaryPrinter(object):
+   "A one-line header standing in for a printer in summary mode"
+
+   def __init__(self, function, typename, val):
+      try:
+         self.summary = function._summarize(typename, val)
+      except:
+         _profiler.swallowed()
+         self.summary = 'invalid'
+
+   def to_string(self):
+      return self.summary
+
+class _SummaryFrameFilter(object):
+   "Put the libc++ printers in summary mode while frames are printed"
+
+   def __init__(self):
+      self.name = 'libcxx-summary'
+      self.priority = 0
+      self.enabled = False
+      gdb.frame_filters[self.name] = self
+
+   def filter(self, frame_iter):
+      global _in_backtrace
+      _in_backtrace = True
+      try:
+         for frame in frame_iter:
+            yield frame
+      finally:
+         _in_backtrace = False
+
+def _end_backtrace():
+   # In case the backtrace was interrupted before its last frame
+   global _in_backtrace
+   _in_backtrace = False
+
+if hasattr(gdb, 'events') and hasattr(gdb.events, 'before_prompt'):
+   gdb.events.before_prompt.connect(_end_backtrace)
+
+def _forget_visualizers():
+   "Drop the printers built in this stop, after a printer is toggled"
+   _visualizers.clear()
+   _pointee_visualizers.clear()
 
 # A "regular expression" printer which conforms to the
 # "SubPrettyPrinter" protocol from gdb.printing.
@@ -932,9 +3619,23 @@ class RxPrinter(object):
       self.function = function
       self.enabled = True
 
+   # "enable/disable pretty-printer" set this.  The printers cached for
+   #  this stop, smart pointer pointees included, were chosen under the
+   #  old setting, so they are dropped.
+   @property
+   def enabled(self):
+      return self._enabled
+
+   @enabled.setter
+   def enabled(self, enabled):
+      self._enabled = enabled
+      _forget_visualizers()
+
    def invoke(self, value):
       if not self.enabled:
          return None
+      if _profiler.enabled:
+         return _profiler.construct(self.function, self.name, value)
       return self.function(self.name, value)
 
 # A pretty-printer that conforms to the "PrettyPrinter" protocol from
@@ -948,6 +3649,16 @@ class Printer(object):
       self.enabled = True
       self.compiled_rx = re.compile('^([a-zA-Z0-9_:]+)<.*>$')
 
+   # As for RxPrinter.enabled
+   @property
+   def enabled(self):
+      return self._enabled
+
+   @enabled.setter
+   def enabled(self, enabled):
+      self._enabled = enabled
+      _forget_visualizers()
+
    def add(self, name, function):
       # A small sanity check.
       # FIXME
@@ -978,8 +3689,9 @@ class Printer(object):
 
       return type.tag
 
-   def __call__(self, val):
-      typename = self.get_basic_type(val.type)
+   # Find the subprinter for a type without constructing a printer.
+   def find(self, type):
+      typename = self.get_basic_type(type)
       if not typename:
          return None
 
@@ -989,12 +3701,59 @@ class Printer(object):
       if not match:
          return None
 
-      basename = match.group(1)
-      if basename in self.lookup:
-         return self.lookup[basename].invoke(val)
+      subprinter = self.lookup.get(match.group(1))
+      if subprinter is None or not subprinter.enabled:
+         return None
+      return subprinter
 
-      # Cannot find a pretty printer.  Return None.
-      return None
+   @staticmethod
+   def cache_key(val):
+      # Only values that live in inferior memory can be recognized again.
+      try:
+         if val.type.code == gdb.TYPE_CODE_REF:
+            return None
+         address = val.address
+         if address is None:
+            return None
+         return (int(address), str(val.type.strip_typedefs()))
+      except gdb.error:
+         return None
+
+   def __call__(self, val):
+      subprinter = self.find(val.type)
+      if subprinter is None:
+         # Cannot find a pretty printer.  Return None.
+         return None
+
+      if _summarizing() and hasattr(subprinter.function, '_summarize'):
+         return _SummaryPrinter(subprinter.function, subprinter.name, val)
+
+      if not _profiler.tracing:
+         return self._visualize(subprinter, val)
+      address = None
+      if val.address is not None:
+         address = int(val.address)
+      start = _profiler.enter('Printer', '__call__',
+                              str(val.type.strip_typedefs()),
+                              address=address)
+      try:
+         return self._visualize(subprinter, val)
+      finally:
+         _profiler.leave(start)
+
+   def _visualize(self, subprinter, val):
+      # Nested containers are visualized over and over while a frontend
+      # expands them, so printers and their validation are reused until
+      # the inferior resumes.
+      key = self.cache_key(val)
+      if key is not None:
+         printer = _visualizers.get(key)
+         if printer is not None:
+            return printer
+      printer = subprinter.invoke(val)
+      if key is not None and printer is not None:
+         _visualizers[key] = printer
+      return printer
 
 libcxx_printer = None
 
@@ -1021,6 +3780,7 @@ class FilteringTypePrinter(object):
             try:
                self.type_obj = gdb.lookup_type(self.name).strip_typedefs()
             except:
+               _profiler.swallowed()
                pass
          if self.type_obj == type_obj:
             return self.name
@@ -1089,6 +3849,758 @@ def register_type_printers(obj):
    add_one_type_printer(obj, 'discard_block_engine', 'ranlux48')
    add_one_type_printer(obj, 'shuffle_order_engine', 'knuth_b')
 
+class LibcxxProfileCommand(gdb.Command):
+   """Control profiling of the libc++ pretty-printers.
+
+Usage: libcxx-profile on|off|reset
+
+Collected counters are shown with "info libcxx-stats"."""
+
+   def __init__(self):
+      super(LibcxxProfileCommand, self).__init__('libcxx-profile',
+                                                 gdb.COMMAND_DATA)
+
+   def invoke(self, arg, from_tty):
+      arg = arg.strip()
+      if arg == 'on':
+         _profiler.enabled = True
+         _clear_stop_caches()
+      elif arg == 'off':
+         _profiler.enabled = False
+         _profiler.tracing = False
+         _clear_stop_caches()
+      elif arg == 'reset':
+         _profiler.reset()
+      else:
+         raise gdb.GdbError('usage: libcxx-profile on|off|reset')
+
+class LibcxxTraceCommand(gdb.Command):
+   """Record a timeline of the libc++ pretty-printers' work.
+
+Usage: libcxx-trace on [EVENTS] | off | save FILE
+
+"on" starts recording (and profiling): printer lookups, constructions
+including their validation, to_string and children calls and memory
+reads, with their type, address, nodes visited and bytes read.  Only
+the last EVENTS events are kept (default 100000).  "off" stops
+recording, and profiling unless it was on before, and "save" writes
+what was recorded to FILE in the Chrome trace event format, which
+chrome://tracing and Perfetto can open."""
+
+   def __init__(self):
+      super(LibcxxTraceCommand, self).__init__('libcxx-trace',
+                                               gdb.COMMAND_DATA)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      usage = 'usage: libcxx-trace on [EVENTS] | off | save FILE'
+      if argv[:1] == ['on'] and len(argv) <= 2:
+         limit = 100000
+         if len(argv) > 1:
+            try:
+               limit = int(argv[1])
+            except ValueError:
+               raise gdb.GdbError(usage)
+            if limit < 1:
+               raise gdb.GdbError(usage)
+         _profiler.start_trace(limit)
+         # Cached printers were built without the tracing proxies.
+         _clear_stop_caches()
+      elif argv == ['off']:
+         _profiler.stop_trace()
+         # Nor should they keep them when profiling is off again.
+         _clear_stop_caches()
+      elif argv[:1] == ['save'] and len(argv) == 2:
+         events = _profiler.trace_events()
+         with open(argv[1], 'w') as out:
+            json.dump({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, out)
+         gdb.write('Wrote %d events to %s.\n' % (len(events), argv[1]))
+      else:
+         raise gdb.GdbError(usage)
+
+class InfoLibcxxStatsCommand(gdb.Command):
+   """Show the counters collected by "libcxx-profile on".
+
+Usage: info libcxx-stats
+
+Times are wall-clock seconds and include nested printers."""
+
+   def __init__(self):
+      super(InfoLibcxxStatsCommand, self).__init__('info libcxx-stats',
+                                                   gdb.COMMAND_STATUS)
+
+   @staticmethod
+   def _write_table(title, rows):
+      gdb.write('%s\n' % title)
+      gdb.write('%8s %10s %10s %10s %12s %9s  %s\n' %
+                ('calls', 'total(s)', 'max(s)', 'nodes', 'bytes read',
+                 'swallowed', 'name'))
+      rows = sorted(rows, key=lambda row: row[1].total_time, reverse=True)
+      for (name, counters) in rows:
+         gdb.write('%8d %10.4f %10.4f %10d %12d %9d  %s\n' %
+                   (counters.calls, counters.total_time, counters.max_time,
+                    counters.nodes, counters.bytes_read, counters.swallowed,
+                    name))
+
+   def invoke(self, arg, from_tty):
+      gdb.write('libc++ printer profiling is %s.\n' %
+                ('on' if _profiler.enabled else 'off'))
+      self._write_table('Per printer class:',
+                        [('%s.%s' % key, counters) for (key, counters)
+                         in _profiler.by_class.items()])
+      self._write_table('Per type:', list(_profiler.by_type.items()))
+      self._write_table('Outside any printer:',
+                        [('-', _profiler.unattributed)])
+
+class LibcxxBitsetDisplayParameter(gdb.Parameter):
+   """Control how std::bitset values are displayed.
+
+indices  list the index of every set bit as a child (the default)
+hex      show the bits as a hexadecimal number
+binary   show the bits as a binary number
+runs     show ranges of consecutive set bits and the number of set bits"""
+
+   set_doc = 'Set the display mode of std::bitset values.'
+   show_doc = 'Show the display mode of std::bitset values.'
+
+   def __init__(self):
+      super(LibcxxBitsetDisplayParameter, self).__init__(
+         'libcxx-bitset-display', gdb.COMMAND_DATA, gdb.PARAM_ENUM,
+         ['indices', 'hex', 'binary', 'runs'])
+      self.value = 'indices'
+
+   def get_set_string(self):
+      # Cached printers were built with the previous mode.
+      _clear_stop_caches()
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'The display mode of std::bitset values is "%s".' % svalue
+
+class LibcxxPriorityQueueDisplayParameter(gdb.Parameter):
+   """Control how std::priority_queue values are displayed.
+
+heap  show the underlying container in heap order (the default)
+top   show the elements in priority order, highest first; this applies
+      to numbers kept in a vector and ordered by std::less or
+      std::greater, and other priority queues keep heap order"""
+
+   set_doc = 'Set the display mode of std::priority_queue values.'
+   show_doc = 'Show the display mode of std::priority_queue values.'
+
+   def __init__(self):
+      super(LibcxxPriorityQueueDisplayParameter, self).__init__(
+         'libcxx-priority-queue-display', gdb.COMMAND_DATA, gdb.PARAM_ENUM,
+         ['heap', 'top'])
+      self.value = 'heap'
+
+   def get_set_string(self):
+      # Cached printers were built with the previous mode.
+      _clear_stop_caches()
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'The display mode of std::priority_queue values is "%s".' % svalue
+
+class LibcxxCacheSizeParameter(gdb.Parameter):
+   """Control the size of the libc++ printer caches.
+
+Constructed printers are reused, keyed by address and type, until the
+inferior resumes.  Each cache keeps at most this many entries, evicting
+the least recently used ones.  Zero disables caching."""
+
+   set_doc = 'Set the number of entries kept by each libc++ printer cache.'
+   show_doc = 'Show the number of entries kept by each libc++ printer cache.'
+
+   def __init__(self):
+      super(LibcxxCacheSizeParameter, self).__init__(
+         'libcxx-cache-size', gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER)
+      self.value = _stop_cache_size
+
+   def get_set_string(self):
+      _resize_stop_caches(self.value)
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'The libc++ printer caches keep at most %s entries.' % svalue
+
+class LibcxxDecodeProcessesParameter(gdb.Parameter):
+   """Control the worker processes used by libcxx-dump.
+
+When non-zero, the csv and jsonl formats of vectors, deques, arrays and
+strings are decoded and formatted by this many worker processes, while
+GDB keeps reading the next chunks of memory.  Zero decodes everything
+in GDB itself."""
+
+   set_doc = 'Set the number of processes decoding libcxx-dump output.'
+   show_doc = 'Show the number of processes decoding libcxx-dump output.'
+
+   def __init__(self):
+      super(LibcxxDecodeProcessesParameter, self).__init__(
+         'libcxx-decode-processes', gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER)
+      self.value = _decode_processes
+
+   def get_set_string(self):
+      _resize_decoding_pool(self.value)
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'libcxx-dump decodes with %s worker processes.' % svalue
+
+class LibcxxDecodePythonParameter(gdb.Parameter):
+   """Set the Python interpreter running the libcxx-dump workers.
+
+The workers of libcxx-decode-processes are started as separate
+processes of this interpreter, which must be the same Python version
+as GDB's.  When empty, python3.X and then python3 are looked up in the
+PATH, X being the minor version of GDB's Python."""
+
+   set_doc = 'Set the interpreter of the libcxx-dump worker processes.'
+   show_doc = 'Show the interpreter of the libcxx-dump worker processes.'
+
+   def __init__(self):
+      super(LibcxxDecodePythonParameter, self).__init__(
+         'libcxx-decode-python', gdb.COMMAND_DATA,
+         gdb.PARAM_OPTIONAL_FILENAME)
+      self.value = _decode_python
+
+   def get_set_string(self):
+      global _decode_python
+      _decode_python = self.value or ''
+      _close_decoding_pool()
+      return ''
+
+   def get_show_string(self, svalue):
+      if not svalue:
+         return 'libcxx-dump workers run the Python found in the PATH.'
+      return 'libcxx-dump workers run %s.' % svalue
+
+class LibcxxWarmupBudgetParameter(gdb.Parameter):
+   """Control the warm-up of the libc++ printer caches after a stop.
+
+When non-zero, each time the inferior stops the printers of the selected
+frame's arguments and locals are built, and the first page of their
+elements read, for at most this many milliseconds.  This runs from
+GDB's event loop after the stop has been reported and is abandoned as
+soon as the inferior resumes.  Zero disables the warm-up."""
+
+   set_doc = 'Set the milliseconds spent warming libc++ printers after a stop.'
+   show_doc = 'Show the milliseconds spent warming libc++ printers after a stop.'
+
+   def __init__(self):
+      super(LibcxxWarmupBudgetParameter, self).__init__(
+         'libcxx-warmup-budget', gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER)
+      self.value = _warmup_budget
+
+   def get_set_string(self):
+      global _warmup_budget
+      _warmup_budget = self.value
+      return ''
+
+   def get_show_string(self, svalue):
+      return ('libc++ printers are warmed for %s milliseconds after a stop.' %
+              svalue)
+
+class LibcxxSummaryParameter(gdb.Parameter):
+   """Control the summary mode of the libc++ printers.
+
+In summary mode, containers print as a single line built from their
+size fields, e.g. "std::__1::vector (length=3, capacity=4)", without
+reading any element.  "on" always summarizes, "backtrace" summarizes
+only the arguments and locals printed by backtrace (as in "bt full"),
+and "off" prints containers in full."""
+
+   set_doc = 'Set when libc++ containers are printed as summaries.'
+   show_doc = 'Show when libc++ containers are printed as summaries.'
+
+   def __init__(self):
+      super(LibcxxSummaryParameter, self).__init__(
+         'libcxx-summary', gdb.COMMAND_DATA, gdb.PARAM_ENUM,
+         ['off', 'on', 'backtrace'])
+      self.value = _summary_mode
+      self.frame_filter = None
+      if hasattr(gdb, 'frame_filters'):
+         self.frame_filter = _SummaryFrameFilter()
+
+   def get_set_string(self):
+      global _summary_mode
+      _summary_mode = self.value
+      if self.frame_filter is not None:
+         self.frame_filter.enabled = (self.value == 'backtrace')
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'libc++ containers are summarized: %s.' % svalue
+
+class LibcxxCoreReaderParameter(gdb.Parameter):
+   """Control whether libc++ printers read core files directly.
+
+When on and a core file is being debugged, the printers map the core
+file into memory and do their own reads straight from there, bypassing
+GDB: string characters, element buffers, node links and sizes.  The
+elements handed to GDB to print are still read by GDB, as is memory
+missing from the core, such as the code of mapped files."""
+
+   set_doc = 'Set whether libc++ printers read core files directly.'
+   show_doc = 'Show whether libc++ printers read core files directly.'
+
+   def __init__(self):
+      super(LibcxxCoreReaderParameter, self).__init__(
+         'libcxx-core-reader', gdb.COMMAND_DATA, gdb.PARAM_BOOLEAN)
+      self.value = _core_reader
+
+   def get_set_string(self):
+      global _core_reader
+      _core_reader = self.value
+      return ''
+
+   def get_show_string(self, svalue):
+      return 'libc++ printers read core files directly: %s.' % svalue
+
+class LibcxxGrepCommand(gdb.Command):
+   """Find the elements of a libc++ container that satisfy a predicate.
+
+Usage: libcxx-grep [--limit N] CONTAINER-EXPRESSION PREDICATE
+
+PREDICATE is a Python expression evaluated for every element with
+  i  the element index
+  k  the key, for maps (otherwise None)
+  v  the element, or the mapped value for maps
+Scalars are plain Python numbers and std::strings are Python strings.
+Members of structs are reached as attributes, e.g. "v.status == 3".
+Quote arguments that contain spaces.  At most N matches are reported;
+the default is the "print elements" limit and 0 means no limit."""
+
+   def __init__(self):
+      super(LibcxxGrepCommand, self).__init__('libcxx-grep', gdb.COMMAND_DATA,
+                                              gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      limit = _print_elements_limit()
+      if len(argv) > 1 and argv[0] == '--limit':
+         limit = int(argv[1]) or None
+         argv = argv[2:]
+      if len(argv) != 2:
+         raise gdb.GdbError('usage: libcxx-grep [--limit N] '
+                            'CONTAINER-EXPRESSION PREDICATE')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      try:
+         predicate = compile(argv[1], '<predicate>', 'eval')
+      except SyntaxError as e:
+         raise gdb.GdbError('invalid predicate: %s' % e)
+      matches = 0
+      for (index, key, value) in _container_elements(printer):
+         try:
+            matched = eval(predicate, { 're': re },
+                           { 'i': index, 'k': key, 'v': value })
+         except Exception as e:
+            raise gdb.GdbError('predicate failed on element %d: %s' %
+                               (index, e))
+         if not matched:
+            continue
+         if key is None:
+            gdb.write('[%d]\n' % index)
+         else:
+            gdb.write('[%d] %r\n' % (index, key))
+         matches += 1
+         if limit is not None and matches >= limit:
+            gdb.write('Stopped after %d matches.\n' % matches)
+            return
+      gdb.write('%d matches.\n' % matches)
+
+class LibcxxStatsCommand(gdb.Command):
+   """Summarize the numbers held by a vector, deque or array.
+
+Usage: libcxx-stats [--bins N] EXPRESSION
+
+Shows the count, minimum, maximum, mean, standard deviation and number
+of NaNs of the elements, followed by a histogram with N bins (default
+10, 0 for none).  The elements are read and summarized in chunks, so
+memory use does not grow with the size of the container."""
+
+   def __init__(self):
+      super(LibcxxStatsCommand, self).__init__('libcxx-stats', gdb.COMMAND_DATA,
+                                               gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      bins = 10
+      if len(argv) > 1 and argv[0] == '--bins':
+         bins = int(argv[1])
+         argv = argv[2:]
+      if len(argv) != 1:
+         raise gdb.GdbError('usage: libcxx-stats [--bins N] EXPRESSION')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      summary = _NumericSummary()
+      for chunk in _numeric_chunks(printer):
+         summary.add(chunk)
+      gdb.write('count=%d nan=%d\n' % (summary.count, summary.nans))
+      if summary.count == 0:
+         return
+      deviation = (summary.m2 / summary.count) ** 0.5
+      gdb.write('min=%s max=%s mean=%.6g stddev=%.6g\n' %
+                (summary.minimum, summary.maximum, summary.mean, deviation))
+      (low, high) = (float(summary.minimum), float(summary.maximum))
+      infinite = (float('inf'), float('-inf'))
+      if bins <= 0 or low in infinite or high in infinite:
+         return
+      if printer.element_type.strip_typedefs().code != gdb.TYPE_CODE_FLT:
+         # Do not split single integers across bins.
+         bins = min(bins, int(high - low) + 1)
+      # A second pass, as the bins depend on the extrema.
+      counts = _histogram(_numeric_chunks(printer), bins, low, high)
+      width = (high - low) / bins
+      scale = 50.0 / max(max(counts), 1)
+      for (index, count) in enumerate(counts):
+         gdb.write('[%12.6g, %12.6g%s %10d %s\n' %
+                   (low + index * width, low + (index + 1) * width,
+                    ']' if index == bins - 1 else ')', count,
+                    '#' * int(count * scale + 0.5)))
+
+class LibcxxDumpCommand(gdb.Command):
+   """Write the contents of a libc++ container to a file.
+
+Usage: libcxx-dump EXPRESSION FILE [--format raw|csv|jsonl|npy]
+
+raw    the bytes of each element, copied without decoding (the default)
+csv    one row per element, with a column per member of struct elements
+jsonl  one JSON object per element, with "index", "key" and "value"
+npy    a NumPy array file, for contiguous elements made of scalars
+
+The file is written chunk by chunk while the elements are read, so the
+whole container is never held in memory.  "print elements" does not
+apply."""
+
+   def __init__(self):
+      super(LibcxxDumpCommand, self).__init__('libcxx-dump', gdb.COMMAND_DATA,
+                                              gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      fmt = 'raw'
+      if len(argv) > 2 and argv[-2] == '--format':
+         fmt = argv[-1]
+         argv = argv[:-2]
+      if len(argv) != 2 or fmt not in _dump_formats:
+         raise gdb.GdbError('usage: libcxx-dump EXPRESSION FILE '
+                            '[--format raw|csv|jsonl|npy]')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      if fmt in ('raw', 'npy'):
+         with open(argv[1], 'wb') as out:
+            if fmt == 'raw':
+               count = _dump_raw(printer, out)
+            else:
+               count = _dump_npy(printer, out)
+      else:
+         with _open_dump_text(argv[1]) as out:
+            count = _dump_text(printer, out, fmt)
+      gdb.write('Wrote %d elements to %s.\n' % (count, argv[1]))
+
+class LibcxxTableCommand(gdb.Command):
+   """Show the elements of a vector, deque or array of structs as a table.
+
+Usage: libcxx-table [--columns NAME,...] [--limit N] EXPRESSION
+
+Each element is a row, with a column for each scalar member; nested
+members are named like "pos.x".  --columns picks and orders the columns
+shown.  At most N rows are shown, by default the "print elements"
+limit, and 0 means no limit.  The element type must be made only of
+scalars at fixed offsets, and is unpacked straight from bulk reads."""
+
+   def __init__(self):
+      super(LibcxxTableCommand, self).__init__('libcxx-table',
+                                               gdb.COMMAND_DATA,
+                                               gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      selected = None
+      limit = _print_elements_limit()
+      while len(argv) > 2 and argv[0] in ('--columns', '--limit'):
+         if argv[0] == '--columns':
+            selected = [name for name in argv[1].split(',') if name]
+         else:
+            limit = int(argv[1]) or None
+         argv = argv[2:]
+      if len(argv) != 1:
+         raise gdb.GdbError('usage: libcxx-table [--columns NAME,...] '
+                            '[--limit N] EXPRESSION')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      codec = None
+      if _printer_segments(printer) is not None:
+         codec = _element_codec(printer.element_type)
+      if codec is None:
+         raise gdb.GdbError('only vectors, deques and arrays of scalars or '
+                            'plain structs can be tabulated')
+      names = codec[1] or ['value']
+      if selected is None:
+         selected = names
+      for name in selected:
+         if name not in names:
+            raise gdb.GdbError('no column %s in %s; columns are %s' %
+                               (name, printer.element_type, ', '.join(names)))
+      columns = [names.index(name) for name in selected]
+      table = [[str(index)] + [_table_cell(value) for value in row]
+               for (index, row) in enumerate(_table_rows(printer, codec,
+                                                         columns, limit))]
+      header = ['index'] + selected
+      widths = [max([len(header[column])] +
+                    [len(row[column]) for row in table])
+                for column in range(len(header))]
+      # One write for the whole table, as each one goes through the pager.
+      gdb.write(''.join('  '.join(cell.rjust(width)
+                                  for (cell, width) in zip(row, widths)) + '\n'
+                        for row in [header] + table))
+      size = getattr(printer, 'size', None)
+      if size is not None and len(table) < int(size):
+         gdb.write('... (%d of %d rows)\n' % (len(table), int(size)))
+
+def _show_page(cursor):
+   items = cursor.page()
+   gdb.write(''.join('%s = %s\n' % (label, value) for (label, value) in items))
+   if cursor.index < cursor.size and items:
+      gdb.write('-- %d of %d elements of %s shown, libcxx-next for more --\n' %
+                (cursor.index, cursor.size, cursor.expression))
+   else:
+      gdb.write('-- end of %s --\n' % cursor.expression)
+
+class LibcxxPageCommand(gdb.Command):
+   """Show the first page of elements of a libc++ node-based container.
+
+Usage: libcxx-page [--count N] EXPRESSION
+
+Shows N elements (by default the "print elements" limit) of a list,
+forward_list, map, set or unordered container and remembers where it
+stopped, so that libcxx-next shows the following page without walking
+the nodes already shown again.  The position is forgotten when the
+inferior resumes."""
+
+   def __init__(self):
+      super(LibcxxPageCommand, self).__init__('libcxx-page', gdb.COMMAND_DATA,
+                                              gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      count = _print_elements_limit() or 200
+      if len(argv) > 2 and argv[0] == '--count':
+         count = max(int(argv[1]), 1)
+         argv = argv[2:]
+      if len(argv) != 1:
+         raise gdb.GdbError('usage: libcxx-page [--count N] EXPRESSION')
+      value = gdb.parse_and_eval(argv[0])
+      cursor = _PageCursor(argv[0], _container_printer(value), count)
+      key = libcxx_printer.cache_key(value)
+      if key is not None:
+         _page_cursors[key] = cursor
+      _page_cursors['last'] = cursor
+      _show_page(cursor)
+
+class LibcxxNextCommand(gdb.Command):
+   """Show the next page of a container paged with libcxx-page.
+
+Usage: libcxx-next [EXPRESSION]
+
+Continues the container last shown by libcxx-page or libcxx-next, or
+the one given by EXPRESSION."""
+
+   def __init__(self):
+      super(LibcxxNextCommand, self).__init__('libcxx-next', gdb.COMMAND_DATA,
+                                              gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      if arg.strip():
+         key = libcxx_printer.cache_key(gdb.parse_and_eval(arg))
+      else:
+         key = 'last'
+      cursor = _page_cursors.get(key) if key is not None else None
+      if cursor is None:
+         raise gdb.GdbError('no libcxx-page in progress since the inferior '
+                            'stopped')
+      _page_cursors['last'] = cursor
+      _show_page(cursor)
+
+class LibcxxSnapshotCommand(gdb.Command):
+   """Save the state of a libc++ container for a later libcxx-diff.
+
+Usage: libcxx-snapshot EXPRESSION NAME
+
+Contiguous containers are saved as hashed, compressed chunks.  Node
+containers are saved per node address.  Only the most recent snapshots
+are kept in this session, and a container that would take more than
+their whole store is not saved."""
+
+   def __init__(self):
+      super(LibcxxSnapshotCommand, self).__init__('libcxx-snapshot',
+                                                  gdb.COMMAND_DATA,
+                                                  gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      if len(argv) != 2:
+         raise gdb.GdbError('usage: libcxx-snapshot EXPRESSION NAME')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      snapshot = _Snapshot(argv[0], printer)
+      _store_snapshot(argv[1], snapshot)
+      gdb.write('Saved %d elements of %s as "%s".\n' %
+                (snapshot.count, argv[0], argv[1]))
+
+class LibcxxDiffCommand(gdb.Command):
+   """Show how a container changed since a libcxx-snapshot.
+
+Usage: libcxx-diff NAME
+
+The expression saved with the snapshot is evaluated again in the current
+frame, and inserted, removed and modified elements are listed, up to the
+"print elements" limit."""
+
+   def __init__(self):
+      super(LibcxxDiffCommand, self).__init__('libcxx-diff', gdb.COMMAND_DATA)
+
+   def invoke(self, arg, from_tty):
+      name = arg.strip()
+      snapshot = _snapshots.get(name)
+      if snapshot is None:
+         raise gdb.GdbError('no snapshot named "%s"' % name)
+      printer = _container_printer(gdb.parse_and_eval(snapshot.expression))
+      limit = _print_elements_limit()
+      totals = { 'inserted': 0, 'removed': 0, 'modified': 0 }
+      shown = 0
+      for (change, label, old, new) in snapshot.diff(printer):
+         totals[change] += 1
+         if limit is not None and shown >= limit:
+            continue
+         shown += 1
+         if change == 'modified' and old is not None:
+            gdb.write('modified %s: %r -> %r\n' % (label, old, new))
+         elif change == 'inserted' and new is not None:
+            gdb.write('inserted %s: %r\n' % (label, new))
+         else:
+            gdb.write('%s %s\n' % (change, label))
+      if limit is not None and shown < sum(totals.values()):
+         gdb.write('...\n')
+      gdb.write('%(modified)d modified, %(inserted)d inserted, '
+                '%(removed)d removed.\n' % totals)
+
+class LibcxxFootprintCommand(gdb.Command):
+   """Show the heap memory owned by a value, including nested elements.
+
+Usage: libcxx-footprint EXPRESSION
+
+Element types that cannot own memory are accounted for from the size
+and capacity fields alone, and strings and vectors stored in contiguous
+containers are measured from bulk reads of their headers."""
+
+   def __init__(self):
+      super(LibcxxFootprintCommand, self).__init__('libcxx-footprint',
+                                                   gdb.COMMAND_DATA,
+                                                   gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      if not arg.strip():
+         raise gdb.GdbError('usage: libcxx-footprint EXPRESSION')
+      value = gdb.parse_and_eval(arg)
+      if value.type.code == gdb.TYPE_CODE_REF:
+         value = value.referenced_value()
+      footprint = _Footprint()
+      footprint.add(value)
+      gdb.write('%d bytes of heap owned by %s (%d nested elements visited)\n' %
+                (sum(footprint.bytes.values()), arg.strip(), footprint.elements))
+      for category in ('buffers', 'strings', 'nodes', 'buckets', 'pointees',
+                       'controls'):
+         if footprint.bytes[category]:
+            gdb.write('  %-9s %d\n' % (category, footprint.bytes[category]))
+
+class LibcxxGroupbyCommand(gdb.Command):
+   """Count the entries of a libc++ map or set per key.
+
+Usage: libcxx-groupby [--top N] [--values] EXPRESSION
+
+Meant for multimaps and multisets: the container is walked once and
+the N keys with the most entries are shown with their counts (default
+10, 0 for all).  With --values, the first mapped value of each shown
+key is printed as well.  Memory use grows with the number of distinct
+keys, not with the number of entries."""
+
+   def __init__(self):
+      super(LibcxxGroupbyCommand, self).__init__('libcxx-groupby',
+                                                 gdb.COMMAND_DATA,
+                                                 gdb.COMPLETE_EXPRESSION)
+
+   def invoke(self, arg, from_tty):
+      argv = gdb.string_to_argv(arg)
+      top = 10
+      values = False
+      while len(argv) > 1 and argv[0].startswith('--'):
+         if argv[0] == '--top' and len(argv) > 2:
+            top = int(argv[1])
+            argv = argv[2:]
+         elif argv[0] == '--values':
+            values = True
+            argv = argv[1:]
+         else:
+            break
+      if len(argv) != 1:
+         raise gdb.GdbError('usage: libcxx-groupby [--top N] [--values] '
+                            'EXPRESSION')
+      printer = _container_printer(gdb.parse_and_eval(argv[0]))
+      if not isinstance(printer, (StdRbtreePrinter, HashTablePrinter)):
+         raise gdb.GdbError('%s is not a map or set' % printer.typename)
+      is_map = isinstance(printer, (StdMapPrinter, UnorderedMapPrinter))
+      # key -> [entries, order of first appearance, label, first value]
+      groups = {}
+      entries = 0
+      for element in printer._elements():
+         key = element['first'] if is_map else element
+         identity = _group_key(key)
+         group = groups.get(identity)
+         if group is None:
+            first = None
+            if values and is_map:
+               first = str(element['second'])
+            groups[identity] = [1, len(groups), _key_label(key), first]
+         else:
+            group[0] += 1
+         entries += 1
+      gdb.write('%d entries, %d distinct keys in %s\n' %
+                (entries, len(groups), argv[0]))
+      ranked = groups.values()
+      order = lambda group: (group[0], -group[1])
+      if top > 0:
+         ranked = heapq.nlargest(top, ranked, key=order)
+      else:
+         ranked = sorted(ranked, key=order, reverse=True)
+      for (count, index, label, first) in ranked:
+         if first is None:
+            gdb.write('%10d  %s\n' % (count, label))
+         else:
+            gdb.write('%10d  %s => %s\n' % (count, label, first))
+
+def register_libcxx_commands():
+   "Register the libc++ printer maintenance commands with GDB."
+
+   LibcxxProfileCommand()
+   LibcxxTraceCommand()
+   InfoLibcxxStatsCommand()
+   LibcxxBitsetDisplayParameter()
+   LibcxxPriorityQueueDisplayParameter()
+   LibcxxCacheSizeParameter()
+   LibcxxDecodeProcessesParameter()
+   LibcxxDecodePythonParameter()
+   LibcxxWarmupBudgetParameter()
+   LibcxxSummaryParameter()
+   LibcxxCoreReaderParameter()
+   LibcxxGrepCommand()
+   LibcxxStatsCommand()
+   LibcxxDumpCommand()
+   LibcxxTableCommand()
+   LibcxxPageCommand()
+   LibcxxNextCommand()
+   LibcxxSnapshotCommand()
+   LibcxxDiffCommand()
+   LibcxxFootprintCommand()
+   LibcxxGroupbyCommand()
+
 def register_libcxx_printers(obj):
    "Register libc++ pretty-printers with objfile Obj."
 
@@ -1125,7 +4637,7 @@ def build_libcxx_dictionary():
    libcxx_printer.add_container('std::', 'multimap', StdMapPrinter)
    libcxx_printer.add_container('std::', 'multiset', StdSetPrinter)
    libcxx_printer.add_version('std::', 'priority_queue',
-                              StdStackOrQueuePrinter)
+                              StdPriorityQueuePrinter)
    libcxx_printer.add_version('std::', 'queue', StdStackOrQueuePrinter)
    libcxx_printer.add_version('std::', 'tuple', StdTuplePrinter)
    libcxx_printer.add_version('std::', 'pair', StdPairPrinter)
@@ -1142,7 +4654,7 @@ def build_libcxx_dictionary():
    libcxx_printer.add('std::__debug::map', StdMapPrinter)
    libcxx_printer.add('std::__debug::multimap', StdMapPrinter)
    libcxx_printer.add('std::__debug::multiset', StdSetPrinter)
-   libcxx_printer.add('std::__debug::priority_queue', StdStackOrQueuePrinter)
+   libcxx_printer.add('std::__debug::priority_queue', StdPriorityQueuePrinter)
    libcxx_printer.add('std::__debug::queue', StdStackOrQueuePrinter)
    libcxx_printer.add('std::__debug::set', StdSetPrinter)
    libcxx_printer.add('std::__debug::stack', StdStackOrQueuePrinter)
@@ -1225,3 +4737,5 @@ def build_libcxx_dictionary():
                       StdDequeIteratorPrinter)
 
 build_libcxx_dictionary()
+
+register_libcxx_commands()
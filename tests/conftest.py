@@ -0,0 +1,40 @@
+# The printers are loaded once, against the fake gdb module in this
+# directory, and every test starts with an empty inferior and caches.
+
+import os
+import sys
+
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _here)
+sys.path.insert(0, os.path.join(os.path.dirname(_here), 'src'))
+
+import pytest
+
+import gdb
+from libcxx.v1 import printers
+
+gdb.pretty_printers.append(printers.libcxx_printer)
+
+@pytest.fixture(autouse=True)
+def fresh_inferior():
+   gdb.reset()
+   printers._clear_stop_caches()
+   printers._layouts.clear()
+   printers._layout_types.clear()
+   printers._snapshots.clear()
+   yield
+   gdb.settings['print elements'] = 200
+
+@pytest.fixture
+def setting():
+   "Set libcxx-* parameters for one test"
+   saved = {}
+   def set(name, value):
+      parameter = gdb.settings[name]
+      saved.setdefault(name, parameter.value)
+      parameter.value = value
+      if hasattr(parameter, 'get_set_string'):
+         parameter.get_set_string()
+   yield set
+   for (name, value) in saved.items():
+      set(name, value)
@@ -0,0 +1,799 @@
+# A stand-in for GDB's Python API, for testing the printers without GDB
+#
+# Types are built by the tests, and values live in a memory image made
+# of mapped regions.  Only what the printers use is provided.  Values are
+# lazy, as in GDB: nothing is read until a value is formatted, converted
+# or fetched, and what is read is counted in inferior.reads and
+# inferior.bytes_read.  inferior.largest is the longest read asked for,
+# mapped or not: GDB allocates a buffer of that size before reading.
+
+import bisect
+import shlex
+import struct
+import sys
+
+if sys.version_info[0] > 2:
+   long = int
+
+class error(RuntimeError):
+   pass
+
+class MemoryError(error):
+   pass
+
+class GdbError(Exception):
+   pass
+
+(TYPE_CODE_PTR, TYPE_CODE_ARRAY, TYPE_CODE_STRUCT, TYPE_CODE_UNION,
+ TYPE_CODE_ENUM, TYPE_CODE_FLAGS, TYPE_CODE_FUNC, TYPE_CODE_INT,
+ TYPE_CODE_FLT, TYPE_CODE_VOID, TYPE_CODE_SET, TYPE_CODE_RANGE,
+ TYPE_CODE_STRING, TYPE_CODE_BITSTRING, TYPE_CODE_ERROR, TYPE_CODE_METHOD,
+ TYPE_CODE_METHODPTR, TYPE_CODE_MEMBERPTR, TYPE_CODE_REF,
+ TYPE_CODE_RVALUE_REF, TYPE_CODE_CHAR, TYPE_CODE_BOOL, TYPE_CODE_COMPLEX,
+ TYPE_CODE_TYPEDEF, TYPE_CODE_NAMESPACE, TYPE_CODE_DECFLOAT,
+ TYPE_CODE_INTERNAL_FUNCTION) = range(1, 28)
+
+(COMMAND_NONE, COMMAND_RUNNING, COMMAND_DATA, COMMAND_STACK, COMMAND_FILES,
+ COMMAND_SUPPORT, COMMAND_STATUS, COMMAND_BREAKPOINTS, COMMAND_TRACEPOINTS,
+ COMMAND_OBSCURE, COMMAND_MAINTENANCE, COMMAND_USER) = range(12)
+
+(COMPLETE_NONE, COMPLETE_FILENAME, COMPLETE_LOCATION, COMPLETE_COMMAND,
+ COMPLETE_SYMBOL, COMPLETE_EXPRESSION) = range(6)
+
+(PARAM_BOOLEAN, PARAM_AUTO_BOOLEAN, PARAM_UINTEGER, PARAM_INTEGER,
+ PARAM_STRING, PARAM_STRING_NOESCAPE, PARAM_OPTIONAL_FILENAME,
+ PARAM_FILENAME, PARAM_ZINTEGER, PARAM_ZUINTEGER, PARAM_ZUINTEGER_UNLIMITED,
+ PARAM_ENUM) = range(12)
+
+_scalar_codes = (TYPE_CODE_INT, TYPE_CODE_CHAR, TYPE_CODE_BOOL,
+                 TYPE_CODE_ENUM, TYPE_CODE_PTR, TYPE_CODE_FLT)
+
+# Memory
+
+class Inferior(object):
+   "The memory of the inferior: mapped regions, and a count of the reads"
+
+   def __init__(self):
+      self.starts = []
+      self.regions = []
+      self.reads = 0
+      self.bytes_read = 0
+      self.largest = 0
+
+   def map(self, start, size):
+      "Map SIZE zeroed bytes at START"
+      index = bisect.bisect(self.starts, start)
+      self.starts.insert(index, start)
+      self.regions.insert(index, (start, bytearray(size)))
+
+   def _locate(self, address, length):
+      index = bisect.bisect_right(self.starts, address) - 1
+      if index >= 0:
+         (start, data) = self.regions[index]
+         if address + length <= start + len(data):
+            return (data, address - start)
+      raise MemoryError('Cannot access memory at address 0x%x' % address)
+
+   def read(self, address, length):
+      self.largest = max(self.largest, length)
+      (data, offset) = self._locate(address, length)
+      self.reads += 1
+      self.bytes_read += length
+      return bytes(data[offset:offset + length])
+
+   def write(self, address, value):
+      (data, offset) = self._locate(address, len(value))
+      data[offset:offset + len(value)] = value
+
+   def read_memory(self, address, length):
+      return memoryview(self.read(int(address), int(length)))
+
+   def mappings(self):
+      lines = ['          Start Addr           End Addr       Size     Offset  Perms  objfile']
+      for (start, data) in self.regions:
+         lines.append('      0x%x     0x%x     0x%x        0x0  rw-p   [heap]' %
+                      (start, start + len(data), len(data)))
+      return '\n'.join(lines) + '\n'
+
+inferior = Inferior()
+
+def selected_inferior():
+   return inferior
+
+# Types
+
+class Field(object):
+   "A member of a struct, union or enum; static members have no bitpos"
+
+   def __init__(self, name, type, bitpos=None, is_base_class=False,
+                enumval=None, value=None):
+      self.name = name
+      self.type = type
+      self.is_base_class = is_base_class
+      self.artificial = False
+      self.bitsize = 0
+      self.parent_type = None
+      if bitpos is not None:
+         self.bitpos = bitpos
+      if enumval is not None:
+         self.enumval = enumval
+      self.static_value = value
+
+class Type(object):
+   def __init__(self, code, name, sizeof, target=None, is_signed=None,
+                fields=None, template_arguments=None, length=None):
+      self.code = code
+      self.name = name
+      self.sizeof = sizeof
+      self._target = target
+      self._fields = fields or []
+      self._template_arguments = template_arguments or []
+      self._length = length
+      self._pointer = None
+      self.objfile = None
+      self.align = min(sizeof, 8) or 1
+      if is_signed is not None:
+         self.is_signed = is_signed
+
+   @property
+   def tag(self):
+      if self.code in (TYPE_CODE_STRUCT, TYPE_CODE_UNION, TYPE_CODE_ENUM):
+         return self.name
+      return None
+
+   def __str__(self):
+      return self.name
+
+   def __repr__(self):
+      return '<gdb.Type %s>' % self.name
+
+   def fields(self):
+      if self.code not in (TYPE_CODE_STRUCT, TYPE_CODE_UNION, TYPE_CODE_ENUM):
+         raise TypeError('Type is not a structure, union, enum, or function '
+                         'type.')
+      return list(self._fields)
+
+   def strip_typedefs(self):
+      type = self
+      while type.code == TYPE_CODE_TYPEDEF:
+         type = type._target
+      return type
+
+   def unqualified(self):
+      return self
+
+   def target(self):
+      if self._target is None:
+         raise RuntimeError('Type does not have a target.')
+      return self._target
+
+   def pointer(self):
+      if self._pointer is None:
+         self._pointer = Type(TYPE_CODE_PTR, self.name + ' *', 8, self,
+                              is_signed=False)
+      return self._pointer
+
+   def reference(self):
+      return Type(TYPE_CODE_REF, self.name + ' &', 8, self)
+
+   def array(self, count):
+      array = Type(TYPE_CODE_ARRAY, '%s [%d]' % (self.name, count),
+                   self.sizeof * count, self, length=count)
+      array.align = self.align
+      return array
+
+   def range(self):
+      if self.code != TYPE_CODE_ARRAY:
+         raise RuntimeError('This type does not have a range.')
+      return (0, self._length - 1)
+
+   def template_argument(self, index):
+      type = self.strip_typedefs()
+      if index >= len(type._template_arguments):
+         raise RuntimeError('Template argument number %d out of range.' %
+                            index)
+      argument = type._template_arguments[index]
+      if isinstance(argument, Type):
+         return argument
+      return Value(argument)
+
+   def define(self, fields, template_arguments=None):
+      "Lay out FIELDS, (name, type) or (name, type, 'base') tuples"
+      offset = 0
+      align = 1
+      self._fields = []
+      for spec in fields:
+         (name, type) = spec[:2]
+         base = spec[2:] == ('base',)
+         if self.code == TYPE_CODE_UNION:
+            bitpos = 0
+         else:
+            offset = (offset + type.align - 1) // type.align * type.align
+            bitpos = offset * 8
+            offset += type.sizeof
+         self._fields.append(Field(name, type, bitpos, is_base_class=base))
+         align = max(align, type.align)
+      if self.code == TYPE_CODE_UNION:
+         offset = max([type.sizeof for (name, type) in
+                       [spec[:2] for spec in fields]] or [0])
+      self.align = align
+      self.sizeof = (offset + align - 1) // align * align or 1
+      if template_arguments is not None:
+         self._template_arguments = template_arguments
+      return self
+
+   def add_static(self, name, type, value):
+      self._fields.append(Field(name, type, value=value))
+      return self
+
+   def _member(self, name):
+      # Return (byte offset, field) for NAME, in bases and anonymous
+      #  members too, or None
+      for field in self._fields:
+         if field.name == name:
+            if not hasattr(field, 'bitpos'):
+               return (None, field)
+            return (field.bitpos // 8, field)
+      for field in self._fields:
+         if hasattr(field, 'bitpos') and (field.is_base_class or
+                                          not field.name):
+            found = field.type.strip_typedefs()._member(name)
+            if found is not None:
+               (offset, member) = found
+               if offset is not None:
+                  offset += field.bitpos // 8
+               return (offset, member)
+      return None
+
+   def _base_offset(self, base):
+      if self is base:
+         return 0
+      for field in self._fields:
+         if field.is_base_class:
+            offset = field.type.strip_typedefs()._base_offset(base)
+            if offset is not None:
+               return field.bitpos // 8 + offset
+      return None
+
+_types = {}
+
+def _scalar(code, name, size, signed):
+   _types[name] = Type(code, name, size, is_signed=signed)
+
+def _reset_types():
+   _types.clear()
+   for (name, size) in (('char', 1), ('signed char', 1), ('short', 2),
+                        ('int', 4), ('long', 8), ('long long', 8)):
+      _scalar(TYPE_CODE_INT, name, size, True)
+   for (name, size) in (('unsigned char', 1), ('unsigned short', 2),
+                        ('unsigned int', 4), ('unsigned long', 8),
+                        ('unsigned long long', 8)):
+      _scalar(TYPE_CODE_INT, name, size, False)
+   _scalar(TYPE_CODE_CHAR, 'wchar_t', 4, True)
+   _scalar(TYPE_CODE_CHAR, 'char16_t', 2, False)
+   _scalar(TYPE_CODE_CHAR, 'char32_t', 4, False)
+   _scalar(TYPE_CODE_BOOL, 'bool', 1, False)
+   _scalar(TYPE_CODE_FLT, 'float', 4, True)
+   _scalar(TYPE_CODE_FLT, 'double', 8, True)
+   _types['void'] = Type(TYPE_CODE_VOID, 'void', 1)
+
+def lookup_type(name):
+   try:
+      return _types[name]
+   except KeyError:
+      raise error('No type named %s.' % name)
+
+def add_type(type, name=None):
+   "Make TYPE known to lookup_type, under NAME or its own name"
+   _types[name or type.name] = type
+   return type
+
+# Values
+
+_integer_formats = { 1: 'b', 2: 'h', 4: 'i', 8: 'q' }
+
+def _pack(type, number):
+   type = type.strip_typedefs()
+   if type.code == TYPE_CODE_FLT:
+      return struct.pack('<' + { 4: 'f', 8: 'd' }[type.sizeof], number)
+   number = int(number) & ((1 << (8 * type.sizeof)) - 1)
+   return struct.pack('<' + _integer_formats[type.sizeof].upper(), number)
+
+def _unpack(type, data):
+   type = type.strip_typedefs()
+   if type.code == TYPE_CODE_FLT:
+      return struct.unpack('<' + { 4: 'f', 8: 'd' }[type.sizeof], data)[0]
+   code = _integer_formats[type.sizeof]
+   if type.code == TYPE_CODE_PTR or not getattr(type, 'is_signed', True):
+      code = code.upper()
+   return struct.unpack('<' + code, data)[0]
+
+def _number(value):
+   if isinstance(value, Value):
+      return value._number()
+   if isinstance(value, (int, long, float, bool)):
+      return value
+   raise TypeError('Could not convert Python object: %r.' % (value,))
+
+def _truncating_division(a, b):
+   if b == 0:
+      raise error('Division by zero')
+   quotient = abs(a) // abs(b)
+   return quotient if (a < 0) == (b < 0) else -quotient
+
+class Value(object):
+   def __init__(self, value):
+      if isinstance(value, Value):
+         (self.type, self._address, self._data) = (value.type, value._address,
+                                                   value._data)
+         return
+      if isinstance(value, bool):
+         type = _types['bool']
+      elif isinstance(value, float):
+         type = _types['double']
+      else:
+         type = _types['long']
+      (self.type, self._address, self._data) = (type, None, _pack(type, value))
+
+   @classmethod
+   def _make(cls, type, address=None, data=None):
+      value = cls.__new__(cls)
+      (value.type, value._address, value._data) = (type, address, data)
+      return value
+
+   is_optimized_out = False
+
+   @property
+   def is_lazy(self):
+      return self._data is None
+
+   @property
+   def address(self):
+      if self._address is None:
+         return None
+      return Value._make(self.type.pointer(), None,
+                         _pack(self.type.pointer(), self._address))
+
+   @property
+   def dynamic_type(self):
+      return self.type
+
+   def fetch_lazy(self):
+      if self._data is None:
+         self._data = inferior.read(self._address, self.type.sizeof)
+
+   def _bytes(self):
+      self.fetch_lazy()
+      return self._data
+
+   def _number(self):
+      type = self.type.strip_typedefs()
+      if type.code not in _scalar_codes:
+         raise error('Cannot convert value to long.')
+      return _unpack(type, self._bytes())
+
+   def _component(self, offset, type):
+      data = None
+      if self._data is not None:
+         data = self._data[offset:offset + type.sizeof]
+      address = None
+      if self._address is not None:
+         address = self._address + offset
+      return Value._make(type, address, data)
+
+   def __getitem__(self, key):
+      if isinstance(key, Field):
+         key = key.name
+      type = self.type.strip_typedefs()
+      if isinstance(key, str):
+         if type.code in (TYPE_CODE_PTR, TYPE_CODE_REF):
+            return self.dereference()[key]
+         if type.code not in (TYPE_CODE_STRUCT, TYPE_CODE_UNION):
+            raise error('Attempt to extract a component of a value that is '
+                        'not a structure.')
+         found = type._member(key)
+         if found is None:
+            raise error('There is no member named %s.' % key)
+         (offset, field) = found
+         if offset is None:
+            return Value._make(field.type, None,
+                               _pack(field.type, field.static_value))
+         return self._component(offset, field.type)
+      index = int(key)
+      if type.code == TYPE_CODE_ARRAY:
+         element = type.target()
+         return self._component(index * element.sizeof, element)
+      if type.code == TYPE_CODE_PTR:
+         return (self + index).dereference()
+      raise error('Cannot subscript requested type.')
+
+   def dereference(self):
+      type = self.type.strip_typedefs()
+      if type.code not in (TYPE_CODE_PTR, TYPE_CODE_REF):
+         raise error('Attempt to take contents of a non-pointer value.')
+      return Value._make(type.target(), self._number())
+
+   def referenced_value(self):
+      return self.dereference()
+
+   def cast(self, type):
+      source = self.type.strip_typedefs()
+      target = type.strip_typedefs()
+      if source.code in _scalar_codes and target.code in _scalar_codes:
+         return Value._make(type, None, _pack(target, self._number()))
+      if (source.code in (TYPE_CODE_STRUCT, TYPE_CODE_UNION) and
+          target.code in (TYPE_CODE_STRUCT, TYPE_CODE_UNION)):
+         offset = source._base_offset(target)
+         if offset is None:
+            raise error('Invalid cast.')
+         return self._component(offset, type)
+      if source.code == TYPE_CODE_ARRAY and target.code == TYPE_CODE_PTR:
+         return Value._make(type, None, _pack(target, self._address))
+      if source is target:
+         return Value._make(type, self._address, self._data)
+      raise error('Invalid cast.')
+
+   def string(self, encoding=None, errors='strict', length=-1):
+      type = self.type.strip_typedefs()
+      if type.code == TYPE_CODE_ARRAY:
+         (element, address) = (type.target(), self._address)
+         if length < 0:
+            length = type.range()[1] + 1
+      elif type.code == TYPE_CODE_PTR:
+         (element, address) = (type.target(), self._number())
+      else:
+         raise error('Trying to read string with inappropriate type `%s\'.' %
+                     type)
+      width = element.strip_typedefs().sizeof
+      if length < 0:
+         length = 0
+         while inferior.read(address + length * width, width) != b'\0' * width:
+            length += 1
+      data = inferior.read(address, length * width) if length else b''
+      encoding = encoding or { 1: 'utf-8', 2: 'utf-16-le',
+                               4: 'utf-32-le' }[width]
+      return data.decode(encoding, errors)
+
+   def _binary(self, other, operation, reflected=False):
+      type = self.type.strip_typedefs()
+      if isinstance(other, Value):
+         other_type = other.type.strip_typedefs()
+      else:
+         other_type = None
+      if type.code == TYPE_CODE_PTR and not reflected:
+         step = max(type.target().strip_typedefs().sizeof, 1)
+         if (operation == '-' and other_type is not None and
+             other_type.code == TYPE_CODE_PTR):
+            return Value((self._number() - other._number()) // step)
+         if operation in '+-':
+            offset = _number(other) * step
+            if operation == '-':
+               offset = -offset
+            return Value._make(self.type, None,
+                               _pack(type, self._number() + offset))
+      if (type.code == TYPE_CODE_PTR or
+          (other_type is not None and other_type.code == TYPE_CODE_PTR)):
+         if operation == '+':
+            return other._binary(self, '+')
+         raise error('Argument to arithmetic operation not a number or '
+                     'boolean.')
+      (a, b) = (self._number(), _number(other))
+      if reflected:
+         (a, b) = (b, a)
+      if operation == '/':
+         if isinstance(a, float) or isinstance(b, float):
+            result = a / b
+         else:
+            result = _truncating_division(a, b)
+      elif operation == '%':
+         result = a - b * _truncating_division(a, b)
+      else:
+         result = { '+': lambda: a + b, '-': lambda: a - b,
+                    '*': lambda: a * b, '&': lambda: a & b,
+                    '|': lambda: a | b, '^': lambda: a ^ b,
+                    '<<': lambda: a << b, '>>': lambda: a >> b }[operation]()
+      if isinstance(result, float):
+         return Value(result)
+      result_type = type if type.code == TYPE_CODE_INT else _types['long']
+      if result_type.sizeof < 8:
+         result_type = _types['long']
+      return Value._make(result_type, None, _pack(result_type, result))
+
+   def __add__(self, other): return self._binary(other, '+')
+   def __radd__(self, other): return self._binary(other, '+', True)
+   def __sub__(self, other): return self._binary(other, '-')
+   def __rsub__(self, other): return self._binary(other, '-', True)
+   def __mul__(self, other): return self._binary(other, '*')
+   def __rmul__(self, other): return self._binary(other, '*', True)
+   def __truediv__(self, other): return self._binary(other, '/')
+   def __rtruediv__(self, other): return self._binary(other, '/', True)
+   __div__ = __floordiv__ = __truediv__
+   __rdiv__ = __rfloordiv__ = __rtruediv__
+   def __mod__(self, other): return self._binary(other, '%')
+   def __rmod__(self, other): return self._binary(other, '%', True)
+   def __and__(self, other): return self._binary(other, '&')
+   def __rand__(self, other): return self._binary(other, '&', True)
+   def __or__(self, other): return self._binary(other, '|')
+   def __ror__(self, other): return self._binary(other, '|', True)
+   def __xor__(self, other): return self._binary(other, '^')
+   def __lshift__(self, other): return self._binary(other, '<<')
+   def __rlshift__(self, other): return self._binary(other, '<<', True)
+   def __rshift__(self, other): return self._binary(other, '>>')
+   def __rrshift__(self, other): return self._binary(other, '>>', True)
+
+   def __neg__(self):
+      return Value(-self._number())
+
+   def __abs__(self):
+      return Value(abs(self._number()))
+
+   def _compare(self, other):
+      if other is None:
+         return None
+      return (self._number(), _number(other))
+
+   def __eq__(self, other):
+      pair = self._compare(other)
+      return pair is not None and pair[0] == pair[1]
+
+   def __ne__(self, other):
+      return not self == other
+
+   def __lt__(self, other):
+      (a, b) = self._compare(other)
+      return a < b
+
+   def __le__(self, other):
+      (a, b) = self._compare(other)
+      return a <= b
+
+   def __gt__(self, other):
+      (a, b) = self._compare(other)
+      return a > b
+
+   def __ge__(self, other):
+      (a, b) = self._compare(other)
+      return a >= b
+
+   __hash__ = object.__hash__
+
+   def __bool__(self):
+      return self._number() != 0
+
+   __nonzero__ = __bool__
+
+   def __int__(self):
+      return int(self._number())
+
+   __long__ = __index__ = __int__
+
+   def __float__(self):
+      return float(self._number())
+
+   def __str__(self):
+      return _format(self, 0)
+
+   def __repr__(self):
+      return '<gdb.Value type=%s>' % self.type
+
+# Formatting, as print does it with pretty-printers enabled
+
+# Nesting levels printed before GDB abbreviates to {...}
+max_depth = 20
+
+def _format(value, depth):
+   printer = default_visualizer(value)
+   if printer is not None:
+      return _format_printer(printer, depth)
+   type = value.type.strip_typedefs()
+   code = type.code
+   if code == TYPE_CODE_PTR:
+      address = value._number()
+      if settings['print symbol'] and address in data_symbols:
+         return '0x%x <%s>' % (address, data_symbols[address])
+      return '0x%x' % address
+   if code == TYPE_CODE_REF:
+      return '@0x%x: %s' % (value._number(),
+                            _format(value.dereference(), depth))
+   if code == TYPE_CODE_BOOL:
+      return 'true' if value._number() else 'false'
+   if code == TYPE_CODE_CHAR:
+      return '%d' % value._number()
+   if code == TYPE_CODE_INT:
+      number = value._number()
+      if type.sizeof == 1 and 32 <= (number & 0xff) < 127:
+         return "%d '%c'" % (number, number & 0xff)
+      return '%d' % number
+   if code == TYPE_CODE_FLT:
+      return '%g' % value._number()
+   if code == TYPE_CODE_ENUM:
+      number = value._number()
+      for field in type.fields():
+         if field.enumval == number:
+            return field.name
+      return '%d' % number
+   if code in (TYPE_CODE_STRUCT, TYPE_CODE_UNION):
+      if depth >= max_depth:
+         return '{...}'
+      value.fetch_lazy() # As GDB does, in one read
+      parts = []
+      for field in type.fields():
+         if not hasattr(field, 'bitpos'):
+            continue
+         member = value._component(field.bitpos // 8, field.type)
+         text = _format(member, depth + 1)
+         if field.is_base_class:
+            parts.append('<%s> = %s' % (field.type, text))
+         else:
+            parts.append('%s = %s' % (field.name, text))
+      return '{%s}' % ', '.join(parts)
+   if code == TYPE_CODE_ARRAY:
+      value.fetch_lazy()
+      (low, high) = type.range()
+      limit = _print_elements()
+      parts = []
+      for index in range(low, high + 1):
+         if limit is not None and len(parts) >= limit:
+            parts.append('...')
+            break
+         parts.append(_format(value[index], depth + 1))
+      return '{%s}' % ', '.join(parts)
+   return '<%s>' % type
+
+def _format_printer(printer, depth):
+   text = ''
+   if hasattr(printer, 'to_string'):
+      text = printer.to_string()
+      if isinstance(text, Value):
+         text = _format(text, depth + 1)
+      elif text is None:
+         text = ''
+      elif (hasattr(printer, 'display_hint') and
+            printer.display_hint() == 'string'):
+         # Quoted and cut at 'print elements', as GDB prints strings
+         (text, limit) = (str(text), _print_elements())
+         if limit is not None and len(text) > limit:
+            text = '"%s"...' % text[:limit]
+         else:
+            text = '"%s"' % text
+      else:
+         text = str(text)
+   if not hasattr(printer, 'children'):
+      return text
+   if depth >= max_depth:
+      return text + ' {...}'
+   limit = _print_elements()
+   parts = []
+   for (name, child) in printer.children():
+      if limit is not None and len(parts) >= limit:
+         parts.append('...')
+         break
+      if isinstance(child, Value):
+         child = _format(child, depth + 1)
+      parts.append('%s = %s' % (name, child))
+   return '%s {%s}' % (text, ', '.join(parts))
+
+# Settings, commands and events
+
+settings = {}
+
+def _reset_settings():
+   settings.clear()
+   settings['print elements'] = 200
+   settings['print symbol'] = True
+
+def _print_elements():
+   return settings['print elements'] or None
+
+def parameter(name):
+   if name not in settings:
+      raise RuntimeError('Could not find parameter `%s\'.' % name)
+   value = settings[name]
+   if isinstance(value, Parameter):
+      return value.value
+   return value
+
+class Parameter(object):
+   def __init__(self, name, command_class, parameter_class, enums=None):
+      self.name = name
+      self.value = None
+      settings[name] = self
+
+class Command(object):
+   def __init__(self, name, command_class, completer_class=None,
+                prefix=False):
+      commands[name] = self
+
+commands = {}
+
+class _Registry(object):
+   def __init__(self):
+      self.handlers = []
+
+   def connect(self, handler):
+      self.handlers.append(handler)
+
+   def disconnect(self, handler):
+      self.handlers.remove(handler)
+
+class _Events(object):
+   def __init__(self):
+      for name in ('stop', 'cont', 'exited', 'new_objfile', 'clear_objfiles',
+                   'before_prompt', 'memory_changed', 'inferior_call'):
+         setattr(self, name, _Registry())
+
+events = _Events()
+
+posted = []
+
+def post_event(event):
+   posted.append(event)
+
+output = []
+
+def write(text, stream=None):
+   output.append(text)
+
+def flush(stream=None):
+   pass
+
+def string_to_argv(text):
+   return shlex.split(text)
+
+def execute(command, from_tty=False, to_string=False):
+   if command == 'info files':
+      text = 'Symbols from "/tmp/a.out".\nNative process:\n'
+   elif command == 'info proc mappings':
+      text = 'process 1\nMapped address spaces:\n\n' + inferior.mappings()
+   elif command == 'show endian':
+      text = ('The target endianness is set automatically (currently little '
+              'endian).\n')
+   else:
+      raise error('Undefined command: "%s".' % command)
+   if to_string:
+      return text
+   write(text)
+
+symbols = {}
+
+# Names of the data symbols at given addresses, which pointers show
+data_symbols = {}
+
+def parse_and_eval(expression):
+   try:
+      return symbols[expression.strip()]
+   except KeyError:
+      raise error('No symbol "%s" in current context.' % expression.strip())
+
+def selected_frame():
+   raise error('No frame is currently selected.')
+
+def current_progspace():
+   return None
+
+pretty_printers = []
+frame_filters = {}
+
+def default_visualizer(value):
+   for printer in pretty_printers:
+      visualizer = printer(value)
+      if visualizer is not None:
+         return visualizer
+   return None
+
+def reset():
+   "Start over with an empty inferior and the default settings"
+   global inferior
+   inferior = Inferior()
+   _reset_types()
+   symbols.clear()
+   data_symbols.clear()
+   output[:] = []
+   posted[:] = []
+   parameters = dict((name, setting) for (name, setting) in settings.items()
+                     if isinstance(setting, Parameter))
+   _reset_settings()
+   settings.update(parameters)
+
+_reset_types()
+_reset_settings()
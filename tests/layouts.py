@@ -0,0 +1,472 @@
+# libc++ 3.7 types and objects built in the memory of the fake gdb module
+#
+# Only the members the printers look at are laid out.  Each make_*
+# function returns a type; each put_* function writes an object of that
+# type at an address and returns the addresses of what it allocated, so
+# that tests can then corrupt them.
+
+import struct
+
+import gdb
+
+def _type(name):
+   return gdb.lookup_type(name)
+
+def struct_type(name, fields=(), template_arguments=None):
+   return gdb.Type(gdb.TYPE_CODE_STRUCT, name, 0).define(fields,
+                                                          template_arguments)
+
+def declare(name):
+   return gdb.Type(gdb.TYPE_CODE_STRUCT, name, 0)
+
+def union_type(name, fields):
+   return gdb.Type(gdb.TYPE_CODE_UNION, name, 0).define(fields)
+
+def _pair(first, second='std::__1::allocator<void>'):
+   return struct_type('std::__1::__compressed_pair<%s, %s>' % (first, second),
+                      [('__first_', first)])
+
+class Heap(object):
+   "Allocate and write objects in one mapped region of the fake inferior"
+
+   def __init__(self, start=0x100000, size=1 << 20):
+      gdb.inferior.map(start, size)
+      self.next = start
+      self.end = start + size
+
+   def alloc(self, size, align=16):
+      address = (self.next + align - 1) // align * align
+      self.next = address + max(size, 1)
+      assert self.next <= self.end
+      return address
+
+   def new(self, type, count=1):
+      return self.alloc(type.sizeof * count)
+
+   def write(self, address, type, number):
+      type = type.strip_typedefs()
+      if type.code == gdb.TYPE_CODE_FLT:
+         data = struct.pack('<' + { 4: 'f', 8: 'd' }[type.sizeof], number)
+      else:
+         mask = (1 << (8 * type.sizeof)) - 1
+         data = struct.pack('<' + { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }[type.sizeof],
+                            int(number) & mask)
+      gdb.inferior.write(address, data)
+
+   def set(self, address, type, members):
+      "Write MEMBERS, a dict of dotted member paths to numbers"
+      for (path, number) in members.items():
+         (offset, member) = offset_of(type, path)
+         self.write(address + offset, member, number)
+
+   def array(self, type, numbers):
+      address = self.new(type, len(numbers))
+      for (index, number) in enumerate(numbers):
+         self.write(address + index * type.sizeof, type, number)
+      return address
+
+   def value(self, type, address):
+      return gdb.Value(address).cast(type.pointer()).dereference()
+
+def offset_of(type, path):
+   "Return (byte offset, type) of the member at dotted PATH in TYPE"
+   offset = 0
+   for name in path.split('.'):
+      (member_offset, field) = type.strip_typedefs()._member(name)
+      offset += member_offset
+      type = field.type
+   return (offset, type)
+
+# Where nothing is mapped
+WILD = 0xdead0000
+
+def size_t():
+   return _type('unsigned long')
+
+# std::basic_string
+
+def make_string(char='char'):
+   element = _type(char)
+   name = ('std::__1::basic_string<%s, std::__1::char_traits<%s>, '
+           'std::__1::allocator<%s> >' % (char, char, char))
+   long_rep = struct_type(name + '::__long',
+                          [('__cap_', size_t()), ('__size_', size_t()),
+                           ('__data_', element.pointer())])
+   short_rep = struct_type(name + '::__short',
+                           [('__size_', _type('unsigned char')),
+                            ('__data_', element.array(23 // element.sizeof))])
+   rep = union_type(name + '::__rep', [('__l', long_rep), ('__s', short_rep)])
+   return struct_type(name, [('__r_', _pair(rep))], [element])
+
+def put_string(heap, type, address, text, size=None, data=None):
+   "Write a long string when SIZE or DATA are given, else a short one"
+   width = type.template_argument(0).sizeof
+   count = len(text) // width
+   if size is None and data is None and count < 23 // width:
+      heap.set(address, type, { '__r_.__first_.__s.__size_': count << 1 })
+      (offset, _) = offset_of(type, '__r_.__first_.__s.__data_')
+      gdb.inferior.write(address + offset, text)
+      return None
+   if data is None:
+      data = heap.alloc(len(text) + width)
+      gdb.inferior.write(data, text)
+   heap.set(address, type, { '__r_.__first_.__l.__cap_': (count + 16) | 1,
+                             '__r_.__first_.__l.__size_': count
+                                                          if size is None
+                                                          else size,
+                             '__r_.__first_.__l.__data_': data })
+   return data
+
+# std::vector
+
+def make_vector(element):
+   pointer = element.pointer()
+   return struct_type('std::__1::vector<%s, std::__1::allocator<%s> >' %
+                      (element, element),
+                      [('__begin_', pointer), ('__end_', pointer),
+                       ('__end_cap_', _pair(pointer))], [element])
+
+def put_vector(heap, type, address, numbers, begin=None, size=None,
+               capacity=None):
+   element = type.template_argument(0)
+   if begin is None:
+      begin = heap.array(element, list(numbers) or [0])
+   size = len(numbers) if size is None else size
+   capacity = size if capacity is None else capacity
+   heap.set(address, type, { '__begin_': begin,
+                             '__end_': begin + size * element.sizeof,
+                             '__end_cap_.__first_':
+                                begin + capacity * element.sizeof })
+   return begin
+
+def make_vector_bool():
+   word = size_t()
+   type = struct_type('std::__1::vector<bool, std::__1::allocator<bool> >',
+                      [('__begin_', word.pointer()), ('__size_', size_t()),
+                       ('__cap_alloc_', _pair(size_t()))], [_type('bool')])
+   return type.add_static('__bits_per_word', _type('unsigned int'), 64)
+
+def put_vector_bool(heap, type, address, bits, begin=None, size=None):
+   words = [0] * ((len(bits) + 63) // 64 or 1)
+   for (index, bit) in enumerate(bits):
+      if bit:
+         words[index // 64] |= 1 << (index % 64)
+   if begin is None:
+      begin = heap.array(size_t(), words)
+   heap.set(address, type, { '__begin_': begin,
+                             '__size_': len(bits) if size is None else size,
+                             '__cap_alloc_.__first_': len(words) })
+   return begin
+
+# std::list and std::forward_list
+
+def make_list(element):
+   base = declare('std::__1::__list_node_base<%s, void *>' % element)
+   node = declare('std::__1::__list_node<%s, void *>' % element)
+   base.define([('__prev_', node.pointer()), ('__next_', node.pointer())])
+   node.define([(base.name, base, 'base'), ('__value_', element)])
+   return struct_type('std::__1::list<%s, std::__1::allocator<%s> >' %
+                      (element, element),
+                      [('__end_', base), ('__size_alloc_', _pair(size_t()))],
+                      [element])
+
+def list_node(type):
+   return offset_of(type, '__end_.__next_')[1].target()
+
+def put_list(heap, type, address, numbers, size=None):
+   """Link nodes holding NUMBERS into a list; return the node addresses
+
+   Values given as None are left for the caller to write.
+   """
+   node = list_node(type)
+   end = address + offset_of(type, '__end_')[0]
+   nodes = [heap.new(node) for number in numbers]
+   links = [end] + nodes + [end]
+   for (index, at) in enumerate(nodes):
+      heap.set(at, node, { '__prev_': links[index],
+                           '__next_': links[index + 2] })
+      if numbers[index] is not None:
+         heap.set(at, node, { '__value_': numbers[index] })
+   heap.set(address, type, { '__end_.__next_': links[1],
+                             '__end_.__prev_': links[-2],
+                             '__size_alloc_.__first_':
+                                len(numbers) if size is None else size })
+   return nodes
+
+def make_forward_list(element):
+   node = declare('std::__1::__forward_list_node<%s, void *>' % element)
+   node.define([('__next_', node.pointer()), ('__value_', element)])
+   begin = struct_type('std::__1::__forward_begin_node<std::__1::'
+                       '__forward_list_node<%s, void *> *>' % element,
+                       [('__next_', node.pointer())])
+   return struct_type('std::__1::forward_list<%s, std::__1::allocator<%s> >' %
+                      (element, element),
+                      [('__before_begin_', _pair(begin))], [element])
+
+def forward_list_node(type):
+   return offset_of(type, '__before_begin_.__first_.__next_')[1].target()
+
+def put_forward_list(heap, type, address, numbers):
+   node = forward_list_node(type)
+   nodes = [heap.new(node) for number in numbers]
+   for (index, at) in enumerate(nodes):
+      following = nodes[index + 1] if index + 1 < len(nodes) else 0
+      heap.set(at, node, { '__next_': following, '__value_': numbers[index] })
+   heap.set(address, type, { '__before_begin_.__first_.__next_':
+                                nodes[0] if nodes else 0 })
+   return nodes
+
+# std::deque
+
+def make_deque(element, block_size=4):
+   pointer = element.pointer().pointer()
+   buffer = struct_type('std::__1::__split_buffer<%s *, std::__1::allocator<'
+                        '%s *> >' % (element, element),
+                        [('__first_', pointer), ('__begin_', pointer),
+                         ('__end_', pointer), ('__end_cap_', _pair(pointer))])
+   type = struct_type('std::__1::deque<%s, std::__1::allocator<%s> >' %
+                      (element, element),
+                      [('__map_', buffer), ('__start_', size_t()),
+                       ('__size_', _pair(size_t()))], [element])
+   return type.add_static('__block_size', _type('long'), block_size)
+
+def put_deque(heap, type, address, numbers, start=0, size=None):
+   "Write NUMBERS from index START of the first block; return the blocks"
+   element = type.template_argument(0)
+   block_size = int(heap.value(type, address)['__block_size'])
+   count = max((start + len(numbers) + block_size - 1) // block_size, 1)
+   blocks = [heap.new(element, block_size) for index in range(count)]
+   for (index, number) in enumerate(numbers):
+      (block, slot) = divmod(start + index, block_size)
+      heap.write(blocks[block] + slot * element.sizeof, element, number)
+   block_map = heap.array(element.pointer(), blocks)
+   heap.set(address, type, { '__map_.__first_': block_map,
+                             '__map_.__begin_': block_map,
+                             '__map_.__end_': block_map + 8 * count,
+                             '__map_.__end_cap_.__first_':
+                                block_map + 8 * count,
+                             '__start_': start,
+                             '__size_.__first_':
+                                len(numbers) if size is None else size })
+   return blocks
+
+# std::set and std::map, over a red-black tree
+
+def _make_tree(value, name):
+   end_node = declare('std::__1::__tree_end_node<std::__1::__tree_node_base'
+                      '<void *> *>')
+   base = declare('std::__1::__tree_node_base<void *>')
+   node = declare('std::__1::__tree_node<%s, void *>' % value)
+   end_node.define([('__left_', base.pointer())])
+   base.define([(end_node.name, end_node, 'base'),
+                ('__right_', base.pointer()), ('__parent_', base.pointer()),
+                ('__is_black_', _type('bool'))])
+   node.define([(base.name, base, 'base'), ('__value_', value)])
+   tree = struct_type(name,
+                      [('__begin_node_', end_node.pointer()),
+                       ('__pair1_', _pair(end_node)),
+                       ('__pair3_', _pair(size_t()))])
+   gdb.add_type(node.pointer(), tree.name + '::__node_pointer')
+   return tree
+
+def make_set(element):
+   tree = _make_tree(element, 'std::__1::__tree<%s, std::__1::less<%s>, '
+                     'std::__1::allocator<%s> >' % (element, element, element))
+   return struct_type('std::__1::set<%s, std::__1::less<%s>, '
+                      'std::__1::allocator<%s> >' % (element, element, element),
+                      [('__tree_', tree)], [element])
+
+def make_pair(first, second):
+   return struct_type('std::__1::pair<%s, %s>' % (first, second),
+                      [('first', first), ('second', second)], [first, second])
+
+def make_map(key, mapped):
+   pair = make_pair(key, mapped)
+   value = struct_type('std::__1::__value_type<%s, %s>' % (key, mapped),
+                       [('__cc', pair)])
+   tree = _make_tree(value, 'std::__1::__tree<%s, std::__1::__map_value_compare'
+                     '<%s>, std::__1::allocator<%s> >' % (value, key, value))
+   return struct_type('std::__1::map<%s, %s, std::__1::less<%s>, '
+                      'std::__1::allocator<std::__1::pair<const %s, %s> > >' %
+                      (key, mapped, key, key, mapped),
+                      [('__tree_', tree)], [key, mapped])
+
+def tree_node(type):
+   tree = offset_of(type, '__tree_')[1]
+   return gdb.lookup_type(tree.name + '::__node_pointer').target()
+
+def put_tree(heap, type, address, values, size=None):
+   """Write a balanced tree of VALUES, in order; return the node addresses
+
+   Each value is a number, or a dict of member paths in the node's
+   __value_ for maps.
+   """
+   node = tree_node(type)
+   tree = address + offset_of(type, '__tree_')[0]
+   tree_type = offset_of(type, '__tree_')[1]
+   end = tree + offset_of(tree_type, '__pair1_.__first_')[0]
+   nodes = [heap.new(node) for value in values]
+
+   def build(low, high, parent):
+      if low >= high:
+         return 0
+      middle = (low + high) // 2
+      at = nodes[middle]
+      heap.set(at, node, { '__left_': build(low, middle, at),
+                           '__right_': build(middle + 1, high, at),
+                           '__parent_': parent })
+      value = values[middle]
+      if isinstance(value, dict):
+         heap.set(at, node, dict(('__value_.' + path, number)
+                                 for (path, number) in value.items()))
+      else:
+         heap.set(at, node, { '__value_': value })
+      return at
+
+   root = build(0, len(nodes), end)
+   heap.set(tree, tree_type, { '__pair1_.__first_.__left_': root,
+                               '__begin_node_': nodes[0] if nodes else end,
+                               '__pair3_.__first_':
+                                  len(values) if size is None else size })
+   return nodes
+
+# std::unordered_set and std::unordered_map
+
+def _make_hash_table(value, name):
+   base = declare('std::__1::__hash_node_base<std::__1::__hash_node<%s, '
+                  'void *> *>' % value)
+   node = declare('std::__1::__hash_node<%s, void *>' % value)
+   base.define([('__next_', node.pointer())])
+   node.define([(base.name, base, 'base'), ('__hash_', size_t()),
+                ('__value_', value)])
+   size = struct_type('std::__1::__bucket_list_deallocator<void>',
+                      [('__data_', _pair(size_t()))])
+   buckets = struct_type('std::__1::unique_ptr<%s *[]>' % base,
+                         [('__ptr_', struct_type(
+                            'std::__1::__compressed_pair<%s **, void>' % base,
+                            [('__first_', base.pointer().pointer()),
+                             ('__second_', size)]))])
+   return struct_type(name, [('__bucket_list_', buckets),
+                             ('__p1_', _pair(base)),
+                             ('__p2_', _pair(size_t())),
+                             ('__p3_', _pair(_type('float')))])
+
+def make_unordered_set(element):
+   table = _make_hash_table(element, 'std::__1::__hash_table<%s, '
+                            'std::__1::hash<%s> >' % (element, element))
+   return struct_type('std::__1::unordered_set<%s, std::__1::hash<%s>, '
+                      'std::__1::equal_to<%s>, std::__1::allocator<%s> >' %
+                      (element, element, element, element),
+                      [('__table_', table)], [element])
+
+def make_unordered_map(key, mapped):
+   pair = make_pair(key, mapped)
+   value = struct_type('std::__1::__hash_value_type<%s, %s>' % (key, mapped),
+                       [('__cc', pair)])
+   table = _make_hash_table(value, 'std::__1::__hash_table<%s, '
+                            'std::__1::hash<%s> >' % (value, key))
+   return struct_type('std::__1::unordered_map<%s, %s, std::__1::hash<%s>, '
+                      'std::__1::equal_to<%s>, std::__1::allocator<'
+                      'std::__1::pair<const %s, %s> > >' %
+                      (key, mapped, key, key, key, mapped),
+                      [('__table_', table)], [key, mapped])
+
+def hash_node(type):
+   return offset_of(type, '__table_.__p1_.__first_.__next_')[1].target()
+
+def put_hash_table(heap, type, address, values, size=None):
+   "Chain nodes holding VALUES, as put_tree takes them; return the nodes"
+   node = hash_node(type)
+   nodes = [heap.new(node) for value in values]
+   for (index, at) in enumerate(nodes):
+      following = nodes[index + 1] if index + 1 < len(nodes) else 0
+      heap.set(at, node, { '__next_': following, '__hash_': index })
+      value = values[index]
+      if isinstance(value, dict):
+         heap.set(at, node, dict(('__value_.' + path, number)
+                                 for (path, number) in value.items()))
+      else:
+         heap.set(at, node, { '__value_': value })
+   buckets = heap.array(size_t(), [0] * 4)
+   heap.set(address, type, {
+      '__table_.__bucket_list_.__ptr_.__first_': buckets,
+      '__table_.__bucket_list_.__ptr_.__second_.__data_.__first_': 4,
+      '__table_.__p1_.__first_.__next_': nodes[0] if nodes else 0,
+      '__table_.__p2_.__first_': len(values) if size is None else size })
+   return nodes
+
+# Smart pointers
+
+def make_control_block():
+   count = struct_type('std::__1::__shared_count',
+                       [('_vptr.__shared_count', _type('void').pointer()),
+                        ('__shared_owners_', _type('long'))])
+   return struct_type('std::__1::__shared_weak_count',
+                      [(count.name, count, 'base'),
+                       ('__shared_weak_owners_', _type('long'))])
+
+def make_shared_ptr(element, kind='shared_ptr'):
+   block = make_control_block()
+   return struct_type('std::__1::%s<%s>' % (kind, element),
+                      [('__ptr_', element.pointer()),
+                       ('__cntrl_', block.pointer())], [element])
+
+def put_shared_ptr(heap, type, address, pointer, owners=1, weak_owners=1,
+                   block=None):
+   "Point at POINTER, counting OWNERS and WEAK_OWNERS in a new block"
+   block_type = offset_of(type, '__cntrl_')[1].target()
+   if block is None:
+      block = heap.new(block_type)
+      # libc++ stores the counts minus one
+      heap.set(block, block_type, { '__shared_owners_': owners - 1,
+                                    '__shared_weak_owners_': weak_owners - 1 })
+   heap.set(address, type, { '__ptr_': pointer, '__cntrl_': block })
+   return block
+
+def make_unique_ptr(element):
+   return struct_type('std::__1::unique_ptr<%s, std::__1::default_delete<%s> >'
+                      % (element, element),
+                      [('__ptr_', _pair(element.pointer()))], [element])
+
+# Tuples, arrays and bitsets
+
+def make_tuple(*elements):
+   leaves = [struct_type('std::__1::__tuple_leaf<%d, %s, false>' %
+                         (index, element), [('value', element)])
+             for (index, element) in enumerate(elements)]
+   names = ', '.join(str(element) for element in elements)
+   base = struct_type('std::__1::__tuple_impl<std::__1::__tuple_indices<>, '
+                      '%s>' % names,
+                      [(leaf.name, leaf, 'base') for leaf in leaves])
+   return struct_type('std::__1::tuple<%s>' % names, [('base_', base)],
+                      list(elements))
+
+def make_array(element, count):
+   return struct_type('std::__1::array<%s, %d>' % (element, count),
+                      [('__elems_', element.array(max(count, 1)))],
+                      [element, count])
+
+def make_bitset(bits):
+   words = max((bits + 63) // 64, 1)
+   return struct_type('std::__1::bitset<%d>' % bits,
+                      [('__first_', size_t().array(words))], [bits])
+
+# Container adaptors
+
+def make_adaptor(kind, container):
+   element = container.template_argument(0)
+   return struct_type('std::__1::%s<%s, %s>' % (kind, element, container),
+                      [('c', container)], [element, container])
+
+def make_priority_queue(element, order='less'):
+   vector = make_vector(element)
+   compare = struct_type('std::__1::%s<%s>' % (order, element))
+   return struct_type('std::__1::priority_queue<%s, %s, %s>' %
+                      (element, vector, compare),
+                      [('c', vector), ('comp', compare)],
+                      [element, vector, compare])
+
+# Iterators
+
+def make_iterator(name, members):
+   return struct_type(name, members)
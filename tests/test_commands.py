@@ -0,0 +1,82 @@
+# The libcxx-* commands, run on containers built in the fake inferior
+
+import pytest
+
+import gdb
+import layouts
+from layouts import Heap, offset_of
+from libcxx.v1 import printers
+
+def _int():
+   return gdb.lookup_type('int')
+
+def run(command, argument):
+   gdb.output[:] = []
+   gdb.commands[command].invoke(argument, False)
+   return ''.join(gdb.output)
+
+def _string_map(heap, keys, name='m', char='char'):
+   "Make a map from the string KEYS, in order, to their indices"
+   string = layouts.make_string(char)
+   type = layouts.make_map(string, _int())
+   address = heap.new(type)
+   nodes = layouts.put_tree(heap, type, address,
+                            [{ '__cc.second': index }
+                             for index in range(len(keys))])
+   (offset, _) = offset_of(layouts.tree_node(type), '__value_.__cc.first')
+   for (node, key) in zip(nodes, keys):
+      layouts.put_string(heap, string, node + offset, key)
+   gdb.symbols[name] = heap.value(type, address)
+
+def test_groupby_tells_long_keys_apart():
+   # Past 'print elements' the keys' labels are the same
+   (a, b) = (b'x' * 300 + b'a', b'x' * 300 + b'b')
+   _string_map(Heap(), [a, a, b])
+   text = run('libcxx-groupby', 'm')
+   assert text.startswith('3 entries, 2 distinct keys in m\n')
+   assert [line.split()[0] for line in text.splitlines()[1:]] == ['2', '1']
+
+def test_groupby_counts_short_keys():
+   _string_map(Heap(), [b'a', b'b', b'b', b'b'])
+   text = run('libcxx-groupby', '--values m')
+   assert text.splitlines() == ['4 entries, 2 distinct keys in m',
+                                '         3  "b" => 1',
+                                '         1  "a" => 0']
+
+def test_grep_reads_whole_wide_strings():
+   # Only printing is cut at 'print elements', not the values tested
+   key = u'x' * 300 + u'y'
+   _string_map(Heap(), [key.encode('utf-32-le')], char='wchar_t')
+   text = run('libcxx-grep', 'm "k.endswith(\'y\') and len(k) == 301"')
+   assert text.splitlines()[-1] == '1 matches.'
+
+def test_trace_off_restores_profiling():
+   profiler = printers._profiler
+   for profiling in (False, True):
+      run('libcxx-profile', 'on' if profiling else 'off')
+      run('libcxx-trace', 'on 10')
+      assert profiler.enabled and profiler.tracing
+      run('libcxx-trace', 'off')
+      assert (profiler.enabled, profiler.tracing) == (profiling, False)
+   run('libcxx-profile', 'off')
+
+@pytest.mark.parametrize('events', ['many', '-5', '0'])
+def test_trace_rejects_bad_event_counts(events):
+   with pytest.raises(gdb.GdbError) as error:
+      run('libcxx-trace', 'on ' + events)
+   assert 'usage: libcxx-trace' in str(error.value)
+   assert not printers._profiler.tracing
+
+def test_snapshot_refuses_what_the_store_cannot_hold(monkeypatch):
+   heap = Heap()
+   type = layouts.make_vector(_int())
+   for (name, numbers) in (('small', [1, 2]), ('big', list(range(4096)))):
+      address = heap.new(type)
+      layouts.put_vector(heap, type, address, numbers)
+      gdb.symbols[name] = heap.value(type, address)
+   run('libcxx-snapshot', 'small s')
+   monkeypatch.setattr(printers, '_snapshot_store_bytes', 1024)
+   with pytest.raises(gdb.GdbError) as error:
+      run('libcxx-snapshot', 'big s')
+   assert 'too big to snapshot' in str(error.value)
+   assert printers._snapshots['s'].expression == 'small'
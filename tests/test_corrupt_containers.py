@@ -0,0 +1,710 @@
+# Printing corrupt containers must end quickly and read little, whatever
+# their sizes and links say.  Each case builds a container in the fake
+# inferior, breaks it, and prints it as GDB would, with 'print elements'
+# at its default and unlimited.
+
+import time
+
+import pytest
+
+import gdb
+import layouts
+from layouts import Heap, WILD, offset_of
+from libcxx.v1 import printers
+
+# What printing one corrupt container may cost
+_seconds = 2.0
+_reads = 4000
+_bytes = 256 << 10
+
+HUGE = 1 << 60
+
+def _int():
+   return gdb.lookup_type('int')
+
+def _render(value):
+   try:
+      return str(value)
+   except gdb.error as e:
+      return '<error: %s>' % e
+
+def render(value):
+   "Print VALUE, checking that it stays within the budgets"
+   inferior = gdb.inferior
+   (inferior.reads, inferior.bytes_read, inferior.largest) = (0, 0, 0)
+   start = time.time()
+   text = _render(value)
+   elapsed = time.time() - start
+   assert elapsed < _seconds, 'took %.1fs' % elapsed
+   assert inferior.reads <= _reads, '%d reads' % inferior.reads
+   assert inferior.bytes_read <= _bytes, '%d bytes read' % inferior.bytes_read
+   assert inferior.largest <= _bytes, 'asked for %d bytes' % inferior.largest
+   return text
+
+def _new(heap, type):
+   address = heap.new(type)
+   return (address, heap.value(type, address))
+
+# std::basic_string
+
+def string_huge(heap):
+   type = layouts.make_string()
+   (address, value) = _new(heap, type)
+   layouts.put_string(heap, type, address, b'abc', size=HUGE)
+   return value
+
+def string_all_ones(heap):
+   type = layouts.make_string()
+   (address, value) = _new(heap, type)
+   layouts.put_string(heap, type, address, b'abc', size=(1 << 64) - 1)
+   return value
+
+def string_wild(heap):
+   type = layouts.make_string()
+   (address, value) = _new(heap, type)
+   layouts.put_string(heap, type, address, b'', size=10, data=WILD)
+   return value
+
+def string_self(heap):
+   type = layouts.make_string()
+   (address, value) = _new(heap, type)
+   layouts.put_string(heap, type, address, b'', size=1 << 30, data=address)
+   return value
+
+def wstring_huge(heap):
+   type = layouts.make_string('wchar_t')
+   (address, value) = _new(heap, type)
+   layouts.put_string(heap, type, address, 'abc'.encode('utf-32-le'),
+                      size=HUGE)
+   return value
+
+# std::vector
+
+def vector_huge(heap):
+   type = layouts.make_vector(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_vector(heap, type, address, [1, 2, 3], size=HUGE,
+                      capacity=HUGE)
+   return value
+
+def vector_reversed(heap):
+   type = layouts.make_vector(_int())
+   (address, value) = _new(heap, type)
+   begin = layouts.put_vector(heap, type, address, [1, 2, 3])
+   heap.set(address, type, { '__end_': begin - 400 })
+   return value
+
+def vector_wild(heap):
+   type = layouts.make_vector(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_vector(heap, type, address, [1, 2, 3], begin=WILD, size=3)
+   return value
+
+def vector_bool_huge(heap):
+   type = layouts.make_vector_bool()
+   (address, value) = _new(heap, type)
+   layouts.put_vector_bool(heap, type, address, [1, 0, 1], size=HUGE)
+   heap.set(address, type, { '__cap_alloc_.__first_': HUGE })
+   return value
+
+def vector_bool_wild(heap):
+   type = layouts.make_vector_bool()
+   (address, value) = _new(heap, type)
+   layouts.put_vector_bool(heap, type, address, [1, 0, 1], begin=WILD)
+   return value
+
+# std::list and std::forward_list
+
+def list_huge(heap):
+   type = layouts.make_list(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_list(heap, type, address, [1, 2, 3], size=HUGE)
+   return value
+
+def list_self(heap):
+   type = layouts.make_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_list(heap, type, address, [1, 2, 3], size=HUGE)
+   heap.set(nodes[1], layouts.list_node(type), { '__next_': nodes[1] })
+   return value
+
+def list_loop(heap):
+   type = layouts.make_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_list(heap, type, address, list(range(50)), size=HUGE)
+   heap.set(nodes[-1], layouts.list_node(type), { '__next_': nodes[10] })
+   return value
+
+def list_wild(heap):
+   type = layouts.make_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_list(heap, type, address, [1, 2, 3])
+   heap.set(nodes[1], layouts.list_node(type), { '__next_': WILD })
+   return value
+
+def list_wild_end(heap):
+   type = layouts.make_list(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_list(heap, type, address, [1, 2, 3])
+   heap.set(address, type, { '__end_.__next_': WILD, '__end_.__prev_': WILD })
+   return value
+
+def forward_list_self(heap):
+   type = layouts.make_forward_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_forward_list(heap, type, address, [1, 2, 3])
+   heap.set(nodes[2], layouts.forward_list_node(type), { '__next_': nodes[2] })
+   return value
+
+def forward_list_loop(heap):
+   type = layouts.make_forward_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_forward_list(heap, type, address, list(range(50)))
+   heap.set(nodes[-1], layouts.forward_list_node(type), { '__next_': nodes[0] })
+   return value
+
+def forward_list_wild(heap):
+   type = layouts.make_forward_list(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_forward_list(heap, type, address, [1, 2, 3])
+   heap.set(nodes[1], layouts.forward_list_node(type), { '__next_': WILD })
+   return value
+
+# std::deque
+
+def deque_huge(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)), size=HUGE)
+   return value
+
+def deque_start_past_block(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)))
+   heap.set(address, type, { '__start_': 4 })
+   return value
+
+def deque_start_huge(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)))
+   heap.set(address, type, { '__start_': HUGE })
+   return value
+
+def deque_wild_map(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)))
+   heap.set(address, type, { '__map_.__begin_': WILD,
+                             '__map_.__end_': WILD + 24,
+                             '__map_.__end_cap_.__first_': WILD + 24 })
+   return value
+
+def deque_wild_block(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)))
+   block_map = int(value['__map_']['__begin_'])
+   heap.write(block_map + 8, _int().pointer(), WILD)
+   return value
+
+def deque_self_map(heap):
+   type = layouts.make_deque(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type, address, list(range(10)))
+   block_map = int(value['__map_']['__begin_'])
+   for index in range(3):
+      heap.write(block_map + 8 * index, _int().pointer(), block_map)
+   return value
+
+# std::set, std::map and their multi variants, over red-black trees
+
+def _set(heap, count=7, size=None):
+   type = layouts.make_set(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_tree(heap, type, address, list(range(count)), size)
+   return (type, value, nodes)
+
+def set_huge(heap):
+   return _set(heap, size=HUGE)[1]
+
+def set_left_loop(heap):
+   # A node whose left child is itself: descending never ends
+   (type, value, nodes) = _set(heap, size=HUGE)
+   node = layouts.tree_node(type)
+   heap.set(nodes[4], node, { '__right_': nodes[5] })
+   heap.set(nodes[5], node, { '__left_': nodes[5] })
+   return value
+
+def set_parent_loop(heap):
+   # A node that is its own parent: climbing never ends
+   (type, value, nodes) = _set(heap, size=HUGE)
+   heap.set(nodes[2], layouts.tree_node(type), { '__parent_': nodes[2] })
+   return value
+
+def set_right_loop(heap):
+   # The successor of the last node is the first one again
+   (type, value, nodes) = _set(heap, size=HUGE)
+   node = layouts.tree_node(type)
+   heap.set(nodes[6], node, { '__right_': nodes[0] })
+   return value
+
+def set_wild(heap):
+   (type, value, nodes) = _set(heap)
+   heap.set(nodes[3], layouts.tree_node(type), { '__right_': WILD })
+   return value
+
+def set_wild_begin(heap):
+   (type, value, nodes) = _set(heap)
+   heap.set(int(value.address), type, { '__tree_.__begin_node_': WILD })
+   return value
+
+def _map(heap, size=None):
+   type = layouts.make_map(_int(), _int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_tree(heap, type, address,
+                            [{ '__cc.first': key, '__cc.second': key * key }
+                             for key in range(7)], size)
+   return (type, value, nodes)
+
+def map_huge(heap):
+   return _map(heap, size=HUGE)[1]
+
+def map_left_loop(heap):
+   (type, value, nodes) = _map(heap, size=HUGE)
+   node = layouts.tree_node(type)
+   heap.set(nodes[0], node, { '__right_': nodes[1] })
+   heap.set(nodes[1], node, { '__left_': nodes[1] })
+   return value
+
+def map_parent_loop(heap):
+   (type, value, nodes) = _map(heap, size=HUGE)
+   heap.set(nodes[6], layouts.tree_node(type), { '__parent_': nodes[6] })
+   return value
+
+def map_wild(heap):
+   (type, value, nodes) = _map(heap)
+   heap.set(nodes[1], layouts.tree_node(type), { '__parent_': WILD })
+   return value
+
+# std::unordered_set and std::unordered_map
+
+def _unordered_set(heap, count=5, size=None):
+   type = layouts.make_unordered_set(_int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_hash_table(heap, type, address, list(range(count)),
+                                  size)
+   return (type, value, nodes)
+
+def unordered_set_huge(heap):
+   return _unordered_set(heap, size=HUGE)[1]
+
+def unordered_set_self(heap):
+   (type, value, nodes) = _unordered_set(heap, size=HUGE)
+   heap.set(nodes[2], layouts.hash_node(type), { '__next_': nodes[2] })
+   return value
+
+def unordered_set_loop(heap):
+   (type, value, nodes) = _unordered_set(heap, count=50, size=HUGE)
+   heap.set(nodes[-1], layouts.hash_node(type), { '__next_': nodes[5] })
+   return value
+
+def unordered_set_wild(heap):
+   (type, value, nodes) = _unordered_set(heap)
+   heap.set(nodes[2], layouts.hash_node(type), { '__next_': WILD })
+   return value
+
+def unordered_set_wild_first(heap):
+   (type, value, nodes) = _unordered_set(heap)
+   heap.set(int(value.address), type,
+            { '__table_.__p1_.__first_.__next_': WILD })
+   return value
+
+def _unordered_map(heap, size=None):
+   type = layouts.make_unordered_map(_int(), _int())
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_hash_table(heap, type, address,
+                                  [{ '__cc.first': key, '__cc.second': -key }
+                                   for key in range(5)], size)
+   return (type, value, nodes)
+
+def unordered_map_huge(heap):
+   return _unordered_map(heap, size=HUGE)[1]
+
+def unordered_map_self(heap):
+   (type, value, nodes) = _unordered_map(heap, size=HUGE)
+   heap.set(nodes[4], layouts.hash_node(type), { '__next_': nodes[0] })
+   return value
+
+def unordered_map_wild(heap):
+   (type, value, nodes) = _unordered_map(heap)
+   heap.set(nodes[0], layouts.hash_node(type), { '__next_': WILD })
+   return value
+
+# Smart pointers
+
+def shared_ptr_wild(heap):
+   type = layouts.make_shared_ptr(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_shared_ptr(heap, type, address, WILD)
+   return value
+
+def shared_ptr_wild_block(heap):
+   type = layouts.make_shared_ptr(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_shared_ptr(heap, type, address, heap.array(_int(), [1]),
+                          block=WILD)
+   return value
+
+def weak_ptr_huge_counts(heap):
+   type = layouts.make_shared_ptr(_int(), 'weak_ptr')
+   (address, value) = _new(heap, type)
+   layouts.put_shared_ptr(heap, type, address, heap.array(_int(), [1]),
+                          owners=HUGE, weak_owners=HUGE)
+   return value
+
+def _shared_node():
+   # struct Node { std::shared_ptr<Node> next; }
+   node = layouts.declare('Node')
+   pointer = layouts.make_shared_ptr(node)
+   node.define([('next', pointer)])
+   return (node, pointer)
+
+def shared_ptr_self(heap):
+   (node, pointer) = _shared_node()
+   (address, value) = _new(heap, node)
+   layouts.put_shared_ptr(heap, pointer, address, address)
+   return value['next']
+
+def shared_ptr_loop(heap):
+   (node, pointer) = _shared_node()
+   nodes = [heap.new(node) for index in range(3)]
+   for (index, at) in enumerate(nodes):
+      layouts.put_shared_ptr(heap, pointer, at,
+                             nodes[(index + 1) % len(nodes)])
+   return heap.value(node, nodes[0])['next']
+
+def shared_ptr_chain(heap):
+   # Long, but not a loop
+   (node, pointer) = _shared_node()
+   nodes = [heap.new(node) for index in range(2000)]
+   for (index, at) in enumerate(nodes[:-1]):
+      layouts.put_shared_ptr(heap, pointer, at, nodes[index + 1])
+   return heap.value(node, nodes[0])['next']
+
+def shared_list(heap):
+   # typedef std::list<std::shared_ptr<List> > List, holding itself
+   alias = gdb.Type(gdb.TYPE_CODE_TYPEDEF, 'List', 0)
+   pointer = layouts.struct_type('std::__1::shared_ptr<List>',
+                                 [('__ptr_', alias.pointer()),
+                                  ('__cntrl_',
+                                   layouts.make_control_block().pointer())],
+                                 [alias])
+   type = layouts.make_list(pointer)
+   (alias._target, alias.sizeof) = (type, type.sizeof)
+   (address, value) = _new(heap, type)
+   nodes = layouts.put_list(heap, type, address, [None, None])
+   node = layouts.list_node(type)
+   for at in nodes:
+      layouts.put_shared_ptr(heap, pointer,
+                             at + offset_of(node, '__value_')[0], address)
+   return value
+
+def unique_ptr_wild(heap):
+   type = layouts.make_unique_ptr(_int())
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { '__ptr_.__first_': WILD })
+   return value
+
+def unique_ptr_vector_huge(heap):
+   vector = layouts.make_vector(_int())
+   type = layouts.make_unique_ptr(vector)
+   (address, value) = _new(heap, type)
+   at = heap.new(vector)
+   layouts.put_vector(heap, vector, at, [1, 2], size=HUGE, capacity=HUGE)
+   heap.set(address, type, { '__ptr_.__first_': at })
+   return value
+
+# The rest
+
+def pair_wild(heap):
+   return heap.value(layouts.make_pair(_int(), _int()), WILD)
+
+def tuple_wild(heap):
+   return heap.value(layouts.make_tuple(_int(), _int(), _int()), WILD)
+
+def array_wild(heap):
+   return heap.value(layouts.make_array(_int(), 8), WILD)
+
+def array_huge(heap):
+   # The type says more elements than are mapped
+   type = layouts.make_array(_int(), 1 << 40)
+   return heap.value(type, heap.end - 64)
+
+def bitset_wild(heap):
+   return heap.value(layouts.make_bitset(100), WILD)
+
+def bitset_huge(heap):
+   type = layouts.make_bitset(1 << 40)
+   return heap.value(type, heap.end - 64)
+
+def stack_huge(heap):
+   type = layouts.make_adaptor('stack', layouts.make_deque(_int()))
+   (address, value) = _new(heap, type)
+   layouts.put_deque(heap, type.template_argument(1), address,
+                     list(range(5)), size=HUGE)
+   return value
+
+def queue_start_past_block(heap):
+   type = layouts.make_adaptor('queue', layouts.make_deque(_int()))
+   (address, value) = _new(heap, type)
+   deque = type.template_argument(1)
+   layouts.put_deque(heap, deque, address, list(range(5)))
+   heap.set(address, deque, { '__start_': 9 })
+   return value
+
+def stack_list_loop(heap):
+   type = layouts.make_adaptor('stack', layouts.make_list(_int()))
+   (address, value) = _new(heap, type)
+   container = type.template_argument(1)
+   nodes = layouts.put_list(heap, container, address, [1, 2, 3], size=HUGE)
+   heap.set(nodes[2], layouts.list_node(container), { '__next_': nodes[0] })
+   return value
+
+def priority_queue_huge(heap):
+   type = layouts.make_priority_queue(_int())
+   (address, value) = _new(heap, type)
+   layouts.put_vector(heap, type.template_argument(1), address, [3, 2, 1],
+                      size=HUGE, capacity=HUGE)
+   return value
+
+def priority_queue_wild(heap):
+   type = layouts.make_priority_queue(_int(), 'greater')
+   (address, value) = _new(heap, type)
+   layouts.put_vector(heap, type.template_argument(1), address, [1, 2, 3],
+                      begin=WILD, size=3)
+   return value
+
+# Iterators
+
+def _iterator(heap, name, member, pointer):
+   type = layouts.make_iterator(name, [(member, pointer.type)])
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { member: int(pointer) })
+   return value
+
+def _wild(type):
+   return gdb.Value(WILD).cast(type.pointer())
+
+def list_iterator_wild(heap):
+   node = layouts.list_node(layouts.make_list(_int()))
+   return _iterator(heap, 'std::__1::__list_iterator<int, void *>', '__ptr_',
+                    _wild(node))
+
+def forward_list_iterator_wild(heap):
+   node = layouts.forward_list_node(layouts.make_forward_list(_int()))
+   return _iterator(heap, 'std::__1::__forward_list_iterator<std::__1::'
+                    '__forward_list_node<int, void *> *>', '__ptr_',
+                    _wild(node))
+
+def tree_iterator_wild(heap):
+   node = layouts.tree_node(layouts.make_set(_int()))
+   return _iterator(heap, 'std::__1::__tree_iterator<int, std::__1::'
+                    '__tree_node<int, void *> *, long>', '__ptr_', _wild(node))
+
+def map_iterator_wild(heap):
+   node = layouts.tree_node(layouts.make_map(_int(), _int()))
+   inner = layouts.make_iterator('std::__1::__tree_iterator<std::__1::'
+                                 '__value_type<int, int>, void *, long>',
+                                 [('__ptr_', node.pointer())])
+   type = layouts.make_iterator('std::__1::__map_iterator<std::__1::'
+                                '__tree_iterator<int, void *, long> >',
+                                [('__i_', inner)])
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { '__i_.__ptr_': WILD })
+   return value
+
+def hash_iterator_wild(heap):
+   node = layouts.hash_node(layouts.make_unordered_set(_int()))
+   return _iterator(heap, 'std::__1::__hash_iterator<std::__1::__hash_node'
+                    '<int, void *> *>', '__node_', _wild(node))
+
+def hash_map_iterator_wild(heap):
+   node = layouts.hash_node(layouts.make_unordered_map(_int(), _int()))
+   inner = layouts.make_iterator('std::__1::__hash_iterator<std::__1::'
+                                 '__hash_node<int, void *> *>',
+                                 [('__node_', node.pointer())])
+   type = layouts.make_iterator('std::__1::__hash_map_iterator<std::__1::'
+                                '__hash_iterator<int> >', [('__i_', inner)])
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { '__i_.__node_': WILD })
+   return value
+
+def deque_iterator_wild(heap):
+   type = layouts.make_iterator('std::__1::__deque_iterator<int, int *, int &,'
+                                ' int **, long, 1024>',
+                                [('__m_iter_', _int().pointer().pointer()),
+                                 ('__ptr_', _int().pointer())])
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { '__m_iter_': WILD, '__ptr_': WILD })
+   return value
+
+def vector_iterator_wild(heap):
+   return _iterator(heap, 'std::__1::__wrap_iter<int *>', '__i',
+                    _wild(_int()))
+
+def bit_iterator_wild(heap):
+   type = layouts.make_iterator('std::__1::__bit_iterator<std::__1::vector<'
+                                'bool, std::__1::allocator<bool> >, false, 0>',
+                                [('__seg_', layouts.size_t().pointer()),
+                                 ('__ctz_', gdb.lookup_type('unsigned int'))])
+   (address, value) = _new(heap, type)
+   heap.set(address, type, { '__seg_': WILD, '__ctz_': 200 })
+   return value
+
+cases = [string_huge, string_all_ones, string_wild, string_self, wstring_huge,
+         vector_huge, vector_reversed, vector_wild, vector_bool_huge,
+         vector_bool_wild, list_huge, list_self, list_loop, list_wild,
+         list_wild_end, forward_list_self, forward_list_loop,
+         forward_list_wild, deque_huge, deque_start_past_block,
+         deque_start_huge, deque_wild_map, deque_wild_block, deque_self_map,
+         set_huge, set_left_loop, set_parent_loop, set_right_loop, set_wild,
+         set_wild_begin, map_huge, map_left_loop, map_parent_loop, map_wild,
+         unordered_set_huge, unordered_set_self, unordered_set_loop,
+         unordered_set_wild, unordered_set_wild_first, unordered_map_huge,
+         unordered_map_self, unordered_map_wild, shared_ptr_wild,
+         shared_ptr_wild_block, weak_ptr_huge_counts, shared_ptr_self,
+         shared_ptr_loop, shared_ptr_chain, shared_list, unique_ptr_wild,
+         unique_ptr_vector_huge, pair_wild, tuple_wild, array_wild,
+         array_huge, bitset_wild, bitset_huge, stack_huge,
+         queue_start_past_block, stack_list_loop, priority_queue_huge,
+         priority_queue_wild, list_iterator_wild, forward_list_iterator_wild,
+         tree_iterator_wild, map_iterator_wild, hash_iterator_wild,
+         hash_map_iterator_wild, deque_iterator_wild, vector_iterator_wild,
+         bit_iterator_wild]
+
+@pytest.mark.parametrize('limit', [200, 0], ids=['limited', 'unlimited'])
+@pytest.mark.parametrize('case', cases, ids=[case.__name__ for case in cases])
+def test_corrupt(case, limit):
+   gdb.settings['print elements'] = limit
+   value = case(Heap())
+   assert printers.libcxx_printer(value) is not None
+   render(value)
+   # Once more, from the cached printer
+   render(value)
+
+def test_every_printer_is_covered():
+   names = set()
+   for case in cases:
+      gdb.reset()
+      printers._clear_stop_caches()
+      value = case(Heap())
+      names.add(printers.libcxx_printer.find(value.type).function)
+   expected = set(subprinter.function
+                  for subprinter in printers.libcxx_printer.subprinters)
+   assert expected - names == set()
+
+@pytest.mark.parametrize('mode', ['indices', 'hex', 'binary', 'runs'])
+def test_corrupt_bitset(setting, mode):
+   setting('libcxx-bitset-display', mode)
+   heap = Heap()
+   for case in (bitset_wild, bitset_huge):
+      assert render(case(heap)) == 'invalid'
+
+@pytest.mark.parametrize(('mode', 'text'),
+                         [('indices', ' (length=0)'),
+                          ('hex', ' (length=0) = 0x'),
+                          ('binary', ' (length=0) = 0b'),
+                          ('runs', ' (length=0, count=0) = {}')])
+def test_empty_bitset(setting, mode, text):
+   # Not corrupt, but without any words to read
+   setting('libcxx-bitset-display', mode)
+   heap = Heap()
+   type = layouts.make_bitset(0)
+   assert (render(heap.value(type, heap.new(type))) ==
+           'std::__1::bitset' + text)
+
+def test_corrupt_priority_queue_top(setting):
+   setting('libcxx-priority-queue-display', 'top')
+   heap = Heap()
+   for case in (priority_queue_huge, priority_queue_wild):
+      assert render(case(heap)) == 'std::__1::priority_queue = invalid'
+
+def test_corrupt_summaries(setting):
+   setting('libcxx-summary', 'on')
+   heap = Heap()
+   for case in cases:
+      render(case(heap))
+
+# What the results look like
+
+def test_invalid_sizes():
+   heap = Heap()
+   for case in (string_huge, string_wild, vector_huge, vector_wild,
+                vector_bool_huge, list_wild_end, deque_huge,
+                deque_start_past_block, deque_start_huge, deque_wild_map,
+                set_wild_begin, unordered_set_wild_first, stack_huge,
+                queue_start_past_block):
+      assert 'invalid' in render(case(heap)), case.__name__
+
+def test_list_loop_stops():
+   text = render(list_loop(Heap()))
+   assert text.count(' = ') < 120
+   assert '[9] = 9' in text
+
+def test_forward_list_loop_is_invalid():
+   assert render(forward_list_loop(Heap())) == 'invalid'
+
+def test_set_loops_stop():
+   for case in (set_left_loop, set_parent_loop, set_right_loop):
+      # Only the walk is checked: the size is as corrupt as the links
+      text = render(case(Heap()))
+      assert ' {[0] = 0' in text, case.__name__
+      assert text.count(' = ') < 40, case.__name__
+
+def test_hash_loop_stops():
+   text = render(unordered_set_loop(Heap()))
+   assert '[49] = 49' in text
+   assert text.count(' = ') < 150
+
+def test_shared_ptr_loop_is_abbreviated():
+   text = render(shared_ptr_loop(Heap()))
+   assert '...' in text
+
+# The loop detector and the tree depth bound
+
+def _walk(tail, loop):
+   # Addresses along a chain of TAIL nodes leading into a loop of LOOP
+   for address in range(tail):
+      yield address
+   while True:
+      for address in range(tail, tail + loop):
+         yield address
+
+def test_cycle_guard_finds_loops():
+   for (tail, loop) in ((0, 1), (1, 1), (3, 7), (100, 1), (100, 1000),
+                        (1000, 3)):
+      guard = printers._CycleGuard(-1)
+      steps = next(index for (index, address) in enumerate(_walk(tail, loop))
+                   if guard.revisits(address))
+      assert steps <= 2 * (tail + loop) + 1, (tail, loop, steps)
+
+def test_cycle_guard_passes_chains():
+   guard = printers._CycleGuard(-1)
+   assert not any(guard.revisits(address) for address in range(100000))
+
+def test_tree_depth_bound():
+   (type, value, nodes) = _set(Heap(), count=15)
+   iterator = printers.StdRbtreePrinter._iterator(value['__tree_'])
+   assert iterator.max_depth == 2 * (15 + 1).bit_length()
+   node = layouts.tree_node(type)
+   # Descending from the successor subtree loops, and the depth bound
+   #  ends the walk rather than the loop detector.
+   heap = Heap(0x300000)
+   loop = heap.new(node)
+   heap.set(loop, node, { '__left_': loop })
+   heap.set(nodes[0], node, { '__right_': loop })
+   gdb.inferior.reads = 0
+   assert list(iterator) == []
+   assert gdb.inferior.reads < 4 * iterator.max_depth
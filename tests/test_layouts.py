@@ -0,0 +1,48 @@
+# Layout facts saved across sessions, as _save_layouts and _load_layouts
+# round-trip them through JSON
+
+import json
+
+import gdb
+import layouts
+from layouts import Heap
+from libcxx.v1 import printers
+
+def _reload():
+   "Replace the layouts by what a later session would load"
+   saved = json.loads(json.dumps(
+      [[printers._encode_layout(key), printers._encode_layout(layout)]
+       for (key, layout) in printers._layouts.items()]))
+   printers._layouts.clear()
+   printers._layout_types.clear()
+   for (key, layout) in saved:
+      printers._layouts[printers._decode_layout(key)] = (
+         printers._decode_layout(layout))
+
+def test_saved_layouts_print_the_same(monkeypatch):
+   (heap, int_type) = (Heap(), gdb.lookup_type('int'))
+   values = []
+   for (type, put, contents) in [
+         (layouts.make_set(int_type), layouts.put_tree, list(range(9))),
+         (layouts.make_list(int_type), layouts.put_list, [4, 5, 6]),
+         (layouts.make_forward_list(int_type), layouts.put_forward_list,
+          [7, 8]),
+         (layouts.make_unordered_set(int_type), layouts.put_hash_table,
+          [1, 2, 3]),
+         (layouts.make_bitset(70), None, None),
+         (layouts.make_array(int_type, 3), None, None)]:
+      address = heap.new(type)
+      if put is not None:
+         put(heap, type, address, contents)
+      values.append(heap.value(type, address))
+   first = [str(value) for value in values]
+   purposes = set(key[0] for key in printers._layouts)
+   assert set(['node links __left_ __right_ __parent_',
+               'node links __next_ __prev_', 'node links __next_',
+               'template argument 0', 'template argument 1']) <= purposes
+   _reload()
+   printers._clear_stop_caches()
+   def unsaved(type, index):
+      raise AssertionError('%s looked up again' % type)
+   monkeypatch.setattr(gdb.Type, 'template_argument', unsaved)
+   assert [str(value) for value in values] == first
@@ -0,0 +1,89 @@
+# Printing sound containers built in the fake inferior
+
+import gdb
+import layouts
+from layouts import Heap
+from libcxx.v1 import printers
+
+def test_priority_queue_top_prints_elements(setting):
+   # The walk orders by number, but prints the elements as GDB would
+   setting('libcxx-priority-queue-display', 'top')
+   heap = Heap()
+   type = layouts.make_priority_queue(gdb.lookup_type('char'))
+   address = heap.new(type)
+   layouts.put_vector(heap, type.template_argument(1), address,
+                      [ord('c'), ord('a'), ord('b')])
+   assert str(heap.value(type, address)) == (
+      "std::__1::priority_queue = std::__1::vector (length=3, capacity=3) "
+      "{[0] = 99 'c', [1] = 98 'b', [2] = 97 'a'}")
+
+def test_node_links_use_the_printers_reader(monkeypatch):
+   # Links are read by _read_memory, so libcxx-core-reader serves them
+   heap = Heap()
+   fetched = []
+   fetch = printers._fetch_memory
+   def record(address, length):
+      fetched.append((address, length))
+      return fetch(address, length)
+   monkeypatch.setattr(printers, '_fetch_memory', record)
+   int_type = gdb.lookup_type('int')
+   for (make, put, node) in [
+         (layouts.make_set, layouts.put_tree, layouts.tree_node),
+         (layouts.make_list, layouts.put_list, layouts.list_node),
+         (layouts.make_unordered_set, layouts.put_hash_table,
+          layouts.hash_node)]:
+      type = make(int_type)
+      address = heap.new(type)
+      nodes = put(heap, type, address, list(range(5)))
+      str(heap.value(type, address))
+      size = node(type).sizeof
+      for at in nodes:
+         assert any(at <= start < at + size for (start, length) in fetched)
+
+def test_pointer_keys_show_symbols():
+   heap = Heap()
+   int_type = gdb.lookup_type('int')
+   type = layouts.make_map(int_type.pointer(), int_type)
+   address = heap.new(type)
+   (target, other) = (heap.new(int_type), heap.new(int_type))
+   gdb.data_symbols[target] = 'counter'
+   layouts.put_tree(heap, type, address,
+                    [{ '__cc.first': target, '__cc.second': 1 },
+                     { '__cc.first': other, '__cc.second': 2 }])
+   assert str(heap.value(type, address)) == (
+      'std::__1::map (count=2) {[0] 0x%x <counter> = 1, [1] 0x%x = 2}' %
+      (target, other))
+
+def test_vector_counts_only_its_elements():
+   heap = Heap()
+   type = layouts.make_vector(gdb.lookup_type('int'))
+   address = heap.new(type)
+   layouts.put_vector(heap, type, address, [1, 2, 3])
+   (profiler, enabled) = (printers._profiler, printers._profiler.enabled)
+   profiler.enabled = True
+   profiler.reset()
+   try:
+      str(heap.value(type, address))
+      nodes = sum(counters.nodes for counters in profiler.by_class.values())
+   finally:
+      profiler.enabled = enabled
+   assert nodes == 3
+
+def test_disabled_printers_are_not_reused():
+   heap = Heap()
+   int_type = gdb.lookup_type('int')
+   vector = layouts.make_vector(int_type)
+   pointee = heap.new(vector)
+   layouts.put_vector(heap, vector, pointee, [1, 2])
+   type = layouts.make_shared_ptr(vector)
+   address = heap.new(type)
+   layouts.put_shared_ptr(heap, type, address, pointee)
+   value = heap.value(type, address)
+   assert 'std::__1::vector (length=2' in str(value)
+   subprinter = printers.libcxx_printer.lookup['std::__1::vector']
+   subprinter.enabled = False
+   try:
+      text = str(value)
+   finally:
+      subprinter.enabled = True
+   assert 'std::__1::vector' not in text and '__begin_' in text